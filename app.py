@@ -1,11 +1,28 @@
 import os
-import aws_cdk as cdk
 
-from dms_sample.stack import DmsSampleStack
+from dms_sample.synth_cache import SynthTimer, fingerprint, is_cached, store
 
 STACK_NAME = os.getenv("STACK_NAME", "DMsSampleSetupStack")
+SYNTH_CACHE = os.getenv("SYNTH_CACHE", "1") != "0"
+OUTDIR = os.getenv("CDK_OUTDIR")
 
-app = cdk.App()
-DmsSampleStack(app, STACK_NAME)
+timer = SynthTimer()
+key = fingerprint()
+timer.phase("fingerprint")
 
-app.synth()
+if SYNTH_CACHE and is_cached(OUTDIR, key):
+    timer.report(cached=True)
+else:
+    import aws_cdk as cdk
+
+    from dms_sample.stack import DmsSampleStack
+
+    timer.phase("import")
+
+    app = cdk.App()
+    DmsSampleStack(app, STACK_NAME)
+    timer.phase("construct")
+
+    app.synth()
+    timer.phase("synth")
+    store(OUTDIR, key, timer.report(cached=False))
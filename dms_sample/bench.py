@@ -0,0 +1,466 @@
+"""Load tests of the deployed stack described by scenario files.
+
+A scenario (YAML or JSON) lists the full load volumes and the CDC insert
+rate per table, the tasks to run and how long; the summary reports the
+throughput, the replication lag percentiles and the resources of the run:
+
+    python -m dms_sample.bench scenarios/smoke.yaml [--output result.json]
+
+    name: smoke
+    text_size: 256            # characters of the TEXT columns
+    full_load:
+      tasks: [fullTask1]      # CfnOutput keys of the tasks to run
+      rows: {accounts: 1000}
+    cdc:
+      tasks: [cdcTask1, cdcTask2]
+      rate: 50                # inserted rows per second
+      duration: 30
+      tables: {accounts: 3, novels: 1}   # share of the inserts
+      batch: 10               # rows per INSERT
+    lob:                      # run both phases for every LOB mode and size
+      modes: [none, limited, full]
+      sizes: [1024, 16384, 65535]   # bytes of accounts.profile_picture
+      max_size_kb: 32         # LobMaxSize of the limited mode
+"""
+
+import argparse
+import dataclasses
+import datetime
+import json
+import math
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+from dms_sample import runtime
+from dms_sample.runtime import config
+from lib import query as q
+from lib.decoders import get_decoder
+from lib.kinesis_reader import StreamCursor
+from lib.lobs import decoded_size
+from lib.table_mappings import TaskRouter, task_table_mappings
+
+ROW_TEMPLATES = {
+    "authors": (
+        "first_name, last_name, date_of_birth, nationality, biography, email, "
+        "phone_number",
+        "('first-{i}', 'last-{i}', '1980-01-01', 'American', '{text}', "
+        "'author{i}@example.com', '123-456-7890')",
+    ),
+    "accounts": (
+        "name, age, birth_date, account_balance, is_active, last_login, bio, "
+        "profile_picture, favorite_color, height, weight",
+        "('account-{i}', 30, '1991-05-21', 1500.00, TRUE, '2021-03-10 08:00:00', "
+        "'{text}', {blob}, 'red', 1.70, 60.5)",
+    ),
+    "novels": (
+        "title, author_id, publish_date, isbn, genre, page_count, publisher, "
+        "language, available_copies, total_copies",
+        "('novel-{i}', NULL, '2020-06-01', '978-3-16-148410-0', 'Adventure', 300, "
+        "'Adventure Press', 'English', 10, 20)",
+    ),
+}
+PERCENTILES = (50, 90, 99)
+
+
+@dataclass
+class FullLoadPhase:
+    tasks: list[str]
+    rows: dict[str, int]
+
+
+@dataclass
+class CdcPhase:
+    tasks: list[str]
+    rate: float
+    duration: float
+    tables: dict[str, float] = field(default_factory=lambda: {"accounts": 1})
+    batch: int = 1
+
+
+@dataclass
+class LobMatrix:
+    modes: list[str]
+    sizes: list[int]
+    max_size_kb: int = 32
+    chunk_size_kb: int = 64
+
+
+@dataclass
+class Scenario:
+    name: str
+    full_load: FullLoadPhase | None = None
+    cdc: CdcPhase | None = None
+    lob: LobMatrix | None = None
+    text_size: int = 64
+    blob_size: int = 0
+    timeout: float = 300
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "Scenario":
+        values = dict(values)
+        phases = {"full_load": FullLoadPhase, "cdc": CdcPhase, "lob": LobMatrix}
+        for key, phase in phases.items():
+            if values.get(key) is not None:
+                values[key] = _build(phase, values[key], key)
+        scenario = _build(cls, values, "scenario")
+        for table in _scenario_tables(scenario):
+            if table not in ROW_TEMPLATES:
+                raise ValueError(
+                    f"Unknown table {table!r}, expected one of {list(ROW_TEMPLATES)}"
+                )
+        sizes = [scenario.blob_size, *(scenario.lob.sizes if scenario.lob else [])]
+        if max(sizes) > q.LOB_COLUMN_MAX_SIZE:
+            raise ValueError(
+                f"LOB sizes {sizes} exceed the {q.LOB_COLUMN_MAX_SIZE} bytes "
+                "of the BLOB columns"
+            )
+        return scenario
+
+
+def _build(cls, values: dict, where: str):
+    known = cls.__dataclass_fields__
+    unknown = set(values) - set(known)
+    if unknown:
+        raise ValueError(f"Unknown {where} settings {sorted(unknown)}")
+    try:
+        return cls(**values)
+    except TypeError as error:
+        raise ValueError(f"Invalid {where}: {error}") from None
+
+
+def _scenario_tables(scenario: Scenario) -> set[str]:
+    tables = set()
+    if scenario.full_load:
+        tables.update(scenario.full_load.rows)
+    if scenario.cdc:
+        tables.update(scenario.cdc.tables)
+    return tables
+
+
+def load_scenario(path: str) -> Scenario:
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError(
+                    "YAML scenarios require PyYAML: pip install pyyaml"
+                ) from None
+            values = yaml.safe_load(f)
+        else:
+            values = json.load(f)
+    return Scenario.from_dict(values)
+
+
+def insert_statements(
+    table: str, start: int, count: int, batch: int, text_size: int, blob_size: int = 0
+) -> list[str]:
+    columns, template = ROW_TEMPLATES[table]
+    text = "t" * text_size
+    # generated by the server, the statements stay small
+    blob = f"REPEAT('b', {blob_size})" if blob_size else "NULL"
+    statements = []
+    for first in range(start, start + count, batch):
+        values = ",\n".join(
+            template.format(i=i, text=text, blob=blob)
+            for i in range(first, min(first + batch, start + count))
+        )
+        statements.append(f"INSERT INTO {table} ({columns}) VALUES\n{values};")
+    return statements
+
+
+def percentiles(values: list[float], points=PERCENTILES) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {
+        # nearest rank
+        f"p{point}": ordered[max(math.ceil(len(ordered) * point / 100) - 1, 0)]
+        for point in points
+    }
+    result["max"] = ordered[-1]
+    return {key: round(value, 1) for key, value in result.items()}
+
+
+def task_tables(task: str, schema: str, tables) -> set[str]:
+    """The tables of `tables` selected by the table mappings of a task"""
+    matcher = TaskRouter(task_table_mappings(schema)).matchers[task]
+    return {t for t in tables if matcher(schema, t)}
+
+
+def _commit_time(metadata: dict) -> float | None:
+    timestamp = metadata.get("commit-timestamp") or metadata.get("timestamp")
+    if not timestamp:
+        return None
+    return datetime.datetime.fromisoformat(timestamp).timestamp()
+
+
+class Collector:
+    """Reads the data records of `tables` from the stream and their lag"""
+
+    def __init__(self, cursor: StreamCursor, operation: str, tables: set[str]):
+        self.cursor = cursor
+        self.operation = operation
+        self.tables = tables
+        self.decoder = get_decoder(config.MESSAGE_FORMAT)
+        self.records = 0
+        self.bytes = 0
+        self.lags_ms: list[float] = []
+        self.lob_sizes: list[int] = []
+        self.last_arrival = None
+
+    def poll(self):
+        for record in self.cursor.read():
+            message = self.decoder(record["Data"])
+            metadata = message.get("metadata", {})
+            if metadata.get("record-type") != "data":
+                continue
+            if metadata.get("operation") != self.operation:
+                continue
+            if metadata.get("table-name") not in self.tables:
+                continue
+            self.records += 1
+            self.bytes += len(record["Data"])
+            arrival = record["ApproximateArrivalTimestamp"].timestamp()
+            self.last_arrival = max(arrival, self.last_arrival or arrival)
+            committed = _commit_time(metadata)
+            if committed is not None:
+                self.lags_ms.append(max(arrival - committed, 0) * 1000)
+            picture = message.get("data", {}).get("profile_picture")
+            if isinstance(picture, str):
+                self.lob_sizes.append(decoded_size(memoryview(picture.encode())))
+
+    def lob_summary(self, expected_size: int) -> dict:
+        """How many of the blobs of `expected_size` bytes arrived whole"""
+        return {
+            "values": len(self.lob_sizes),
+            "complete": sum(size == expected_size for size in self.lob_sizes),
+            "max_bytes": max(self.lob_sizes, default=0),
+        }
+
+    def wait_for(self, expected: int, deadline: float):
+        while self.records < expected and time.time() < deadline:
+            self.poll()
+            if self.records < expected:
+                time.sleep(config.RETRY_SLEEP)
+
+
+def _reset_tables(credentials):
+    runtime.run_queries_on_mysql(credentials, q.DROP_TABLES)
+    runtime.run_queries_on_mysql(credentials, q.CREATE_TABLES)
+
+
+def run_full_load(scenario: Scenario, cfn_output: runtime.CfnOutput) -> dict:
+    phase = scenario.full_load
+    credentials = runtime.get_credentials(cfn_output["fullTaskSecret"])
+    _reset_tables(credentials)
+    for table, rows in phase.rows.items():
+        runtime.run_queries_on_mysql(
+            credentials,
+            insert_statements(
+                table, 0, rows, 500, scenario.text_size, scenario.blob_size
+            ),
+        )
+
+    tasks = [cfn_output[task] for task in phase.tasks]
+    tables = set().union(
+        *(task_tables(t, credentials["dbname"], phase.rows) for t in phase.tasks)
+    )
+    expected = sum(rows for table, rows in phase.rows.items() if table in tables)
+    started = time.time()
+    stream = cfn_output["kinesisStream"]
+    collector = Collector(
+        StreamCursor(runtime.get_client("kinesis"), stream, started), "load", tables
+    )
+    for task in tasks:
+        runtime.start_task(task, runtime.start_type(task, "full-load"))
+    for task in tasks:
+        runtime.wait_for_task_status(task, "stopped")
+    collector.wait_for(expected, started + scenario.timeout)
+    elapsed = max((collector.last_arrival or time.time()) - started, 1e-3)
+    statistics = {
+        phase.tasks[i]: {
+            stat["TableName"]: stat["FullLoadRows"]
+            for stat in runtime.describe_table_statistics(task)["TableStatistics"]
+        }
+        for i, task in enumerate(tasks)
+    }
+    runtime.run_queries_on_mysql(credentials, q.DROP_TABLES)
+    return {
+        "rows": expected,
+        "records": collector.records,
+        "seconds": round(elapsed, 2),
+        "records_per_sec": round(collector.records / elapsed, 1),
+        "bytes_per_record": (
+            round(collector.bytes / collector.records, 1) if collector.records else 0
+        ),
+        "full_load_rows": statistics,
+        "lob": collector.lob_summary(scenario.blob_size),
+    }
+
+
+def _insert_at_rate(scenario: Scenario, credentials) -> dict[str, int]:
+    phase = scenario.cdc
+    weights = sum(phase.tables.values())
+    started = time.time()
+    counters = dict.fromkeys(phase.tables, 0)
+    while time.time() - started < phase.duration:
+        due = int((time.time() - started) * phase.rate)
+        total = sum(counters.values())
+        if due - total < phase.batch:
+            time.sleep(phase.batch / phase.rate / 4)
+            continue
+        # the table furthest behind its share gets the next batch
+        table = min(
+            phase.tables,
+            key=lambda t: counters[t] / (phase.tables[t] / weights * (total + 1)),
+        )
+        runtime.run_queries_on_mysql(
+            credentials,
+            insert_statements(
+                table,
+                counters[table],
+                phase.batch,
+                phase.batch,
+                scenario.text_size,
+                scenario.blob_size,
+            ),
+        )
+        counters[table] += phase.batch
+    return counters
+
+
+def run_cdc(scenario: Scenario, cfn_output: runtime.CfnOutput) -> dict:
+    phase = scenario.cdc
+    credentials = runtime.get_credentials(cfn_output["cdcTaskSecret"])
+    _reset_tables(credentials)
+
+    tasks = [cfn_output[task] for task in phase.tasks]
+    tables = set().union(
+        *(task_tables(t, credentials["dbname"], phase.tables) for t in phase.tasks)
+    )
+    stream = cfn_output["kinesisStream"]
+    collector = Collector(
+        StreamCursor(runtime.get_client("kinesis"), stream, time.time()),
+        "insert",
+        tables,
+    )
+    for task in tasks:
+        runtime.start_task(task, runtime.start_type(task, "cdc"))
+    for task in tasks:
+        runtime.wait_for_task_status(task, "running")
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        started = time.time()
+        writer = executor.submit(_insert_at_rate, scenario, credentials)
+        while not writer.done():
+            collector.poll()
+            time.sleep(config.RETRY_SLEEP)
+    # raises what failed the inserts instead of reporting a run without rows
+    counters = writer.result()
+    expected = sum(rows for table, rows in counters.items() if table in tables)
+    collector.wait_for(expected, time.time() + scenario.timeout)
+    elapsed = max((collector.last_arrival or time.time()) - started, 1e-3)
+
+    for task in tasks:
+        runtime.stop_task(task)
+    for task in tasks:
+        runtime.wait_for_task_status(task, "stopped")
+    runtime.run_queries_on_mysql(credentials, q.DROP_TABLES)
+    return {
+        "rows": expected,
+        "inserted": counters,
+        "insert_rate": round(sum(counters.values()) / phase.duration, 1),
+        "records": collector.records,
+        "records_per_sec": round(collector.records / elapsed, 1),
+        "lag_ms": percentiles(collector.lags_ms),
+        "lob": collector.lob_summary(scenario.blob_size),
+    }
+
+
+def _target_metadata(task_arn: str) -> dict:
+    task = runtime.get_client("dms").describe_replication_tasks(
+        Filters=[{"Name": "replication-task-arn", "Values": [task_arn]}],
+        WithoutSettings=False,
+    )["ReplicationTasks"][0]
+    return json.loads(task["ReplicationTaskSettings"])["TargetMetadata"]
+
+
+def run_lob_matrix(scenario: Scenario, cfn_output: runtime.CfnOutput) -> list[dict]:
+    """Both phases of `scenario` for every LOB mode and blob size"""
+    # the stack module pulls in the CDK, only load it for this benchmark
+    from dms_sample.stack import lob_settings
+
+    matrix = scenario.lob
+    settings = {
+        mode: lob_settings(mode, matrix.max_size_kb, matrix.chunk_size_kb)
+        for mode in matrix.modes
+    }
+    tasks = [
+        cfn_output[task]
+        for phase in (scenario.full_load, scenario.cdc)
+        if phase
+        for task in phase.tasks
+    ]
+    deployed = {task: _target_metadata(task) for task in tasks}
+    results = []
+    try:
+        for mode, target_metadata in settings.items():
+            for task in tasks:
+                runtime.modify_task_settings(task, {"TargetMetadata": target_metadata})
+            for size in matrix.sizes:
+                run = dataclasses.replace(scenario, blob_size=size, lob=None)
+                result = {"lob_mode": mode, "blob_size": size}
+                if run.full_load:
+                    result["full_load"] = run_full_load(run, cfn_output)
+                if run.cdc:
+                    result["cdc"] = run_cdc(run, cfn_output)
+                print(json.dumps(result, sort_keys=True))
+                results.append(result)
+    finally:
+        # leave the tasks as the stack deployed them
+        for task, target_metadata in deployed.items():
+            runtime.modify_task_settings(task, {"TargetMetadata": target_metadata})
+    return results
+
+
+def run_scenario(scenario: Scenario) -> dict:
+    cfn_output = runtime.get_cfn_output()
+    started = time.time()
+    result = {"scenario": asdict(scenario)}
+    if scenario.lob:
+        result["lob"] = run_lob_matrix(scenario, cfn_output)
+    else:
+        if scenario.full_load:
+            result["full_load"] = run_full_load(scenario, cfn_output)
+        if scenario.cdc:
+            result["cdc"] = run_cdc(scenario, cfn_output)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    result["resources"] = {
+        "wall_seconds": round(time.time() - started, 1),
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 2),
+        "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m dms_sample.bench")
+    parser.add_argument("scenarios", nargs="+", help="YAML or JSON scenario files")
+    parser.add_argument("--output", help="write the results as json")
+    args = parser.parse_args()
+
+    results = []
+    for path in args.scenarios:
+        result = run_scenario(load_scenario(path))
+        results.append(result)
+        print(json.dumps(result, indent=2, sort_keys=True))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
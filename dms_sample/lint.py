@@ -0,0 +1,274 @@
+"""Synth time check of the stack capacity against the expected workload.
+
+Walks the construct tree of the stack once it's built, reads the replication
+instance, the target stream, the Kinesis endpoint and the task settings, and
+checks them against the CDC rate the stack is expected to carry
+(`WORKLOAD_ROWS_PER_SEC` rows of `WORKLOAD_ROW_BYTES` bytes). Findings are
+attached to their construct as warnings and printed by `cdk synth`. With
+`PERF_LINT=error` (the default) a configuration that can't sustain the
+workload fails the synth, `warn` only reports it and `off` skips the check.
+
+The instance and apply figures are rough planning numbers, measure the real
+ones with `dms_sample.bench` and `lib.throttle_probe`.
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+
+from lib.record_size import (
+    SHARD_WRITE_BYTES_PER_SEC,
+    SHARD_WRITE_RECORDS_PER_SEC,
+    project_shards,
+)
+
+LINT_MODES = ("error", "warn", "off")
+PERF_LINT = os.getenv("PERF_LINT", "error")
+WORKLOAD_ROWS_PER_SEC = float(os.getenv("WORKLOAD_ROWS_PER_SEC", "50"))
+WORKLOAD_ROW_BYTES = int(os.getenv("WORKLOAD_ROW_BYTES", "512"))
+
+# vCPUs and sustained share of them (the CPU credit baseline of burstable
+# classes) of the replication instance classes
+INSTANCE_CLASSES = {
+    "dms.t2.micro": (1, 0.1),
+    "dms.t2.small": (1, 0.2),
+    "dms.t2.medium": (2, 0.2),
+    "dms.t2.large": (2, 0.3),
+    "dms.t3.micro": (2, 0.1),
+    "dms.t3.small": (2, 0.2),
+    "dms.t3.medium": (2, 0.2),
+    "dms.t3.large": (2, 0.3),
+    "dms.c5.large": (2, 1.0),
+    "dms.c5.xlarge": (4, 1.0),
+    "dms.c5.2xlarge": (8, 1.0),
+    "dms.c5.4xlarge": (16, 1.0),
+    "dms.r5.large": (2, 1.0),
+    "dms.r5.xlarge": (4, 1.0),
+    "dms.r5.2xlarge": (8, 1.0),
+    "dms.r5.4xlarge": (16, 1.0),
+}
+# changes a busy vCPU reads from the binlog and converts to JSON per second
+ROWS_PER_VCPU_SEC = 4000
+# records one apply thread of a task writes to the stream per second
+ROWS_PER_APPLY_THREAD_SEC = 500
+# storage of the task logs, and of the changes cached while the target lags
+LOG_STORAGE_GB = 2
+BACKLOG_SECONDS = 900
+# above this share of a capacity there's no headroom left for bursts
+WARN_UTILIZATION = 0.8
+# width of the columns of the estimated records
+COLUMN_BYTES = 32
+
+
+@dataclass
+class Workload:
+    rows_per_sec: float = WORKLOAD_ROWS_PER_SEC
+    row_bytes: int = WORKLOAD_ROW_BYTES
+
+
+@dataclass
+class StackConfig:
+    """What the checks read from the construct tree, by construct path"""
+
+    instance: tuple[str, str, int] | None = None  # path, class, storage GB
+    stream: tuple[str, int] | None = None  # path, shards
+    endpoint: tuple[str, str, set] | None = None  # path, format, include options
+    cdc_tasks: dict[str, dict] = field(default_factory=dict)  # path -> settings
+
+
+@dataclass
+class Finding:
+    level: str  # "error" or "warning"
+    path: str
+    check: str
+    message: str
+
+
+def estimate_record_bytes(
+    row_bytes: int, message_format: str, include_options: set
+) -> int:
+    """Bytes of the record DMS writes for an inserted row"""
+    columns = max(row_bytes // COLUMN_BYTES, 1)
+    data = {f"column_{i}": "x" * (row_bytes // columns) for i in range(columns)}
+    metadata = {
+        "timestamp": "2024-05-02T10:00:00.000000Z",
+        "record-type": "data",
+        "operation": "insert",
+        "schema-name": "dms_sample",
+        "table-name": "accounts",
+    }
+    if "partition_value" in include_options:
+        metadata["partition-key-type"] = "schema-table"
+        metadata["partition-key-value"] = "dms_sample.accounts"
+    if "transaction_details" in include_options:
+        metadata["transaction-id"] = 12884901888
+        metadata["transaction-record-id"] = 1
+        metadata["prev-transaction-id"] = 12884901887
+        metadata["prev-transaction-record-id"] = 1
+        metadata["commit-timestamp"] = "2024-05-02T10:00:00.000000Z"
+        metadata["stream-position"] = "mysql-bin-changelog.000001:1234:0:1300:0"
+    message = {"data": data, "metadata": metadata}
+    if message_format == "json":
+        return len(json.dumps(message, indent=4))
+    return len(json.dumps(message, separators=(",", ":")))
+
+
+def evaluate(config: StackConfig, workload: Workload) -> list[Finding]:
+    findings = []
+
+    def check(path, name, load, capacity, message):
+        utilization = load / capacity if capacity else float("inf")
+        if utilization > 1:
+            findings.append(Finding("error", path, name, message))
+        elif utilization > WARN_UTILIZATION:
+            findings.append(
+                Finding("warning", path, name, f"{utilization:.0%} used: {message}")
+            )
+
+    rows = workload.rows_per_sec
+    message_format, include = "json-unformatted", set()
+    if config.endpoint:
+        _, message_format, include = config.endpoint
+    record_bytes = estimate_record_bytes(workload.row_bytes, message_format, include)
+
+    if config.stream:
+        path, shards = config.stream
+        needed = project_shards(record_bytes, rows)["write_shards"]
+        load = max(
+            rows * record_bytes / SHARD_WRITE_BYTES_PER_SEC,
+            rows / SHARD_WRITE_RECORDS_PER_SEC,
+        )
+        check(
+            path,
+            "stream-shards",
+            load,
+            shards,
+            f"{rows:g} records/s of ~{record_bytes} B need {needed} shard(s), "
+            f"the stream has {shards} (SHARD_COUNT)",
+        )
+        compact = estimate_record_bytes(workload.row_bytes, "json-unformatted", set())
+        compact_needed = project_shards(compact, rows)["write_shards"]
+        if config.endpoint and compact_needed < needed:
+            findings.append(
+                Finding(
+                    "warning",
+                    config.endpoint[0],
+                    "verbose-records",
+                    f"{message_format} records with {sorted(include)} are "
+                    f"~{record_bytes} B instead of ~{compact} B and need {needed} "
+                    f"shards instead of {compact_needed}, see MESSAGE_FORMAT and "
+                    "KINESIS_INCLUDE",
+                )
+            )
+
+    if config.instance:
+        path, instance_class, storage_gb = config.instance
+        if instance_class in INSTANCE_CLASSES:
+            vcpus, baseline = INSTANCE_CLASSES[instance_class]
+            capacity = vcpus * baseline * ROWS_PER_VCPU_SEC
+            check(
+                path,
+                "instance-cpu",
+                rows,
+                capacity,
+                f"{instance_class} sustains ~{capacity:g} changes/s "
+                f"({vcpus} vCPU at {baseline:.0%}), {rows:g} expected "
+                "(REPLICATION_INSTANCE_CLASS)",
+            )
+        needed_gb = LOG_STORAGE_GB + rows * record_bytes * BACKLOG_SECONDS / 1e9
+        if storage_gb < needed_gb:
+            findings.append(
+                Finding(
+                    "warning",
+                    path,
+                    "instance-storage",
+                    f"{storage_gb} GB can't hold the task logs and "
+                    f"{BACKLOG_SECONDS // 60} minutes of changes while the target "
+                    f"lags, ~{needed_gb:.1f} GB (REPLICATION_INSTANCE_STORAGE_GB)",
+                )
+            )
+
+    if config.cdc_tasks:
+        threads = {
+            path: settings.get("TargetMetadata", {}).get("ParallelApplyThreads") or 1
+            for path, settings in config.cdc_tasks.items()
+        }
+        # the tasks split the changes between them, each one applies its share
+        capacity = sum(threads.values()) * ROWS_PER_APPLY_THREAD_SEC
+        serial = [path for path, count in threads.items() if count == 1]
+        check(
+            serial[0] if serial else next(iter(threads)),
+            "parallel-apply",
+            rows,
+            capacity,
+            f"{len(threads)} CDC task(s) with {sum(threads.values())} apply "
+            f"thread(s) write ~{capacity:g} records/s, {rows:g} expected "
+            "(PARALLEL_APPLY_THREADS)",
+        )
+    return findings
+
+
+def collect(stack) -> tuple[StackConfig, dict]:
+    """The capacity settings of the stack and its constructs by path"""
+    from aws_cdk import Token
+    from aws_cdk import aws_dms as dms
+    from aws_cdk import aws_kinesis as kinesis
+
+    from dms_sample.stack import KINESIS_INCLUDE_OPTIONS
+
+    config = StackConfig()
+    nodes = {}
+    for node in stack.node.find_all():
+        path = node.node.path
+        if isinstance(node, dms.CfnReplicationInstance):
+            config.instance = (
+                path,
+                node.replication_instance_class,
+                node.allocated_storage,
+            )
+        elif isinstance(node, kinesis.CfnStream) and not Token.is_unresolved(
+            node.shard_count
+        ):
+            config.stream = (path, node.shard_count or 1)
+        elif isinstance(node, dms.CfnEndpoint) and node.kinesis_settings:
+            settings = node.kinesis_settings
+            include = {
+                option
+                for option in KINESIS_INCLUDE_OPTIONS
+                if getattr(settings, f"include_{option}")
+            }
+            config.endpoint = (path, settings.message_format, include)
+        elif isinstance(node, dms.CfnReplicationTask) and node.migration_type in (
+            "cdc",
+            "full-load-and-cdc",
+        ):
+            config.cdc_tasks[path] = json.loads(node.replication_task_settings or "{}")
+        else:
+            continue
+        nodes[path] = node
+    return config, nodes
+
+
+def lint_stack(stack, workload: Workload = None, mode: str = PERF_LINT):
+    """Annotate the stack with its findings, raise on errors in `error` mode"""
+    from aws_cdk import Annotations
+
+    if mode not in LINT_MODES:
+        raise ValueError(
+            f"Unsupported lint mode {mode!r}, expected one of {LINT_MODES}"
+        )
+    if mode == "off":
+        return []
+    config, nodes = collect(stack)
+    findings = evaluate(config, workload or Workload())
+    for finding in findings:
+        Annotations.of(nodes[finding.path]).add_warning_v2(
+            f"perf:{finding.check}", finding.message
+        )
+    errors = [f"{f.path}: {f.message}" for f in findings if f.level == "error"]
+    if errors and mode == "error":
+        raise ValueError(
+            "The stack can't sustain the expected workload, set PERF_LINT=warn "
+            "to synthesize it anyway:\n  " + "\n  ".join(errors)
+        )
+    return findings
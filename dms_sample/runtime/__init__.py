@@ -0,0 +1,65 @@
+"""Harness shared by run.py, tests/test_infra.py and the lib tooling.
+
+Clients, stack outputs and credentials are created once per process and
+database connections are pooled, so the flows only pay for the calls that
+matter. `python -m dms_sample.runtime.bench` measures the hot paths.
+"""
+
+from dms_sample.runtime.clients import get_client, set_client
+from dms_sample.runtime.consumer import poll_kinesis, wait_for_events, wait_for_kinesis
+from dms_sample.runtime.db import (
+    get_all_table_data,
+    get_query_result,
+    get_table_counts,
+    get_table_schemas,
+    iter_query_result,
+    pool,
+    run_queries_on_mysql,
+)
+from dms_sample.runtime.outputs import (
+    CfnOutput,
+    Credentials,
+    get_cfn_output,
+    get_credentials,
+)
+from dms_sample.runtime.retry import retry
+from dms_sample.runtime.sinks import Sink, get_sink, open_sink
+from dms_sample.runtime.tasks import (
+    describe_table_statistics,
+    get_task_status,
+    modify_task_settings,
+    start_task,
+    start_type,
+    stop_task,
+    wait_for_task_status,
+)
+
+__all__ = [
+    "CfnOutput",
+    "Credentials",
+    "Sink",
+    "describe_table_statistics",
+    "get_all_table_data",
+    "get_cfn_output",
+    "get_client",
+    "get_credentials",
+    "get_query_result",
+    "get_sink",
+    "get_table_counts",
+    "get_table_schemas",
+    "get_task_status",
+    "iter_query_result",
+    "modify_task_settings",
+    "open_sink",
+    "poll_kinesis",
+    "pool",
+    "retry",
+    "run_queries_on_mysql",
+    "set_client",
+    "start_task",
+    "start_type",
+    "stop_task",
+    "wait_for_events",
+    "wait_for_kinesis",
+    "wait_for_task_status",
+]
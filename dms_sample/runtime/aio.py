@@ -0,0 +1,198 @@
+"""asyncio variant of the harness I/O.
+
+Same functions as the blocking runtime, so one process can run writers,
+task waiters and stream consumers concurrently:
+
+    await asyncio.gather(
+        aio.wait_for_task_status(task_1, "running"),
+        aio.wait_for_task_status(task_2, "running"),
+    )
+
+boto3 calls run in the default executor on the shared clients, which are
+thread safe; waits use `asyncio.sleep` so they don't hold a thread. Queries
+go through `aiomysql` when it is installed and otherwise through the pooled
+blocking helpers in the executor.
+"""
+
+import asyncio
+import weakref
+
+from dms_sample.runtime import config, db
+from dms_sample.runtime.clients import get_client
+from dms_sample.runtime.outputs import Credentials
+from dms_sample.runtime.sinks import get_sink
+from lib.decoders import decode_record, get_decoder
+from lib.kinesis_efo import read_with_efo
+from lib.kinesis_reader import StreamCursor
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+
+async def _call(service: str, method: str, **kwargs) -> dict:
+    return await asyncio.to_thread(getattr(get_client(service), method), **kwargs)
+
+
+async def start_task(task: str):
+    response = await _call(
+        "dms",
+        "start_replication_task",
+        ReplicationTaskArn=task,
+        StartReplicationTaskType="start-replication",
+    )
+    status = response["ReplicationTask"].get("Status")
+    print(f"Replication Task {task} status: {status}")
+
+
+async def stop_task(task: str):
+    response = await _call("dms", "stop_replication_task", ReplicationTaskArn=task)
+    status = response["ReplicationTask"].get("Status")
+    print(f"\n Replication Task {task} status: {status}")
+
+
+async def get_task_status(task: str) -> str:
+    response = await _call(
+        "dms",
+        "describe_replication_tasks",
+        Filters=[{"Name": "replication-task-arn", "Values": [task]}],
+        WithoutSettings=True,
+    )
+    return response["ReplicationTasks"][0].get("Status")
+
+
+async def wait_for_task_status(
+    task: str,
+    expected_status: str,
+    retries: int = config.RETRIES,
+    sleep: float = config.RETRY_SLEEP,
+):
+    print(f"Waiting for task status {expected_status}")
+    status = None
+    for _ in range(retries + 1):
+        try:
+            status = await get_task_status(task)
+        except Exception as error:
+            status = error
+        print(f"{task=} {status=}")
+        if status == expected_status:
+            return
+        await asyncio.sleep(sleep)
+    raise AssertionError(f"{task} is {status}, expected {expected_status}")
+
+
+async def describe_table_statistics(task_arn: str):
+    res = await _call("dms", "describe_table_statistics", ReplicationTaskArn=task_arn)
+    res["TableStatistics"] = sorted(
+        res["TableStatistics"], key=lambda x: (x["SchemaName"], x["TableName"])
+    )
+    return res
+
+
+async def poll_kinesis(stream: str, expected_count: int, threshold_timestamp: int):
+    cursor = await asyncio.to_thread(
+        StreamCursor, get_client("kinesis"), stream, threshold_timestamp
+    )
+    all_records = []
+    while cursor.iterators:
+        for r in await asyncio.to_thread(cursor.read):
+            if r["ApproximateArrivalTimestamp"].timestamp() > threshold_timestamp:
+                all_records.append(r)
+        if len(all_records) >= expected_count:
+            break
+        print(f"found {len(all_records)}, {expected_count=}")
+        await asyncio.sleep(config.RETRY_SLEEP)
+    return all_records
+
+
+async def wait_for_kinesis(stream: str, expected_count: int, threshold_timestamp: int):
+    print("\n\tKinesis events\n")
+    print("fetching Kinesis event")
+
+    all_records = None
+    if config.KINESIS_CONSUMER_MODE == "efo":
+        # the enhanced fan-out reader runs its own threads
+        all_records = await asyncio.to_thread(
+            read_with_efo,
+            get_client("kinesis"),
+            stream,
+            expected_count,
+            threshold_timestamp,
+            config.RETRY_SLEEP,
+        )
+    if all_records is None:
+        all_records = await poll_kinesis(stream, expected_count, threshold_timestamp)
+    print(f"Received: {len(all_records)} events")
+    decoder = get_decoder(config.MESSAGE_FORMAT)
+    records_data = [decode_record(record, decoder) for record in all_records]
+    # file sinks block, keep them off the event loop
+    await asyncio.to_thread(get_sink().write, records_data)
+    return records_data
+
+
+# aiomysql pools are bound to the loop that created them, a later
+# `asyncio.run` gets its own
+_pools: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def _create_pool(credentials: Credentials):
+    return await aiomysql.create_pool(
+        user=credentials["username"],
+        password=credentials["password"],
+        host=credentials["host"],
+        db=credentials["dbname"],
+        port=int(credentials["port"]),
+        cursorclass=aiomysql.DictCursor,
+        maxsize=db.pool.max_idle,
+    )
+
+
+async def _aiomysql_pool(credentials: Credentials):
+    pools = _pools.setdefault(asyncio.get_running_loop(), {})
+    key = db._pool_key(credentials)
+    if key not in pools:
+        # concurrent callers wait for the same pool instead of creating theirs
+        pools[key] = asyncio.ensure_future(_create_pool(credentials))
+    creation = pools[key]
+    try:
+        return await asyncio.shield(creation)
+    except Exception:
+        if pools.get(key) is creation:
+            del pools[key]
+        raise
+
+
+async def run_queries_on_mysql(credentials: Credentials, queries: list[str]):
+    if aiomysql is None:
+        return await asyncio.to_thread(db.run_queries_on_mysql, credentials, queries)
+    async with (await _aiomysql_pool(credentials)).acquire() as cnx:
+        async with cnx.cursor() as cursor:
+            for query in queries:
+                await cursor.execute(query)
+        await cnx.commit()
+
+
+async def get_query_result(credentials: Credentials, query: str):
+    if aiomysql is None:
+        return await asyncio.to_thread(db.get_query_result, credentials, query)
+    async with (await _aiomysql_pool(credentials)).acquire() as cnx:
+        async with cnx.cursor() as cursor:
+            await cursor.execute(query)
+            result = await cursor.fetchall()
+        await cnx.rollback()
+        return result
+
+
+async def close():
+    """Close the aiomysql pools of the running loop, call before it ends"""
+    pools = _pools.pop(asyncio.get_running_loop(), {})
+    for creation in pools.values():
+        try:
+            pool = await creation
+        except Exception:
+            continue
+        pool.close()
+        await pool.wait_closed()
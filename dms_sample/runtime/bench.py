@@ -0,0 +1,243 @@
+"""Micro-benchmarks of the runtime hot paths.
+
+Each benchmark puts the current implementation next to the one the harness
+used before the runtime package existed. Everything but the database
+benchmark runs offline against fakes and the local Kinesis simulator:
+
+    python -m dms_sample.runtime.bench
+    python -m dms_sample.runtime.bench --db-secret <arn> --queries 200
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+from dms_sample.runtime import aio, clients, consumer, db, outputs, sinks, tasks
+
+_quiet = contextlib.redirect_stdout
+
+
+@contextlib.contextmanager
+def using(service: str, client):
+    previous = clients._clients.get(service)
+    clients.set_client(service, client)
+    try:
+        yield client
+    finally:
+        clients._clients.pop(service)
+        if previous is not None:
+            clients.set_client(service, previous)
+
+
+def timed(function, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def bench_clients(repeat: int) -> dict:
+    from boto3 import client
+
+    created = timed(lambda: client("dms", region_name="us-east-1"), 5)
+    with using("dms", object()):
+        cached = timed(lambda: clients.get_client("dms"), repeat)
+    return {
+        "bench": "clients",
+        "create_ms": round(created * 1e3, 2),
+        "cached_us": round(cached * 1e6, 3),
+    }
+
+
+class FakeSecrets:
+    def __init__(self):
+        self.calls = 0
+
+    def get_secret_value(self, SecretId):
+        self.calls += 1
+        secret = {
+            "host": "mariadb_server",
+            "port": 3306,
+            "username": "admin",
+            "password": "secret",
+            "dbname": "dms_sample",
+        }
+        return {"SecretString": json.dumps(secret)}
+
+
+def bench_credentials(repeat: int) -> dict:
+    with using("secretsmanager", FakeSecrets()) as fake:
+        outputs._secrets.pop("bench", None)
+        per_call = timed(lambda: outputs.get_credentials("bench"), repeat)
+        outputs._secrets.pop("bench", None)
+    return {
+        "bench": "credentials",
+        "calls": repeat,
+        "secret_fetches": fake.calls,
+        "per_call_us": round(per_call * 1e6, 2),
+    }
+
+
+class FakeDms:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def describe_replication_tasks(self, **kwargs):
+        time.sleep(self.latency)
+        return {"ReplicationTasks": [{"Status": "running"}]}
+
+
+def bench_waiter(repeat: int) -> dict:
+    with using("dms", FakeDms()), _quiet(io.StringIO()):
+        per_call = timed(lambda: tasks.wait_for_task_status("task", "running"), repeat)
+    return {"bench": "task_waiter", "per_call_us": round(per_call * 1e6, 2)}
+
+
+def bench_async_waiters(count: int, latency: float) -> dict:
+    """Wait for `count` tasks whose describe call takes `latency` seconds"""
+    task_arns = [f"task-{i}" for i in range(count)]
+
+    async def wait_all():
+        await asyncio.gather(
+            *(aio.wait_for_task_status(task, "running") for task in task_arns)
+        )
+
+    with using("dms", FakeDms(latency)), _quiet(io.StringIO()):
+        blocking = timed(
+            lambda: [tasks.wait_for_task_status(t, "running") for t in task_arns], 1
+        )
+        concurrent = timed(lambda: asyncio.run(wait_all()), 1)
+    return {
+        "bench": "async_waiters",
+        "tasks": count,
+        "blocking_ms": round(blocking * 1e3, 2),
+        "asyncio_ms": round(concurrent * 1e3, 2),
+    }
+
+
+def _legacy_poll(kinesis, stream: str, expected_count: int, threshold: float):
+    """The consumer of the harness before the runtime: first shard, from the start"""
+    shard_id = kinesis.describe_stream(StreamARN=stream)["StreamDescription"]["Shards"][
+        0
+    ]["ShardId"]
+    shard_iter = kinesis.get_shard_iterator(
+        StreamARN=stream, ShardId=shard_id, ShardIteratorType="TRIM_HORIZON"
+    )["ShardIterator"]
+    all_records = []
+    while shard_iter is not None:
+        res = kinesis.get_records(ShardIterator=shard_iter, Limit=50)
+        shard_iter = res["NextShardIterator"]
+        for r in res["Records"]:
+            if r["ApproximateArrivalTimestamp"].timestamp() > threshold:
+                all_records.append(r)
+        if len(all_records) >= expected_count:
+            break
+    return all_records
+
+
+def bench_consumer(history: int, events: int) -> dict:
+    """Wait for `events` new records on a stream retaining `history` older ones"""
+    from lib.simulator import LocalKinesis
+
+    kinesis = LocalKinesis()
+    kinesis.create_stream(StreamName="bench", ShardCount=1)
+    stream = kinesis.stream_arn("bench")
+    for i in range(history):
+        kinesis.put_record(StreamARN=stream, Data=b"{}", PartitionKey=str(i))
+    time.sleep(0.01)
+    threshold = time.time()
+    for i in range(events):
+        kinesis.put_record(StreamARN=stream, Data=b"{}", PartitionKey=str(i))
+
+    legacy = timed(lambda: _legacy_poll(kinesis, stream, events, threshold), 3)
+    with using("kinesis", kinesis), _quiet(io.StringIO()):
+        current = timed(lambda: consumer.poll_kinesis(stream, events, threshold), 3)
+    return {
+        "bench": "consumer",
+        "history": history,
+        "events": events,
+        "legacy_ms": round(legacy * 1e3, 2),
+        "current_ms": round(current * 1e3, 2),
+    }
+
+
+def bench_sinks(events: int) -> dict:
+    """Events per second written by each sink, pprint being the legacy one"""
+    from lib.format_bench import make_accounts_message
+
+    batch = [
+        {**make_accounts_message(i, 64, 0), "partition_key": "dms_sample.accounts"}
+        for i in range(events)
+    ]
+    result = {"bench": "sinks", "events": events}
+    with tempfile.TemporaryDirectory() as directory:
+        for spec in ("print", "ndjson", "sqlite", "parquet"):
+            path = os.path.join(directory, f"events.{spec}")
+            try:
+                sink = sinks.open_sink(f"{spec}:{path}" if spec != "print" else spec)
+            except RuntimeError:
+                # pyarrow isn't installed
+                continue
+            with _quiet(io.StringIO()):
+                started = time.perf_counter()
+                # closing flushes the buffered writes
+                with sink:
+                    sink.write(batch)
+                elapsed = time.perf_counter() - started
+            result[f"{spec}_events_per_sec"] = round(events / elapsed)
+    return result
+
+
+def bench_db(secret_arn: str, queries: int) -> dict:
+    credentials = outputs.get_credentials(secret_arn)
+    query = "SELECT 1"
+    unpooled = db.ConnectionPool(max_idle=0)
+
+    def without_pool():
+        with unpooled.connection(credentials) as cnx:
+            with cnx.cursor() as cursor:
+                cursor.execute(query)
+
+    legacy = timed(without_pool, queries)
+    current = timed(lambda: db.get_query_result(credentials, query), queries)
+    return {
+        "bench": "db",
+        "queries": queries,
+        "unpooled_ms": round(legacy * 1e3, 3),
+        "pooled_ms": round(current * 1e3, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m dms_sample.runtime.bench")
+    parser.add_argument("--repeat", type=int, default=10000)
+    parser.add_argument("--history", type=int, default=50000)
+    parser.add_argument("--events", type=int, default=10)
+    parser.add_argument("--sink-events", type=int, default=20000)
+    parser.add_argument("--tasks", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02, help="fake API s")
+    parser.add_argument("--db-secret", help="task secret ARN for the db benchmark")
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    results = [
+        bench_clients(args.repeat),
+        bench_credentials(args.repeat),
+        bench_waiter(args.repeat),
+        bench_async_waiters(args.tasks, args.latency),
+        bench_consumer(args.history, args.events),
+        bench_sinks(args.sink_events),
+    ]
+    if args.db_secret:
+        results.append(bench_db(args.db_secret, args.queries))
+    for result in results:
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""AWS clients created once per process and shared by every helper"""
+
+import threading
+
+from dms_sample.runtime import config
+
+_clients: dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def _create(service: str):
+    if service == "kinesis" and config.KINESIS_REPLAY_DIR:
+        from lib.capture import ReplayKinesis
+
+        return ReplayKinesis(config.KINESIS_REPLAY_DIR, config.KINESIS_REPLAY_PACE)
+
+    from boto3 import client
+
+    return client(service, endpoint_url=config.ENDPOINT_URL)
+
+
+def get_client(service: str):
+    client = _clients.get(service)
+    if client is None:
+        # boto3 client creation is not thread safe and costs tens of milliseconds
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                client = _clients[service] = _create(service)
+    return client
+
+
+def set_client(service: str, client):
+    """Replace the client of a service, e.g. with a fake or a local simulator"""
+    _clients[service] = client
@@ -0,0 +1,27 @@
+"""Environment settings shared by run.py, the tests and the tooling"""
+
+import os
+
+STACK_NAME = os.getenv("STACK_NAME", "")
+ENDPOINT_URL = os.getenv("ENDPOINT_URL")
+# Message format of the Kinesis target endpoint, selects the record decoder
+MESSAGE_FORMAT = os.getenv("MESSAGE_FORMAT", "json")
+# "polling" (get_records) or "efo" (enhanced fan-out with SubscribeToShard)
+KINESIS_CONSUMER_MODE = os.getenv("KINESIS_CONSUMER_MODE", "polling")
+
+# Where the consumer writes the decoded events, see dms_sample/runtime/sinks.py
+KINESIS_SINK = os.getenv("KINESIS_SINK", "print")
+
+# When set, Kinesis records are read from a capture written by lib.capture
+KINESIS_REPLAY_DIR = os.getenv("KINESIS_REPLAY_DIR", "")
+# "full" speed or the "original" recorded pace
+KINESIS_REPLAY_PACE = os.getenv("KINESIS_REPLAY_PACE", "full")
+
+# LocalStack answers quickly, AWS needs more patience
+RETRIES = 100 if not ENDPOINT_URL else 10
+RETRY_SLEEP = 5 if not ENDPOINT_URL else 1
+
+# When set, the consumer stages are profiled and dumped in this directory
+CONSUMER_PROFILE = os.getenv("CONSUMER_PROFILE", "")
+# Allocations are traced on one stage run out of this many
+CONSUMER_PROFILE_SAMPLE = int(os.getenv("CONSUMER_PROFILE_SAMPLE", "10"))
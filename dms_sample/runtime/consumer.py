@@ -0,0 +1,80 @@
+"""Kinesis consumer used to wait for the events DMS writes to the target stream"""
+
+from time import sleep
+from typing import Callable
+
+from dms_sample.runtime import config
+from dms_sample.runtime.clients import get_client
+from dms_sample.runtime.profiler import dump_profile, get_profiler
+from dms_sample.runtime.sinks import get_sink
+from lib.decoders import decode_record, get_decoder
+from lib.kinesis_efo import read_with_efo
+from lib.kinesis_reader import StreamCursor
+
+
+def poll_kinesis(stream: str, expected_count: int, threshold_timestamp: int):
+    profiler = get_profiler()
+    # starting at the threshold skips the retained history of the stream,
+    # which the consumer used to read from TRIM_HORIZON on every wait
+    cursor = StreamCursor(get_client("kinesis"), stream, threshold_timestamp)
+    all_records = []
+    while cursor.iterators:
+        with profiler.stage("fetch"):
+            records = cursor.read()
+        with profiler.stage("filter"):
+            for r in records:
+                if r["ApproximateArrivalTimestamp"].timestamp() > threshold_timestamp:
+                    all_records.append(r)
+        if len(all_records) >= expected_count:
+            break
+        print(f"found {len(all_records)}, {expected_count=}")
+        sleep(config.RETRY_SLEEP)
+    return all_records
+
+
+def wait_for_kinesis(stream: str, expected_count: int, threshold_timestamp: int):
+    print("\n\tKinesis events\n")
+    print("fetching Kinesis event")
+
+    profiler = get_profiler()
+    all_records = None
+    if config.KINESIS_CONSUMER_MODE == "efo":
+        # the subscription filters on the threshold while it reads
+        with profiler.stage("fetch"):
+            all_records = read_with_efo(
+                get_client("kinesis"),
+                stream,
+                expected_count,
+                threshold_timestamp,
+                config.RETRY_SLEEP,
+            )
+    if all_records is None:
+        all_records = poll_kinesis(stream, expected_count, threshold_timestamp)
+    print(f"Received: {len(all_records)} events")
+    decoder = get_decoder(config.MESSAGE_FORMAT)
+    with profiler.stage("decode"):
+        records_data = [decode_record(record, decoder) for record in all_records]
+    with profiler.stage("sink"):
+        get_sink().write(records_data)
+    dump_profile()
+    return records_data
+
+
+def wait_for_events(
+    cursor: StreamCursor, expected_count: int, owned: Callable[[dict], bool]
+) -> list[dict]:
+    """Wait for the next `expected_count` events selected by `owned`"""
+    print("\n\tKinesis events\n")
+    decoder = get_decoder(config.MESSAGE_FORMAT)
+    events = []
+    for _ in range(config.RETRIES + 1):
+        for record in cursor.read():
+            event = decode_record(record, decoder)
+            if owned(event):
+                events.append(event)
+        if len(events) >= expected_count:
+            break
+        print(f"found {len(events)}, {expected_count=}")
+        sleep(config.RETRY_SLEEP)
+    get_sink().write(events)
+    return events
@@ -0,0 +1,170 @@
+"""Pooled access to the source database.
+
+Every helper used to open and close its own connection, so a flow issuing a
+few dozen queries spent most of its time in TCP and authentication round
+trips. Connections are now kept per credentials and reused.
+"""
+
+import contextlib
+import threading
+from pprint import pprint
+from typing import Iterator
+
+import pymysql.cursors
+
+from dms_sample.runtime.outputs import Credentials
+
+TABLES = ["authors", "accounts", "novels"]
+
+
+def _pool_key(credentials: Credentials) -> tuple:
+    return (
+        credentials["host"],
+        int(credentials["port"]),
+        credentials["username"],
+        credentials["password"],
+        credentials["dbname"],
+    )
+
+
+class ConnectionPool:
+    def __init__(self, max_idle: int = 4):
+        self.max_idle = max_idle
+        self.idle: dict[tuple, list] = {}
+        self.lock = threading.Lock()
+
+    def _connect(self, credentials: Credentials):
+        return pymysql.connect(
+            user=credentials["username"],
+            password=credentials["password"],
+            host=credentials["host"],
+            database=credentials["dbname"],
+            cursorclass=pymysql.cursors.DictCursor,
+            port=int(credentials["port"]),
+        )
+
+    def acquire(self, credentials: Credentials):
+        key = _pool_key(credentials)
+        with self.lock:
+            idle = self.idle.get(key)
+            cnx = idle.pop() if idle else None
+        if cnx is None:
+            return self._connect(credentials)
+        try:
+            # the server may have dropped an idle connection
+            cnx.ping(reconnect=True)
+        except pymysql.err.Error:
+            cnx.close()
+            return self._connect(credentials)
+        return cnx
+
+    def release(self, credentials: Credentials, cnx):
+        key = _pool_key(credentials)
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(cnx)
+                return
+        cnx.close()
+
+    @contextlib.contextmanager
+    def connection(self, credentials: Credentials) -> Iterator:
+        cnx = self.acquire(credentials)
+        try:
+            yield cnx
+        except BaseException:
+            # the connection state is unknown, don't hand it out again
+            cnx.close()
+            raise
+        self.release(credentials, cnx)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for cnx in connections:
+                cnx.close()
+
+
+pool = ConnectionPool()
+
+
+def run_queries_on_mysql(
+    credentials: Credentials,
+    queries: list[str],
+):
+    with pool.connection(credentials) as cnx:
+        with cnx.cursor() as cursor:
+            for query in queries:
+                cursor.execute(query)
+        cnx.commit()
+
+
+def get_query_result(
+    credentials: Credentials,
+    query: str,
+    params: tuple | None = None,
+):
+    with pool.connection(credentials) as cnx:
+        with cnx.cursor() as cursor:
+            cursor.execute(query, params)
+            result = cursor.fetchall()
+        # end the transaction so the next reader of this connection gets a
+        # fresh snapshot
+        cnx.rollback()
+        return result
+
+
+def iter_query_result(
+    credentials: Credentials,
+    query: str,
+    params: tuple | None = None,
+) -> Iterator[dict]:
+    """Stream the rows of `query` instead of buffering the whole result set"""
+    with pool.connection(credentials) as cnx:
+        with cnx.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute(query, params)
+            yield from cursor
+        cnx.rollback()
+
+
+def get_table_counts(credentials: Credentials) -> dict:
+    """Get row counts for all tables"""
+    counts = {}
+    for table in TABLES:
+        try:
+            result = get_query_result(
+                credentials, f"SELECT COUNT(*) as count FROM {table}"
+            )
+            counts[table] = result[0]["count"] if result else 0
+        except Exception:
+            counts[table] = 0
+    print("\n=== Table Row Counts ===")
+    pprint(counts)
+    return counts
+
+
+def get_table_schemas(credentials: Credentials) -> dict:
+    """Get schema information for all tables"""
+    schemas = {}
+    for table in TABLES:
+        try:
+            schemas[table] = get_query_result(credentials, f"DESCRIBE {table}")
+        except Exception:
+            schemas[table] = None
+    print("\n=== Table Schemas ===")
+    pprint(schemas)
+    return schemas
+
+
+def get_all_table_data(credentials: Credentials) -> dict:
+    """Get all data from all tables"""
+    data = {}
+    for table in TABLES:
+        try:
+            data[table] = get_query_result(credentials, f"SELECT * FROM {table}")
+        except Exception:
+            data[table] = []
+    print("\n=== Table Contents ===")
+    pprint(data)
+    return data
@@ -0,0 +1,123 @@
+"""SQLite journal of a full load verification, to resume it after a failure.
+
+It records the steps already done (tables seeded, tasks completed), the
+primary keys seen in the stream with the shard positions they were read up
+to, and the primary key ranges verified against the source.
+"""
+
+import json
+import sqlite3
+import time
+from typing import Iterable
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS steps (
+    name TEXT PRIMARY KEY,
+    detail TEXT,
+    done_at REAL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    stream TEXT,
+    shard_id TEXT,
+    sequence_number TEXT,
+    PRIMARY KEY (stream, shard_id)
+);
+CREATE TABLE IF NOT EXISTS seen_keys (
+    table_name TEXT,
+    pk INTEGER,
+    PRIMARY KEY (table_name, pk)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS verified_ranges (
+    table_name TEXT,
+    low INTEGER,
+    high INTEGER,
+    rows INTEGER,
+    PRIMARY KEY (table_name, low)
+);
+"""
+
+
+class Journal:
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        # the journal only has to survive a failure of the harness, not the OS
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    # steps
+
+    def step(self, name: str) -> dict | None:
+        """Detail of a completed step, None when it still has to run"""
+        row = self.db.execute(
+            "SELECT detail FROM steps WHERE name = ?", (name,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def mark(self, name: str, detail: dict | None = None):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO steps VALUES (?, ?, ?)",
+                (name, json.dumps(detail or {}), time.time()),
+            )
+
+    # stream progress
+
+    def checkpoints(self, stream: str) -> dict[str, str]:
+        return dict(
+            self.db.execute(
+                "SELECT shard_id, sequence_number FROM checkpoints WHERE stream = ?",
+                (stream,),
+            )
+        )
+
+    def record_keys(
+        self,
+        keys: Iterable[tuple[str, int]],
+        stream: str,
+        positions: dict[str, str],
+    ):
+        """Store keys read from the stream together with the positions reached"""
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO seen_keys VALUES (?, ?)", keys)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)",
+                [(stream, shard, seq) for shard, seq in positions.items()],
+            )
+
+    def seen_keys(self, table: str, low: int, high: int) -> set[int]:
+        return {
+            pk
+            for (pk,) in self.db.execute(
+                "SELECT pk FROM seen_keys WHERE table_name = ? AND pk >= ? AND pk < ?",
+                (table, low, high),
+            )
+        }
+
+    # verification
+
+    def verified(self, table: str) -> set[int]:
+        """Lower bounds of the verified ranges of a table"""
+        return {
+            low
+            for (low,) in self.db.execute(
+                "SELECT low FROM verified_ranges WHERE table_name = ?", (table,)
+            )
+        }
+
+    def mark_verified(self, table: str, low: int, high: int, rows: int):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO verified_ranges VALUES (?, ?, ?, ?)",
+                (table, low, high, rows),
+            )
@@ -0,0 +1,65 @@
+"""Stack outputs and database credentials, fetched once per process"""
+
+import json
+from typing import TypedDict
+
+from dms_sample.runtime import config
+from dms_sample.runtime.clients import get_client
+
+
+class CfnOutput(TypedDict):
+    cdcTaskSecret: str
+    cdcTask1: str
+    cdcTask2: str
+
+    fullTaskSecret: str
+    fullTask1: str
+    fullTask2: str
+
+    kinesisStream: str
+
+
+class Credentials(TypedDict):
+    host: str
+    port: int
+    username: str
+    password: str
+    dbname: str
+
+
+_cfn_outputs: dict[str, CfnOutput] = {}
+_secrets: dict[str, str] = {}
+
+
+def get_cfn_output(stack_name: str = None) -> CfnOutput:
+    stack_name = stack_name or config.STACK_NAME
+    if stack_name in _cfn_outputs:
+        return CfnOutput(**_cfn_outputs[stack_name])
+
+    # describe only the stack we need instead of paging through all of them
+    cfn = get_client("cloudformation")
+    try:
+        stacks = cfn.describe_stacks(StackName=stack_name)["Stacks"]
+    except cfn.exceptions.ClientError:
+        stacks = []
+    if not stacks:
+        raise Exception(f"Stack {stack_name} Not found")
+
+    cfn_output = CfnOutput()
+    for output in stacks[0]["Outputs"]:
+        cfn_output[output["OutputKey"]] = output["OutputValue"]
+    _cfn_outputs[stack_name] = cfn_output
+    return CfnOutput(**cfn_output)
+
+
+def get_credentials(secret_arn: str) -> Credentials:
+    """Credentials of a task secret, a fresh copy callers are free to modify"""
+    if secret_arn not in _secrets:
+        secret_value = get_client("secretsmanager").get_secret_value(
+            SecretId=secret_arn
+        )
+        _secrets[secret_arn] = secret_value["SecretString"]
+    credentials = Credentials(**json.loads(_secrets[secret_arn]))
+    if credentials["host"] == "mariadb_server":
+        credentials["host"] = "localhost"
+    return credentials
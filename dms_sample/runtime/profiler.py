@@ -0,0 +1,142 @@
+"""Per stage profile of the consumer path (fetch, decode, filter, sink).
+
+Disabled unless `CONSUMER_PROFILE` names a directory. The profile records the
+wall time of each stage and, every `CONSUMER_PROFILE_SAMPLE` stage runs, the
+memory a stage allocated and kept with the allocating stacks (`tracemalloc`).
+Both are written as collapsed stacks, the input of `flamegraph.pl` and
+speedscope:
+
+    CONSUMER_PROFILE=profile make run
+    flamegraph.pl profile/consumer.time.collapsed > time.svg
+"""
+
+import contextlib
+import json
+import os
+import time
+import tracemalloc
+from collections import Counter
+from typing import Iterator
+
+from dms_sample.runtime import config
+
+TRACE_FRAMES = 16
+
+
+class StageProfiler:
+    def __init__(self, sample_every: int = 10, frames: int = TRACE_FRAMES):
+        self.sample_every = sample_every
+        self.frames = frames
+        self.stack: list[str] = []
+        self.children: list[float] = []
+        # self wall time in seconds per stage path
+        self.wall = Counter()
+        self.calls = Counter()
+        # bytes still allocated at the end of sampled runs, per collapsed stack
+        self.allocations = Counter()
+        self.sampled = Counter()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        entered = time.perf_counter()
+        path = ";".join([*self.stack, name])
+        self.calls[path] += 1
+        sample = self.sample_every and (self.calls[path] - 1) % self.sample_every == 0
+        # only trace the sampled runs, tracing slows every allocation down
+        start_tracing = sample and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start(self.frames)
+        before = tracemalloc.take_snapshot() if sample else None
+        self.stack.append(name)
+        self.children.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stack.pop()
+            children = self.children.pop()
+            self.wall[path] += elapsed - children
+            if before is not None:
+                self._record_allocations(path, before)
+            if start_tracing:
+                tracemalloc.stop()
+            if self.children:
+                # the snapshots don't count in the time of the parent stage
+                self.children[-1] += time.perf_counter() - entered
+
+    def _record_allocations(self, path: str, before: tracemalloc.Snapshot):
+        after = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        self.sampled[path] += 1
+        for diff in after.compare_to(before, "traceback"):
+            if diff.size_diff <= 0:
+                continue
+            # tracemalloc lists the most recent frame first
+            frames = [
+                f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                for frame in reversed(diff.traceback)
+            ]
+            self.allocations[";".join([path, *frames])] += diff.size_diff
+
+    def summary(self) -> dict:
+        stages = {}
+        for path, calls in self.calls.items():
+            sampled = self.sampled[path]
+            allocated = sum(
+                size
+                for stack, size in self.allocations.items()
+                if stack == path or stack.startswith(path + ";")
+            )
+            stages[path] = {
+                "calls": calls,
+                "self_ms": round(self.wall[path] * 1000, 2),
+                "kept_bytes_per_sample": (
+                    round(allocated / sampled) if sampled else None
+                ),
+            }
+        return stages
+
+    def dump(self, directory: str, name: str = "consumer"):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{name}.time.collapsed"), "w") as f:
+            # flame graphs need integer weights, microseconds here
+            f.writelines(
+                f"{path} {round(seconds * 1e6)}\n"
+                for path, seconds in sorted(self.wall.items())
+            )
+        with open(os.path.join(directory, f"{name}.alloc.collapsed"), "w") as f:
+            f.writelines(
+                f"{stack} {size}\n" for stack, size in sorted(self.allocations.items())
+            )
+        with open(os.path.join(directory, f"{name}.summary.json"), "w") as f:
+            json.dump(self.summary(), f, indent=2, sort_keys=True)
+
+
+class NullProfiler:
+    """Stands in for the profiler when profiling is disabled"""
+
+    def stage(self, name: str):
+        return contextlib.nullcontext()
+
+    def dump(self, directory: str, name: str = "consumer"):
+        pass
+
+
+_profiler = None
+
+
+def get_profiler() -> StageProfiler | NullProfiler:
+    global _profiler
+    if _profiler is None:
+        if config.CONSUMER_PROFILE:
+            _profiler = StageProfiler(config.CONSUMER_PROFILE_SAMPLE)
+        else:
+            _profiler = NullProfiler()
+    return _profiler
+
+
+def dump_profile():
+    if config.CONSUMER_PROFILE:
+        get_profiler().dump(config.CONSUMER_PROFILE)
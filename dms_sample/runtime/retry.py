@@ -0,0 +1,23 @@
+import time
+from typing import Callable, TypeVar
+
+from dms_sample.runtime import config
+
+T = TypeVar("T")
+
+
+def retry(
+    function: Callable[..., T],
+    retries=config.RETRIES,
+    sleep=config.RETRY_SLEEP,
+    **kwargs,
+) -> T:
+    raise_error = None
+    retries = int(retries)
+    for i in range(0, retries + 1):
+        try:
+            return function(**kwargs)
+        except Exception as error:
+            raise_error = error
+            time.sleep(sleep)
+    raise raise_error
@@ -0,0 +1,200 @@
+"""Destinations of the events the consumer decoded.
+
+Printing every event is the slowest way to get rid of them and leaves
+nothing to analyze afterwards. A sink takes batches of decoded events and
+`KINESIS_SINK` picks the one the consumer writes to:
+
+    print                   pretty print to stdout (default)
+    none                    drop the events, for throughput measurements
+    ndjson:events.ndjson    one JSON document per line
+    sqlite:events.sqlite    an `events` table, in WAL mode
+    parquet:events.parquet  columnar file, needs pyarrow
+"""
+
+import atexit
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pprint import pprint
+
+from dms_sample.runtime import config
+
+# one encoder for all events, json.dumps with arguments builds a new one
+_encode = json.JSONEncoder(separators=(",", ":"), default=str).encode
+
+# event fields stored in columns, the rest of the event is kept as JSON
+COLUMNS = (
+    "partition_key",
+    "record_type",
+    "operation",
+    "schema_name",
+    "table_name",
+    "timestamp",
+    "transaction_id",
+)
+
+
+def flatten(event: dict) -> dict:
+    metadata = event.get("metadata", {})
+    row = {
+        "partition_key": event.get("partition_key"),
+        "record_type": metadata.get("record-type"),
+        "operation": metadata.get("operation"),
+        "schema_name": metadata.get("schema-name"),
+        "table_name": metadata.get("table-name"),
+        "timestamp": metadata.get("timestamp"),
+        "transaction_id": metadata.get("transaction-id"),
+    }
+    for key in ("data", "before-image", "control"):
+        value = event.get(key)
+        row[key.replace("-", "_")] = None if value is None else _encode(value)
+    return row
+
+
+class Sink(ABC):
+    @abstractmethod
+    def write(self, events: list[dict]):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PrintSink(Sink):
+    def write(self, events: list[dict]):
+        pprint(events)
+
+
+class NullSink(Sink):
+    def write(self, events: list[dict]):
+        pass
+
+
+class NdjsonSink(Sink):
+    def __init__(self, path: str, buffer_size: int = 1024 * 1024):
+        self.file = open(path, "a", buffering=buffer_size)
+
+    def write(self, events: list[dict]):
+        self.file.write("".join(_encode(event) + "\n" for event in events))
+
+    def close(self):
+        self.file.close()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    partition_key TEXT,
+    record_type TEXT,
+    operation TEXT,
+    schema_name TEXT,
+    table_name TEXT,
+    timestamp TEXT,
+    transaction_id INTEGER,
+    data TEXT,
+    before_image TEXT,
+    control TEXT
+);
+"""
+SQLITE_INSERT = (
+    "INSERT INTO events VALUES (:partition_key, :record_type, :operation, "
+    ":schema_name, :table_name, :timestamp, :transaction_id, :data, "
+    ":before_image, :control)"
+)
+
+
+class SqliteSink(Sink):
+    def __init__(self, path: str):
+        # written from the consumer threads of the async helpers too
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SQLITE_SCHEMA)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.lock = threading.Lock()
+
+    def write(self, events: list[dict]):
+        # one statement prepared once and one transaction per batch
+        with self.lock, self.db:
+            self.db.executemany(SQLITE_INSERT, map(flatten, events))
+
+    def close(self):
+        self.db.close()
+
+
+class ParquetSink(Sink):
+    """Buffers the events and writes a row group every `row_group_size`"""
+
+    def __init__(self, path: str, row_group_size: int = 10000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError(
+                "The parquet sink requires pyarrow: pip install pyarrow"
+            ) from None
+        self.pa = pa
+        self.schema = pa.schema(
+            [(column, pa.string()) for column in COLUMNS if column != "transaction_id"]
+            + [("transaction_id", pa.int64())]
+            + [(column, pa.string()) for column in ("data", "before_image", "control")]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.row_group_size = row_group_size
+        self.rows: list[dict] = []
+
+    def write(self, events: list[dict]):
+        self.rows.extend(map(flatten, events))
+        while len(self.rows) >= self.row_group_size:
+            self._write_row_group(self.rows[: self.row_group_size])
+            del self.rows[: self.row_group_size]
+
+    def _write_row_group(self, rows: list[dict]):
+        table = self.pa.Table.from_pylist(rows, schema=self.schema)
+        self.writer.write_table(table, row_group_size=len(rows))
+
+    def close(self):
+        if self.rows:
+            self._write_row_group(self.rows)
+            self.rows = []
+        self.writer.close()
+
+
+SINKS = {
+    "print": PrintSink,
+    "none": NullSink,
+    "ndjson": NdjsonSink,
+    "sqlite": SqliteSink,
+    "parquet": ParquetSink,
+}
+
+
+def open_sink(spec: str) -> Sink:
+    """A sink from `kind` or `kind:path`"""
+    kind, _, path = spec.partition(":")
+    if kind not in SINKS:
+        raise ValueError(f"Unknown sink {kind!r}, expected one of {list(SINKS)}")
+    if kind in ("print", "none"):
+        return SINKS[kind]()
+    if not path:
+        raise ValueError(f"The {kind} sink needs a path, e.g. {kind}:events.{kind}")
+    return SINKS[kind](path)
+
+
+_sink = None
+_lock = threading.Lock()
+
+
+def get_sink() -> Sink:
+    """The sink of `KINESIS_SINK`, opened once and closed at exit"""
+    global _sink
+    with _lock:
+        if _sink is None:
+            _sink = open_sink(config.KINESIS_SINK)
+            atexit.register(_sink.close)
+        return _sink
@@ -0,0 +1,74 @@
+"""Replication task control and waiters"""
+
+import json
+
+from dms_sample.runtime.clients import get_client
+from dms_sample.runtime.retry import retry
+
+
+def start_type(task: str, migration_type: str) -> str:
+    """StartReplicationTaskType for `task`, which may have run before"""
+    if get_task_status(task) == "ready":
+        return "start-replication"
+    # a task that already ran either reloads its tables or resumes the CDC
+    return "reload-target" if migration_type == "full-load" else "resume-processing"
+
+
+def start_task(task: str, start_type: str = "start-replication"):
+    response = get_client("dms").start_replication_task(
+        ReplicationTaskArn=task, StartReplicationTaskType=start_type
+    )
+    status = response["ReplicationTask"].get("Status")
+    print(f"Replication Task {task} status: {status}")
+
+
+def stop_task(task: str):
+    response = get_client("dms").stop_replication_task(ReplicationTaskArn=task)
+    status = response["ReplicationTask"].get("Status")
+    print(f"\n Replication Task {task} status: {status}")
+
+
+def get_task_status(task: str) -> str:
+    return (
+        get_client("dms")
+        .describe_replication_tasks(
+            Filters=[{"Name": "replication-task-arn", "Values": [task]}],
+            WithoutSettings=True,
+        )["ReplicationTasks"][0]
+        .get("Status")
+    )
+
+
+def wait_for_task_status(task: str, expected_status: str):
+    print(f"Waiting for task status {expected_status}")
+
+    def _wait_for_status():
+        status = get_task_status(task)
+        print(f"{task=} {status=}")
+        assert status == expected_status
+
+    retry(_wait_for_status)
+
+
+def modify_task_settings(task: str, settings: dict):
+    """Change settings (e.g. TargetMetadata) of a stopped task"""
+    get_client("dms").modify_replication_task(
+        ReplicationTaskArn=task, ReplicationTaskSettings=json.dumps(settings)
+    )
+
+    def _wait_for_modified():
+        status = get_task_status(task)
+        print(f"{task=} {status=}")
+        assert status != "modifying"
+
+    retry(_wait_for_modified)
+
+
+def describe_table_statistics(task_arn: str):
+    res = get_client("dms").describe_table_statistics(
+        ReplicationTaskArn=task_arn,
+    )
+    res["TableStatistics"] = sorted(
+        res["TableStatistics"], key=lambda x: (x["SchemaName"], x["TableName"])
+    )
+    return res
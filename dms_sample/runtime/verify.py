@@ -0,0 +1,118 @@
+"""Resumable verification that every source row of a full load reached the stream"""
+
+from time import sleep
+from typing import Callable
+
+from dms_sample.runtime import config
+from dms_sample.runtime.clients import get_client
+from dms_sample.runtime.db import get_query_result
+from dms_sample.runtime.journal import Journal
+from dms_sample.runtime.outputs import Credentials
+from lib.decoders import get_decoder
+from lib.kinesis_reader import StreamCursor
+
+RANGE_SIZE = 10000
+
+
+class FullLoadVerifier:
+    def __init__(
+        self,
+        journal: Journal,
+        credentials: Credentials,
+        stream: str,
+        primary_keys: dict[str, tuple],
+        range_size: int = RANGE_SIZE,
+    ):
+        self.journal = journal
+        self.credentials = credentials
+        self.stream = stream
+        self.primary_keys = primary_keys
+        self.range_size = range_size
+        self.decoder = get_decoder(config.MESSAGE_FORMAT)
+
+    def step(self, name: str, action: Callable[[], dict | None]) -> dict:
+        """Run `action` unless the journal has it done already"""
+        detail = self.journal.step(name)
+        if detail is not None:
+            print(f"\tskipping {name}, done in a previous run")
+            return detail
+        detail = action() or {}
+        self.journal.mark(name, detail)
+        return detail
+
+    def _cursor(self, started: float) -> StreamCursor:
+        return StreamCursor(
+            get_client("kinesis"),
+            self.stream,
+            started,
+            self.journal.checkpoints(self.stream),
+        )
+
+    def read_stream(self, cursor: StreamCursor) -> int:
+        """Journal the primary keys of the full load records read by `cursor`,
+        return the number of records read"""
+        keys = []
+        records = cursor.read()
+        for record in records:
+            message = self.decoder(record["Data"])
+            metadata = message.get("metadata", {})
+            table = metadata.get("table-name")
+            if metadata.get("operation") != "load" or table not in self.primary_keys:
+                continue
+            (pk,) = self.primary_keys[table]
+            keys.append((table, message["data"][pk]))
+        self.journal.record_keys(keys, self.stream, cursor.positions)
+        return len(records)
+
+    def _ranges(self, table: str) -> list[tuple[int, int]]:
+        (pk,) = self.primary_keys[table]
+        bounds = get_query_result(
+            self.credentials, f"SELECT MIN({pk}) AS low, MAX({pk}) AS high FROM {table}"
+        )[0]
+        if bounds["low"] is None:
+            return []
+        start = bounds["low"] - bounds["low"] % self.range_size
+        return [
+            (low, low + self.range_size)
+            for low in range(start, bounds["high"] + 1, self.range_size)
+        ]
+
+    def verify_ranges(self, tables: list[str]) -> dict[str, int]:
+        """Verify the pending ranges, return the keys still missing per table"""
+        missing = {}
+        for table in tables:
+            (pk,) = self.primary_keys[table]
+            verified = self.journal.verified(table)
+            missing[table] = 0
+            for low, high in self._ranges(table):
+                if low in verified:
+                    continue
+                source = {
+                    row[pk]
+                    for row in get_query_result(
+                        self.credentials,
+                        f"SELECT {pk} FROM {table} "
+                        f"WHERE {pk} >= {low} AND {pk} < {high}",
+                    )
+                }
+                absent = source - self.journal.seen_keys(table, low, high)
+                if absent:
+                    missing[table] += len(absent)
+                else:
+                    self.journal.mark_verified(table, low, high, len(source))
+        return missing
+
+    def verify(self, tables: list[str], started: float, retries=config.RETRIES):
+        """Read the stream and verify until no source key is missing"""
+        cursor = self._cursor(started)
+        missing = {}
+        for attempt in range(retries + 1):
+            if attempt:
+                sleep(config.RETRY_SLEEP)
+            while self.read_stream(cursor):
+                pass
+            missing = self.verify_ranges(tables)
+            print(f"missing keys: {missing}")
+            if not any(missing.values()):
+                return
+        raise Exception(f"Full load incomplete, missing keys {missing}")
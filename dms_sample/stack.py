@@ -12,6 +12,15 @@ from aws_cdk import aws_rds as rds
 from aws_cdk import aws_secretsmanager as secretsmanager
 from constructs import Construct
 
+from dms_sample.lint import lint_stack
+from lib.decoders import MESSAGE_FORMATS
+from lib.table_mappings import (
+    check_overlaps,
+    migration_groups,
+    selection,
+    task_table_mappings,
+)
+
 DB_NAME = os.getenv("DB_NAME", "")
 
 # Only used for creating endpoint to containered Mariadb
@@ -20,6 +29,43 @@ USERNAME = os.getenv("USERNAME", "")
 DB_ENDPOINT = os.getenv("DB_ENDPOINT", "")
 DB_PORT = os.getenv("DB_PORT", "")
 
+# Kinesis target endpoint settings
+MESSAGE_FORMAT = os.getenv("MESSAGE_FORMAT", "json")
+KINESIS_INCLUDE_OPTIONS = (
+    "control_details",
+    "null_and_empty",
+    "partition_value",
+    "table_alter_operations",
+    "transaction_details",
+)
+# Comma separated subset of KINESIS_INCLUDE_OPTIONS, all of them by default
+KINESIS_INCLUDE = os.getenv("KINESIS_INCLUDE", ",".join(KINESIS_INCLUDE_OPTIONS))
+
+# Columns of the before-image of CDC update messages, see lib/before_image.py
+BEFORE_IMAGE_COLUMN_FILTERS = ("pk-only", "non-lob", "all")
+BEFORE_IMAGE_COLUMN_FILTER = os.getenv("BEFORE_IMAGE_COLUMN_FILTER", "all")
+
+# LOB handling of the tasks (TargetMetadata), LOB_MODE applies to both task
+# profiles unless FULL_LOAD_LOB_MODE or CDC_LOB_MODE overrides it
+LOB_MODES = ("none", "limited", "full")
+LOB_MODE = os.getenv("LOB_MODE", "limited")
+LOB_MODE_PER_MIGRATION_TYPE = {
+    "full-load": os.getenv("FULL_LOAD_LOB_MODE", LOB_MODE),
+    "cdc": os.getenv("CDC_LOB_MODE", LOB_MODE),
+}
+# Largest LOB in limited mode, larger values are truncated
+LOB_MAX_SIZE_KB = int(os.getenv("LOB_MAX_SIZE_KB", "32"))
+# Size of the pieces a LOB is fetched in, in full mode
+LOB_CHUNK_SIZE_KB = int(os.getenv("LOB_CHUNK_SIZE_KB", "64"))
+
+# Capacity of the replication instance and the target stream, checked against
+# the expected workload by dms_sample/lint.py
+REPLICATION_INSTANCE_CLASS = os.getenv("REPLICATION_INSTANCE_CLASS", "dms.t2.micro")
+REPLICATION_INSTANCE_STORAGE_GB = int(os.getenv("REPLICATION_INSTANCE_STORAGE_GB", "5"))
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+# Threads writing the changes of a CDC task to the stream, 0 applies serially
+PARALLEL_APPLY_THREADS = int(os.getenv("PARALLEL_APPLY_THREADS", "0"))
+
 
 class DmsSampleStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
@@ -89,6 +135,10 @@ class DmsSampleStack(Stack):
         # Creating a replication instance
         replication_instance = create_replication_instance(self, vpc, security_group)
 
+        # Tasks sharing a source must not replicate a table twice
+        mappings = task_table_mappings(DB_NAME)
+        check_overlaps(migration_groups(mappings), DB_NAME)
+
         # Cdc task processing tables accounts and authors
         cdc_task_1 = create_replication_task(
             self,
@@ -97,20 +147,7 @@ class DmsSampleStack(Stack):
             source=cdc_source_endpoint,
             target=target_endpoint,
             migration_type="cdc",
-            table_mappings={
-                "rules": [
-                    {
-                        "rule-type": "selection",
-                        "rule-id": "1",
-                        "rule-name": "tables-a-to-m",
-                        "object-locator": {
-                            "schema-name": DB_NAME,
-                            "table-name": "a%",
-                        },
-                        "rule-action": "include",
-                    }
-                ]
-            },
+            table_mappings=mappings["cdcTask1"],
         )
 
         # Cdc task processing table novels
@@ -121,20 +158,7 @@ class DmsSampleStack(Stack):
             source=cdc_source_endpoint,
             target=target_endpoint,
             migration_type="cdc",
-            table_mappings={
-                "rules": [
-                    {
-                        "rule-type": "selection",
-                        "rule-id": "1",
-                        "rule-name": "tables-n-to-z",
-                        "object-locator": {
-                            "schema-name": DB_NAME,
-                            "table-name": "novels",
-                        },
-                        "rule-action": "include",
-                    }
-                ]
-            },
+            table_mappings=mappings["cdcTask2"],
         )
 
         # Full load task processing tables tables accounts and authors
@@ -145,20 +169,7 @@ class DmsSampleStack(Stack):
             source=full_source_endpoint,
             target=target_endpoint,
             migration_type="full-load",
-            table_mappings={
-                "rules": [
-                    {
-                        "rule-type": "selection",
-                        "rule-id": "1",
-                        "rule-name": "tables-a-to-m",
-                        "object-locator": {
-                            "schema-name": DB_NAME,
-                            "table-name": "a%",
-                        },
-                        "rule-action": "include",
-                    }
-                ]
-            },
+            table_mappings=mappings["fullTask1"],
         )
 
         # Full load task processing tables novels
@@ -169,20 +180,7 @@ class DmsSampleStack(Stack):
             source=full_source_endpoint,
             target=target_endpoint,
             migration_type="full-load",
-            table_mappings={
-                "rules": [
-                    {
-                        "rule-type": "selection",
-                        "rule-id": "1",
-                        "rule-name": "tables-n-to-z",
-                        "object-locator": {
-                            "schema-name": DB_NAME,
-                            "table-name": "novels",
-                        },
-                        "rule-action": "include",
-                    }
-                ]
-            },
+            table_mappings=mappings["fullTask2"],
         )
 
         cdk.CfnOutput(self, "cdcTaskSecret", value=db_cdc_secret.secret_full_arn)
@@ -195,13 +193,37 @@ class DmsSampleStack(Stack):
 
         cdk.CfnOutput(self, "kinesisStream", value=kinesis_stream.stream_arn)
 
+        # Warn, or fail, when the stack can't carry the expected workload
+        lint_stack(self)
+
 
 # DMS helper functions
 
 
+def parse_include_options(include: str) -> set[str]:
+    options = {option.strip() for option in include.split(",") if option.strip()}
+    unknown = options - set(KINESIS_INCLUDE_OPTIONS)
+    if unknown:
+        raise ValueError(
+            f"Unknown KINESIS_INCLUDE options {sorted(unknown)}, "
+            f"expected a subset of {KINESIS_INCLUDE_OPTIONS}"
+        )
+    return options
+
+
 def create_kinesis_target_endpoint(
-    stack: Stack, target: kinesis.Stream, dms_assume_role: iam.Role
+    stack: Stack,
+    target: kinesis.Stream,
+    dms_assume_role: iam.Role,
+    message_format: str = MESSAGE_FORMAT,
+    include: str = KINESIS_INCLUDE,
 ) -> dms.CfnEndpoint:
+    if message_format not in MESSAGE_FORMATS:
+        raise ValueError(
+            f"Unsupported message format {message_format!r}, "
+            f"expected one of {MESSAGE_FORMATS}"
+        )
+    include_options = parse_include_options(include)
     return dms.CfnEndpoint(
         stack,
         "target",
@@ -209,18 +231,46 @@ def create_kinesis_target_endpoint(
         engine_name="kinesis",
         kinesis_settings=dms.CfnEndpoint.KinesisSettingsProperty(
             stream_arn=target.stream_arn,
-            message_format="json",
+            message_format=message_format,
             service_access_role_arn=dms_assume_role.role_arn,
-            include_control_details=True,
-            include_null_and_empty=True,
-            include_partition_value=True,
-            include_table_alter_operations=True,
-            include_transaction_details=True,
+            include_control_details="control_details" in include_options,
+            include_null_and_empty="null_and_empty" in include_options,
+            include_partition_value="partition_value" in include_options,
+            include_table_alter_operations="table_alter_operations" in include_options,
+            include_transaction_details="transaction_details" in include_options,
             partition_include_schema_table=True,
         ),
     )
 
 
+def lob_settings(
+    lob_mode: str,
+    max_size_kb: int = LOB_MAX_SIZE_KB,
+    chunk_size_kb: int = LOB_CHUNK_SIZE_KB,
+) -> dict:
+    """TargetMetadata task settings of a LOB mode"""
+    if lob_mode not in LOB_MODES:
+        raise ValueError(
+            f"Unsupported LOB mode {lob_mode!r}, expected one of {LOB_MODES}"
+        )
+    if lob_mode == "none":
+        # LOB columns are left out of the records
+        return {"SupportLobs": False}
+    if lob_mode == "limited":
+        return {
+            "SupportLobs": True,
+            "FullLobMode": False,
+            "LimitedSizeLobMode": True,
+            "LobMaxSize": max_size_kb,
+        }
+    return {
+        "SupportLobs": True,
+        "FullLobMode": True,
+        "LimitedSizeLobMode": False,
+        "LobChunkSize": chunk_size_kb,
+    }
+
+
 def create_source_endpoint(
     stack: Stack,
     endpoint_id,
@@ -292,8 +342,8 @@ def create_replication_instance(
     return dms.CfnReplicationInstance(
         stack,
         "replication-instance",
-        replication_instance_class="dms.t2.micro",
-        allocated_storage=5,
+        replication_instance_class=REPLICATION_INSTANCE_CLASS,
+        allocated_storage=REPLICATION_INSTANCE_STORAGE_GB,
         replication_subnet_group_identifier=replication_subnet_group.ref,
         allow_major_version_upgrade=False,
         auto_minor_version_upgrade=False,
@@ -313,26 +363,33 @@ def create_replication_task(
     migration_type: str = "cdc",
     table_mappings: dict = None,
     replication_task_settings: dict = None,
+    before_image_column_filter: str = BEFORE_IMAGE_COLUMN_FILTER,
+    lob_mode: str | None = None,
+    parallel_apply_threads: int = PARALLEL_APPLY_THREADS,
 ) -> dms.CfnReplicationTask:
+    if before_image_column_filter not in BEFORE_IMAGE_COLUMN_FILTERS:
+        raise ValueError(
+            f"Unsupported before-image column filter {before_image_column_filter!r}, "
+            f"expected one of {BEFORE_IMAGE_COLUMN_FILTERS}"
+        )
+    target_metadata = lob_settings(
+        lob_mode or LOB_MODE_PER_MIGRATION_TYPE.get(migration_type, LOB_MODE)
+    )
+    if migration_type == "cdc" and parallel_apply_threads:
+        target_metadata["ParallelApplyThreads"] = parallel_apply_threads
     if not table_mappings:
-        table_mappings = {
-            "rules": [
-                {
-                    "rule-type": "selection",
-                    "rule-id": "1",
-                    "rule-name": "rule1",
-                    "object-locator": {"schema-name": DB_NAME, "table-name": "%"},
-                    "rule-action": "include",
-                }
-            ]
-        }
+        table_mappings = selection("rule1", DB_NAME, "%")
     if not replication_task_settings:
-        replication_task_settings = {"Logging": {"EnableLogging": True}}
+        replication_task_settings = {
+            "Logging": {"EnableLogging": True},
+            "TargetMetadata": target_metadata,
+        }
         if migration_type == "cdc":
             replication_task_settings["BeforeImageSettings"] = {
                 "EnableBeforeImage": True,
                 "FieldName": "before-image",
-                "ColumnFilter": "all",  # pk-only will only report the e.g. "author_id": 1
+                # pk-only will only report the e.g. "author_id": 1
+                "ColumnFilter": before_image_column_filter,
             }
 
     return dms.CfnReplicationTask(
@@ -353,7 +410,10 @@ def create_replication_task(
 
 def create_kinesis_stream(stack: Stack, dms_assume_role: iam.Role) -> kinesis.Stream:
     target_stream = kinesis.Stream(
-        stack, "TargetStream", shard_count=1, retention_period=cdk.Duration.hours(24)
+        stack,
+        "TargetStream",
+        shard_count=SHARD_COUNT,
+        retention_period=cdk.Duration.hours(24),
     )
     target_stream.grant_read_write(dms_assume_role)
     target_stream.apply_removal_policy(cdk.RemovalPolicy.DESTROY)
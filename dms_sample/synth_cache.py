@@ -0,0 +1,97 @@
+"""Reuse of the previous cloud assembly when the stack inputs didn't change.
+
+Building `DmsSampleStack` starts jsii and instantiates the whole construct
+tree, which dominates `cdk synth` and `cdklocal deploy`. `app.py` first
+fingerprints what the template depends on: the sources of the app and of
+the modules the stack imports, the environment variables they read, the
+CDK context and the aws-cdk-lib version. When the output directory holds an
+assembly synthesized with the same fingerprint it is left as is and the
+construct tree isn't built. `SYNTH_CACHE=0` always synthesizes.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from importlib import metadata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the app and every module the stack can import
+SOURCES = ("app.py", "cdk.json", "dms_sample/*.py", "lib/*.py")
+FINGERPRINT_FILE = "synth-fingerprint.json"
+_GETENV = re.compile(r"""os\.getenv\(\s*["']([A-Za-z0-9_]+)["']""")
+
+
+def source_files(root: str = ROOT) -> list[str]:
+    return sorted(
+        path
+        for pattern in SOURCES
+        for path in glob.glob(os.path.join(root, pattern))
+        if os.path.isfile(path)
+    )
+
+
+def fingerprint(root: str = ROOT, environ=None) -> str:
+    environ = os.environ if environ is None else environ
+    digest = hashlib.sha256()
+    names = set()
+    for path in source_files(root):
+        with open(path, "rb") as f:
+            content = f.read()
+        digest.update(os.path.relpath(path, root).encode() + b"\0" + content)
+        names.update(_GETENV.findall(content.decode("utf-8", "replace")))
+    # the CLI passes the context and the target environment as CDK_* variables
+    names.update(n for n in environ if n.startswith("CDK_") and n != "CDK_OUTDIR")
+    inputs = {name: environ.get(name) for name in sorted(names)}
+    try:
+        inputs["aws-cdk-lib"] = metadata.version("aws-cdk-lib")
+    except metadata.PackageNotFoundError:
+        pass
+    digest.update(json.dumps(inputs, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def is_cached(outdir: str | None, key: str) -> bool:
+    if not outdir:
+        return False
+    try:
+        with open(os.path.join(outdir, FINGERPRINT_FILE)) as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return False
+    # an assembly the app wrote completely, with every file it listed
+    return stored.get("fingerprint") == key and all(
+        os.path.exists(os.path.join(outdir, name)) for name in stored.get("files", [])
+    )
+
+
+def store(outdir: str | None, key: str, timings: dict):
+    if not outdir:
+        return
+    files = sorted(name for name in os.listdir(outdir) if name != FINGERPRINT_FILE)
+    with open(os.path.join(outdir, FINGERPRINT_FILE), "w") as f:
+        json.dump({"fingerprint": key, "files": files, "timings": timings}, f)
+
+
+class SynthTimer:
+    """Wall time of the synth phases, reported on stderr"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases: dict[str, float] = {}
+
+    def phase(self, name: str):
+        now = time.perf_counter()
+        self.phases[name] = round(now - self.last, 3)
+        self.last = now
+
+    def report(self, cached: bool) -> dict:
+        timings = {**self.phases, "total": round(self.last - self.started, 3)}
+        phases = ", ".join(f"{name} {s:.2f}s" for name, s in timings.items())
+        state = "reused the cached assembly" if cached else "synthesized"
+        print(f"synth: {state} ({phases})", file=sys.stderr)
+        return timings
@@ -0,0 +1,5 @@
+# Sourced by the mariadb entrypoint on first start: lets the sample user create
+# the per worker schemas (<database>_gw0, ...) of the parallel test suite
+docker_process_sql --database=mysql <<-EOSQL
+	GRANT ALL PRIVILEGES ON \`${MARIADB_DATABASE}\_%\`.* TO '${MARIADB_USER}'@'%';
+EOSQL
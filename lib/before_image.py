@@ -0,0 +1,227 @@
+"""Diff engine for the before-images of CDC update messages.
+
+The CDC tasks add the full row before the change to every update message
+(`BeforeImageSettings` with `ColumnFilter: "all"`). This tool turns update
+messages into per-column change sets, counts how often each column of each
+table changes and measures what the before-image costs under each column
+filter, to pick `BEFORE_IMAGE_COLUMN_FILTER` for update heavy tables:
+
+    python -m lib.before_image --stream <arn> [--since <ts>]
+    python -m lib.before_image --file capture.ndjson --primary-keys orders=id
+"""
+
+import argparse
+import json
+import operator
+import os
+from collections import Counter, defaultdict
+from itertools import compress
+from typing import Iterable
+
+from lib.decoders import get_decoder
+from lib.query import LOB_COLUMNS, PRIMARY_KEYS
+from lib.record_size import compact_size, field_size, load_capture, table_of
+
+BEFORE_IMAGE_FIELD = "before-image"
+COLUMN_FILTERS = ("pk-only", "non-lob", "all")
+# Updates diffed together, bounds the memory of the column arrays
+BATCH_SIZE = 10000
+
+_MISSING = object()
+
+
+def is_update(message: dict) -> bool:
+    return (
+        message.get("metadata", {}).get("operation") == "update"
+        and BEFORE_IMAGE_FIELD in message
+    )
+
+
+def diff_table(updates: list[dict]) -> tuple[list[str], list[list[bool]]]:
+    """Columnar diff of the updates of one table.
+
+    Returns the columns and, for each column, whether it changed in each
+    update. A column absent from the before-image is reported unchanged.
+    """
+    afters = [message.get("data") or {} for message in updates]
+    befores = [message[BEFORE_IMAGE_FIELD] or {} for message in updates]
+    columns = sorted({column for row in afters for column in row})
+    masks = []
+    for column in columns:
+        after = [row.get(column) for row in afters]
+        before = [row.get(column, _MISSING) for row in befores]
+        if _MISSING in before:
+            masks.append([b is not _MISSING and b != a for b, a in zip(before, after)])
+        else:
+            masks.append(list(map(operator.ne, before, after)))
+    return columns, masks
+
+
+def covers_row(message: dict) -> bool:
+    """Whether the before-image has every column of the row after the update"""
+    before = message[BEFORE_IMAGE_FIELD] or {}
+    return (message.get("data") or {}).keys() <= before.keys()
+
+
+def change_sets(columns: list[str], masks: list[list[bool]]) -> list[tuple]:
+    """Changed columns of every update, transposed from the column masks"""
+    return [tuple(compress(columns, row)) for row in zip(*masks)]
+
+
+def project_before_image(
+    before: dict, column_filter: str, primary_key: Iterable[str], lobs: Iterable[str]
+) -> dict:
+    if column_filter == "pk-only":
+        return {column: before[column] for column in primary_key if column in before}
+    if column_filter == "non-lob":
+        lobs = set(lobs)
+        return {k: v for k, v in before.items() if k not in lobs}
+    return before
+
+
+class BeforeImageReport:
+    def __init__(
+        self,
+        primary_keys: dict[str, tuple] = PRIMARY_KEYS,
+        lob_columns: dict[str, tuple] = LOB_COLUMNS,
+    ):
+        self.primary_keys = primary_keys
+        self.lob_columns = lob_columns
+        self.pending: dict[str, list[dict]] = defaultdict(list)
+        self.updates = Counter()
+        self.noop_updates = Counter()
+        # no change seen, but the before-image doesn't have every column
+        self.unknown_updates = Counter()
+        self.changes: dict[str, Counter] = defaultdict(Counter)
+        self.record_bytes = Counter()
+        self.before_image_bytes: dict[str, Counter] = defaultdict(Counter)
+
+    def add(self, message: dict, size: int | None = None):
+        """Add a decoded message, `size` being its size on the stream"""
+        if not is_update(message):
+            return
+        table = table_of(message)
+        self.record_bytes[table] += size if size is not None else compact_size(message)
+        self.pending[table].append(message)
+        if len(self.pending[table]) >= BATCH_SIZE:
+            self._flush(table)
+
+    def _flush(self, table: str):
+        updates = self.pending.pop(table, [])
+        if not updates:
+            return
+        columns, masks = diff_table(updates)
+        self.updates[table] += len(updates)
+        for column, mask in zip(columns, masks):
+            self.changes[table][column] += mask.count(True)
+        for changed, message in zip(change_sets(columns, masks), updates):
+            if not changed:
+                if covers_row(message):
+                    self.noop_updates[table] += 1
+                else:
+                    self.unknown_updates[table] += 1
+
+        name = updates[0]["metadata"].get("table-name", "")
+        primary_key = self.primary_keys.get(name, ())
+        lobs = self.lob_columns.get(name, ())
+        costs = self.before_image_bytes[table]
+        for message in updates:
+            before = message[BEFORE_IMAGE_FIELD] or {}
+            full = field_size(BEFORE_IMAGE_FIELD, before)
+            costs["all"] += full
+            # derived from the full size, serializing only the small parts
+            costs["non-lob"] += full - sum(
+                field_size(column, before[column])
+                for column in lobs
+                if column in before
+            )
+            costs["pk-only"] += field_size(
+                BEFORE_IMAGE_FIELD,
+                project_before_image(before, "pk-only", primary_key, lobs),
+            )
+
+    def summary(self) -> dict:
+        for table in list(self.pending):
+            self._flush(table)
+        tables = {}
+        for table, updates in sorted(self.updates.items()):
+            record_bytes = self.record_bytes[table]
+            all_bytes = self.before_image_bytes[table]["all"]
+            tables[table] = {
+                "updates": updates,
+                "noop_updates": self.noop_updates[table],
+                "unknown_updates": self.unknown_updates[table],
+                "column_change_frequency": {
+                    column: round(changes / updates, 3)
+                    for column, changes in self.changes[table].most_common()
+                },
+                "avg_record_bytes": round(record_bytes / updates, 1),
+                "before_image": {
+                    column_filter: {
+                        "avg_bytes": round(size / updates, 1),
+                        "record_percent": round(100 * size / record_bytes, 1),
+                        "saved_vs_all_percent": round(
+                            100 * (all_bytes - size) / record_bytes, 1
+                        ),
+                    }
+                    for column_filter, size in self.before_image_bytes[table].items()
+                },
+            }
+        return tables
+
+
+def analyze(raw_records: Iterable[bytes], message_format: str = "json", **kwargs):
+    decoder = get_decoder(message_format)
+    report = BeforeImageReport(**kwargs)
+    for raw in raw_records:
+        report.add(decoder(raw), len(raw))
+    return report.summary()
+
+
+def parse_table_columns(values: list[str]) -> dict[str, tuple]:
+    """["orders=id,region"] -> {"orders": ("id", "region")}"""
+    tables = {}
+    for value in values:
+        table, _, columns = value.partition("=")
+        tables[table] = tuple(c.strip() for c in columns.split(",") if c.strip())
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.before_image")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--stream", help="Kinesis stream ARN")
+    source.add_argument("--file", help="capture file of lib.record_size --save")
+    parser.add_argument("--since", type=float, help="only records after epoch")
+    parser.add_argument("--format", default=os.getenv("MESSAGE_FORMAT", "json"))
+    parser.add_argument(
+        "--primary-keys", action="append", default=[], metavar="TABLE=COL,..."
+    )
+    parser.add_argument(
+        "--lob-columns", action="append", default=[], metavar="TABLE=COL,..."
+    )
+    args = parser.parse_args()
+
+    if args.file:
+        raw_records = (raw for raw, _ in load_capture(args.file))
+    else:
+        from boto3 import client
+
+        from lib.kinesis_reader import iter_stream_records
+
+        kinesis = client("kinesis", endpoint_url=os.getenv("ENDPOINT_URL"))
+        raw_records = (
+            record["Data"]
+            for record in iter_stream_records(kinesis, args.stream, args.since)
+        )
+    result = analyze(
+        raw_records,
+        args.format,
+        primary_keys={**PRIMARY_KEYS, **parse_table_columns(args.primary_keys)},
+        lob_columns={**LOB_COLUMNS, **parse_table_columns(args.lob_columns)},
+    )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""Background sampler of the change rate of the source database.
+
+DMS reads the binlog of the source, so the binlog growth predicts the load
+the tasks are about to write to the stream. The sampler reads the binlog
+sizes (`SHOW BINARY LOGS`, `SHOW MASTER STATUS`) and the table estimates of
+`information_schema.TABLES` for the schema of the credentials at a fixed
+cadence, and appends one CSV row per table and sample with the binlog bytes
+per second attributed to the table.
+
+The binlog doesn't tell which table its bytes belong to: they are split
+between the tables by the rows they changed (`information_schema.
+TABLE_STATISTICS` when MariaDB runs with `userstat=1`) or else by the change
+of their row count and data length estimates, weighted by the average row
+length. Reading the binlog sizes needs the `BINLOG MONITOR` (or `REPLICATION
+CLIENT`) privilege.
+
+    python -m lib.binlog_sampler sample --db-secret <arn> --seconds 60 --output binlog.csv
+    python -m lib.binlog_sampler compare --binlog binlog.csv --stream <arn>
+"""
+
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Callable
+
+import pymysql
+
+CSV_FIELDS = [
+    "timestamp",
+    "schema",
+    "table",
+    "binlog_file",
+    "binlog_position",
+    "table_rows",
+    "data_length",
+    "avg_row_length",
+    "rows_changed_per_sec",
+    "binlog_bytes_per_sec",
+]
+# the row of a sample holding the rate of the whole binlog
+ALL_TABLES = "*"
+UNATTRIBUTED = "(unattributed)"
+
+TABLES_QUERY = """SELECT TABLE_NAME AS name, TABLE_ROWS AS table_rows,
+    DATA_LENGTH AS data_length, AVG_ROW_LENGTH AS avg_row_length
+FROM information_schema.TABLES
+WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE'"""
+TABLE_STATISTICS_QUERY = """SELECT TABLE_NAME AS name, ROWS_CHANGED AS rows_changed
+FROM information_schema.TABLE_STATISTICS WHERE TABLE_SCHEMA = %s"""
+
+
+def binlog_growth(previous: dict[str, int], current: dict[str, int]) -> int:
+    """Bytes written to the binlog between two `SHOW BINARY LOGS` listings"""
+    growth = 0
+    for name, size in current.items():
+        # a file created since the previous sample grew from nothing
+        growth += max(size - previous.get(name, 0), 0)
+    return growth
+
+
+def table_weights(
+    previous: dict[str, dict], current: dict[str, dict]
+) -> dict[str, float]:
+    """Estimated rows changed per table between two samples of the tables"""
+    weights = {}
+    for name, table in current.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        if (
+            table.get("rows_changed") is not None
+            and before.get("rows_changed") is not None
+        ):
+            weights[name] = max(table["rows_changed"] - before["rows_changed"], 0)
+            continue
+        row_length = table["avg_row_length"] or 1
+        rows = abs((table["table_rows"] or 0) - (before["table_rows"] or 0))
+        data = abs((table["data_length"] or 0) - (before["data_length"] or 0))
+        weights[name] = max(rows, data / row_length)
+    return weights
+
+
+def attribute(
+    binlog_bytes: float,
+    weights: dict[str, float],
+    row_lengths: dict[str, int],
+) -> dict[str, float]:
+    """Split `binlog_bytes` between the tables, by the bytes of changed rows"""
+    shares = {
+        name: weight * (row_lengths.get(name) or 1)
+        for name, weight in weights.items()
+        if weight
+    }
+    total = sum(shares.values())
+    if not total:
+        return {UNATTRIBUTED: binlog_bytes} if binlog_bytes else {}
+    return {name: binlog_bytes * share / total for name, share in shares.items()}
+
+
+class BinlogSampler:
+    """Sample the binlog and tables of the source every `interval` seconds.
+
+    `query` runs a statement with the credentials and returns its rows as
+    dicts (`dms_sample.runtime.get_query_result`). Use as a context manager
+    around a flow, or call `start()`/`stop()`.
+    """
+
+    def __init__(
+        self,
+        credentials: dict,
+        output: str,
+        interval: float = 5.0,
+        query: Callable | None = None,
+    ):
+        if query is None:
+            from dms_sample.runtime import get_query_result
+
+            query = get_query_result
+        self.credentials = credentials
+        self.schema = credentials["dbname"]
+        self.output = output
+        self.interval = interval
+        self.query = query
+        self.errors = 0
+        self._previous: tuple[float, dict, dict] | None = None
+        self._table_statistics = True
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _binlogs(self) -> tuple[dict[str, int], tuple[str, int]]:
+        logs = {
+            row["Log_name"]: int(row["File_size"])
+            for row in self.query(self.credentials, "SHOW BINARY LOGS")
+        }
+        status = self.query(self.credentials, "SHOW MASTER STATUS")
+        position = (
+            (status[0]["File"], int(status[0]["Position"])) if status else ("", 0)
+        )
+        return logs, position
+
+    def _tables(self) -> dict[str, dict]:
+        tables = {
+            row["name"]: dict(row)
+            for row in self.query(self.credentials, TABLES_QUERY, (self.schema,))
+        }
+        if self._table_statistics:
+            try:
+                rows = self.query(
+                    self.credentials, TABLE_STATISTICS_QUERY, (self.schema,)
+                )
+            except pymysql.err.Error:
+                # the userstat plugin isn't there, only use the estimates
+                self._table_statistics = False
+                rows = []
+            for row in rows:
+                if row["name"] in tables:
+                    tables[row["name"]]["rows_changed"] = row["rows_changed"]
+        return tables
+
+    def sample(self, writer: csv.DictWriter) -> int:
+        now = time.time()
+        logs, (binlog_file, binlog_position) = self._binlogs()
+        tables = self._tables()
+        previous, self._previous = self._previous, (now, logs, tables)
+        if previous is None:
+            return 0
+        previous_ts, previous_logs, previous_tables = previous
+        elapsed = max(now - previous_ts, 1e-3)
+        growth = binlog_growth(previous_logs, logs)
+        weights = table_weights(previous_tables, tables)
+        shares = attribute(
+            growth,
+            weights,
+            {name: table["avg_row_length"] for name, table in tables.items()},
+        )
+        common = {
+            "timestamp": round(now, 3),
+            "schema": self.schema,
+            "binlog_file": binlog_file,
+            "binlog_position": binlog_position,
+        }
+        writer.writerow(
+            {
+                **common,
+                "table": ALL_TABLES,
+                "rows_changed_per_sec": round(sum(weights.values()) / elapsed, 3),
+                "binlog_bytes_per_sec": round(growth / elapsed, 1),
+            }
+        )
+        for name in sorted(set(tables) | set(shares)):
+            table = tables.get(name, {})
+            writer.writerow(
+                {
+                    **common,
+                    "table": name,
+                    "table_rows": table.get("table_rows", ""),
+                    "data_length": table.get("data_length", ""),
+                    "avg_row_length": table.get("avg_row_length", ""),
+                    "rows_changed_per_sec": round(weights.get(name, 0) / elapsed, 3),
+                    "binlog_bytes_per_sec": round(shares.get(name, 0) / elapsed, 1),
+                }
+            )
+        return len(tables) + 1
+
+    def _run(self):
+        with open(self.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            while True:
+                started = time.monotonic()
+                try:
+                    self.sample(writer)
+                    f.flush()
+                except Exception as error:
+                    self.errors += 1
+                    print(f"binlog sampler: {error}")
+                remaining = self.interval - (time.monotonic() - started)
+                if self._stop.wait(max(remaining, 0)):
+                    break
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="binlog-sampler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# Source binlog rate next to the stream arrival rate
+
+
+def binlog_rates(path: str) -> tuple[dict[str, float], float]:
+    """Average binlog bytes per second per table of a sampler CSV, and its span"""
+    totals = defaultdict(float)
+    timestamps = set()
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            timestamps.add(float(row["timestamp"]))
+            totals[row["table"]] += float(row["binlog_bytes_per_sec"])
+    samples = len(timestamps)
+    span = max(timestamps) - min(timestamps) if samples > 1 else 0.0
+    return {table: total / samples for table, total in totals.items()}, span
+
+
+def stream_rates(records, seconds: float, message_format: str = "json") -> dict:
+    """Bytes per second per table of the Kinesis records over `seconds`"""
+    from lib.decoders import get_decoder
+
+    decoder = get_decoder(message_format)
+    totals = defaultdict(float)
+    for record in records:
+        metadata = decoder(record["Data"]).get("metadata", {})
+        totals[metadata.get("table-name", "")] += len(record["Data"])
+        totals[ALL_TABLES] += len(record["Data"])
+    return {table: total / max(seconds, 1e-3) for table, total in totals.items()}
+
+
+def compare(source: dict[str, float], stream: dict[str, float]) -> dict:
+    return {
+        table: {
+            "binlog_bytes_per_sec": round(source.get(table, 0), 1),
+            "stream_bytes_per_sec": round(stream.get(table, 0), 1),
+            # bytes DMS writes to the stream per byte of binlog
+            "amplification": (
+                round(stream[table] / source[table], 2)
+                if source.get(table) and table in stream
+                else None
+            ),
+        }
+        for table in sorted(set(source) | set(stream))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.binlog_sampler")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sample = commands.add_parser("sample")
+    sample.add_argument("--db-secret", required=True, help="source secret ARN")
+    sample.add_argument("--interval", type=float, default=5)
+    sample.add_argument("--seconds", type=float, default=60)
+    sample.add_argument("--output", required=True)
+    compare_cmd = commands.add_parser("compare")
+    compare_cmd.add_argument("--binlog", required=True, help="CSV of the sampler")
+    compare_cmd.add_argument("--stream", required=True, help="Kinesis stream ARN")
+    compare_cmd.add_argument("--since", type=float, help="epoch, the CSV start")
+    args = parser.parse_args()
+
+    if args.command == "sample":
+        from dms_sample.runtime import get_credentials
+
+        sampler = BinlogSampler(
+            get_credentials(args.db_secret), args.output, args.interval
+        )
+        with sampler:
+            time.sleep(args.seconds)
+        print(f"sampled into {args.output}, {sampler.errors} errors")
+        return
+
+    from boto3 import client
+
+    from lib.kinesis_reader import iter_stream_records
+
+    source, span = binlog_rates(args.binlog)
+    with open(args.binlog, newline="") as f:
+        since = args.since or min(float(r["timestamp"]) for r in csv.DictReader(f))
+    kinesis = client("kinesis", endpoint_url=os.getenv("ENDPOINT_URL"))
+    records = [
+        record
+        for record in iter_stream_records(kinesis, args.stream, since)
+        if record["ApproximateArrivalTimestamp"].timestamp() <= since + span
+    ]
+    stream = stream_rates(records, span, os.getenv("MESSAGE_FORMAT", "json"))
+    print(json.dumps(compare(source, stream), indent=2))
+
+
+if __name__ == "__main__":
+    main()
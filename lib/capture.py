@@ -0,0 +1,427 @@
+"""Record-and-replay of the target stream through local segment files.
+
+`record` drains every shard of the stream into a capture directory:
+
+- `segment-NNNNN.seg`: length-prefixed zlib blocks, each holding up to
+  `BLOCK_RECORDS` records (arrival, shard, sequence number, partition key, data)
+- `index.bin`: one entry per record with its segment, block offset, arrival
+  timestamp and sequence number, used to seek without decompressing
+- `manifest.json`: stream ARN, shard descriptions and segment names
+
+`ReplayKinesis` serves a capture through the Kinesis calls used by the
+harness, reading the segments through `mmap`, either at full speed or at the
+recorded pace. Arrival timestamps are rebased on the start of the replay (the
+first `get_shard_iterator` call) so the `threshold_timestamp` filtering of
+`wait_for_kinesis` keeps working.
+
+    python -m lib.capture record --stream <arn> --dir ./capture
+    python -m lib.capture replay --dir ./capture [--pace original] [--speed 2]
+    KINESIS_REPLAY_DIR=./capture python run.py
+"""
+
+import argparse
+import bisect
+import datetime
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Iterable
+
+from lib.simulator import InvalidArgumentException
+
+SEGMENT_BYTES = 64 * 1024 * 1024
+BLOCK_RECORDS = 256
+COMPRESSION_LEVEL = 1
+
+# compressed length, record count
+BLOCK_HEADER = struct.Struct("<II")
+# arrival, shard index, sequence number length, partition key length, data length
+RECORD_HEADER = struct.Struct("<dHHHI")
+# segment, block offset, arrival, shard index, sequence number length
+INDEX_ENTRY = struct.Struct("<IQdHH")
+
+MANIFEST = "manifest.json"
+INDEX = "index.bin"
+
+
+def segment_name(number: int) -> str:
+    return f"segment-{number:05d}.seg"
+
+
+class SegmentWriter:
+    def __init__(self, directory: str, stream: str, shards: list[dict]):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.stream = stream
+        self.shards = shards
+        self.shard_index = {shard["ShardId"]: i for i, shard in enumerate(shards)}
+        self.segments: list[str] = []
+        self.records = 0
+        self.first_arrival = None
+        self.last_arrival = None
+        self._segment = None
+        self._segment_size = 0
+        self._block: list[bytes] = []
+        self._block_index: list[tuple] = []
+        self._index = open(os.path.join(directory, INDEX), "wb")
+
+    def _open_segment(self):
+        if self._segment:
+            self._segment.close()
+        self.segments.append(segment_name(len(self.segments)))
+        self._segment = open(os.path.join(self.directory, self.segments[-1]), "wb")
+        self._segment_size = 0
+
+    def add(self, record: dict):
+        arrival = record["ApproximateArrivalTimestamp"].timestamp()
+        shard = self.shard_index[record["ShardId"]]
+        sequence_number = record["SequenceNumber"].encode()
+        partition_key = record["PartitionKey"].encode()
+        data = record["Data"]
+        self._block.append(
+            RECORD_HEADER.pack(
+                arrival, shard, len(sequence_number), len(partition_key), len(data)
+            )
+        )
+        self._block.append(sequence_number + partition_key + data)
+        self._block_index.append((arrival, shard, sequence_number))
+        self.records += 1
+        self.first_arrival = min(arrival, self.first_arrival or arrival)
+        self.last_arrival = max(arrival, self.last_arrival or arrival)
+        if len(self._block_index) >= BLOCK_RECORDS:
+            self.flush_block()
+
+    def flush_block(self):
+        if not self._block_index:
+            return
+        if self._segment is None or self._segment_size >= SEGMENT_BYTES:
+            self._open_segment()
+        compressed = zlib.compress(b"".join(self._block), COMPRESSION_LEVEL)
+        offset = self._segment_size
+        self._segment.write(BLOCK_HEADER.pack(len(compressed), len(self._block_index)))
+        self._segment.write(compressed)
+        self._segment_size += BLOCK_HEADER.size + len(compressed)
+        segment = len(self.segments) - 1
+        for arrival, shard, sequence_number in self._block_index:
+            self._index.write(
+                INDEX_ENTRY.pack(segment, offset, arrival, shard, len(sequence_number))
+            )
+            self._index.write(sequence_number)
+        self._block.clear()
+        self._block_index.clear()
+
+    def close(self):
+        self.flush_block()
+        if self._segment:
+            self._segment.close()
+        self._index.close()
+        with open(os.path.join(self.directory, MANIFEST), "w") as f:
+            json.dump(
+                {
+                    "stream": self.stream,
+                    "shards": self.shards,
+                    "segments": self.segments,
+                    "records": self.records,
+                    "first_arrival": self.first_arrival,
+                    "last_arrival": self.last_arrival,
+                },
+                f,
+                indent=2,
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def record_stream(
+    kinesis_client, stream: str, directory: str, since: float | None = None
+) -> int:
+    from lib.kinesis_reader import iter_stream_records, list_shards
+
+    shards = list_shards(kinesis_client, stream)
+    with SegmentWriter(directory, stream, shards) as writer:
+        for record in iter_stream_records(kinesis_client, stream, since):
+            writer.add(record)
+    return writer.records
+
+
+def _parse_block(block: bytes) -> list[tuple]:
+    records = []
+    offset = 0
+    view = memoryview(block)
+    while offset < len(block):
+        arrival, shard, seq_len, key_len, data_len = RECORD_HEADER.unpack_from(
+            block, offset
+        )
+        offset += RECORD_HEADER.size
+        sequence_number = bytes(view[offset : offset + seq_len]).decode()
+        offset += seq_len
+        partition_key = bytes(view[offset : offset + key_len]).decode()
+        offset += key_len
+        data = bytes(view[offset : offset + data_len])
+        offset += data_len
+        records.append((arrival, shard, sequence_number, partition_key, data))
+    return records
+
+
+class ReplayKinesis:
+    """Kinesis compatible read-only client over a capture directory.
+
+    `pace="original"` only hands out records once their recorded offset from
+    the first record (divided by `speed`) has elapsed since the replay started.
+    `close()`, or leaving the `with` block, unmaps the segments.
+    """
+
+    def __init__(self, directory: str, pace: str = "full", speed: float = 1.0):
+        self.directory = directory
+        self.pace = pace
+        self.speed = speed
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.shards = self.manifest["shards"]
+        self._maps = []
+        for name in self.manifest["segments"]:
+            with open(os.path.join(directory, name), "rb") as f:
+                self._maps.append(
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    if os.fstat(f.fileno()).st_size
+                    else b""
+                )
+        # per shard: arrivals, sequence numbers and where each record is stored
+        # as (segment, block offset, position among the shard's block records)
+        self._arrivals = [[] for _ in self.shards]
+        self._sequence_numbers = [[] for _ in self.shards]
+        self._blocks = [[] for _ in self.shards]
+        for segment, offset, arrival, shard, sequence_number in self._read_index():
+            blocks = self._blocks[shard]
+            position = 0
+            if blocks and blocks[-1][:2] == (segment, offset):
+                position = blocks[-1][2] + 1
+            self._arrivals[shard].append(arrival)
+            self._sequence_numbers[shard].append(int(sequence_number))
+            blocks.append((segment, offset, position))
+        self._block_cache: dict[tuple, list[list[tuple]]] = {}
+        self.first_arrival = self.manifest["first_arrival"] or 0.0
+        # the replay starts with the first shard iterator handed out
+        self.started = None
+
+    def _read_index(self) -> Iterable[tuple]:
+        with open(os.path.join(self.directory, INDEX), "rb") as f:
+            buffer = f.read()
+        offset = 0
+        while offset < len(buffer):
+            segment, block, arrival, shard, seq_len = INDEX_ENTRY.unpack_from(
+                buffer, offset
+            )
+            offset += INDEX_ENTRY.size
+            sequence_number = buffer[offset : offset + seq_len].decode()
+            offset += seq_len
+            yield segment, block, arrival, shard, sequence_number
+
+    def _block(self, segment: int, offset: int) -> list[list[tuple]]:
+        """Records of a block split by shard"""
+        key = (segment, offset)
+        block = self._block_cache.get(key)
+        if block is None:
+            data = self._maps[segment]
+            length, _ = BLOCK_HEADER.unpack_from(data, offset)
+            start = offset + BLOCK_HEADER.size
+            raw = zlib.decompress(memoryview(data)[start : start + length])
+            block = [[] for _ in self.shards]
+            for record in _parse_block(raw):
+                block[record[1]].append(record)
+            # keep the latest blocks only, readers move forward
+            if len(self._block_cache) > 4 * len(self.shards):
+                self._block_cache.pop(next(iter(self._block_cache)))
+            self._block_cache[key] = block
+        return block
+
+    def _rebased(self, arrival: float) -> float:
+        return self.started + (arrival - self.first_arrival) / self.speed
+
+    def _available(self, shard: int, end: int) -> int:
+        if self.pace != "original":
+            return end
+        return bisect.bisect_right(
+            self._arrivals[shard], time.time(), hi=end, key=self._rebased
+        )
+
+    def _shard(self, shard_id: str) -> int:
+        for i, shard in enumerate(self.shards):
+            if shard["ShardId"] == shard_id:
+                return i
+        raise KeyError(f"Shard {shard_id} not in capture")
+
+    def close(self):
+        for data in self._maps:
+            if isinstance(data, mmap.mmap):
+                data.close()
+        self._maps = []
+        self._block_cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def describe_stream(self, **kwargs):
+        return {
+            "StreamDescription": {
+                "StreamARN": self.manifest["stream"],
+                "StreamStatus": "ACTIVE",
+                "Shards": self.shards,
+                "HasMoreShards": False,
+            }
+        }
+
+    def list_shards(self, **kwargs):
+        return {"Shards": self.shards}
+
+    def get_shard_iterator(
+        self,
+        ShardId: str,
+        ShardIteratorType: str,
+        StartingSequenceNumber=None,
+        Timestamp=None,
+        **kwargs,
+    ):
+        shard = self._shard(ShardId)
+        if self.started is None:
+            self.started = time.time()
+        if ShardIteratorType == "TRIM_HORIZON":
+            position = 0
+        elif ShardIteratorType == "LATEST":
+            position = len(self._arrivals[shard])
+        elif ShardIteratorType == "AT_TIMESTAMP":
+            if isinstance(Timestamp, datetime.datetime):
+                Timestamp = Timestamp.timestamp()
+            # the arrivals of a shard are in order
+            position = bisect.bisect_left(
+                self._arrivals[shard], Timestamp, key=self._rebased
+            )
+        elif ShardIteratorType in ("AT_SEQUENCE_NUMBER", "AFTER_SEQUENCE_NUMBER"):
+            # the sequence numbers of a shard increase
+            sequence_numbers = self._sequence_numbers[shard]
+            try:
+                target = int(StartingSequenceNumber)
+                position = bisect.bisect_left(sequence_numbers, target)
+            except (TypeError, ValueError):
+                target, position = None, len(sequence_numbers)
+            if (
+                position == len(sequence_numbers)
+                or sequence_numbers[position] != target
+            ):
+                raise InvalidArgumentException(
+                    f"StartingSequenceNumber {StartingSequenceNumber} not in "
+                    f"shard {ShardId}"
+                )
+            if ShardIteratorType == "AFTER_SEQUENCE_NUMBER":
+                position += 1
+        else:
+            raise ValueError(f"Unsupported ShardIteratorType {ShardIteratorType}")
+        return {"ShardIterator": f"{shard}|{position}"}
+
+    def get_records(self, ShardIterator: str, Limit: int = 10000, **kwargs):
+        shard, position = map(int, ShardIterator.split("|"))
+        blocks = self._blocks[shard]
+        end = self._available(shard, min(position + Limit, len(blocks)))
+        records = []
+        i = position
+        while i < end:
+            segment, offset, first = blocks[i]
+            block_records = self._block(segment, offset)[shard]
+            for arrival, _, sequence_number, partition_key, data in block_records[
+                first : first + end - i
+            ]:
+                records.append(
+                    {
+                        "SequenceNumber": sequence_number,
+                        "ApproximateArrivalTimestamp": datetime.datetime.fromtimestamp(
+                            self._rebased(arrival), datetime.timezone.utc
+                        ),
+                        "Data": data,
+                        "PartitionKey": partition_key,
+                    }
+                )
+            i = position + len(records)
+        behind = 0
+        if end < len(blocks):
+            behind = int(
+                (self._arrivals[shard][-1] - self._arrivals[shard][end]) * 1000
+            )
+        return {
+            "Records": records,
+            "NextShardIterator": f"{shard}|{end}",
+            "MillisBehindLatest": behind,
+        }
+
+
+def replay(directory: str, pace: str, speed: float, decoder_name: str) -> dict:
+    """Reads and decodes a capture round-robin over its shards"""
+    from lib.decoders import get_decoder
+
+    decoder = get_decoder(decoder_name)
+    with ReplayKinesis(directory, pace, speed) as kinesis:
+        iterators = {
+            shard["ShardId"]: kinesis.get_shard_iterator(
+                ShardId=shard["ShardId"], ShardIteratorType="TRIM_HORIZON"
+            )["ShardIterator"]
+            for shard in kinesis.shards
+        }
+        expected = kinesis.manifest["records"]
+        started = time.perf_counter()
+        received = 0
+        while received < expected:
+            batch = 0
+            for shard_id, iterator in iterators.items():
+                res = kinesis.get_records(ShardIterator=iterator)
+                iterators[shard_id] = res["NextShardIterator"]
+                for record in res["Records"]:
+                    decoder(record["Data"])
+                batch += len(res["Records"])
+            received += batch
+            if not batch:
+                # paced replay, the next records are not due yet
+                time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    return {
+        "records": received,
+        "seconds": round(elapsed, 3),
+        "records_per_sec": round(received / elapsed) if elapsed else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.capture")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_cmd = commands.add_parser("record")
+    record_cmd.add_argument("--stream", required=True, help="Kinesis stream ARN")
+    record_cmd.add_argument("--dir", required=True)
+    record_cmd.add_argument("--since", type=float, help="only records after epoch")
+    replay_cmd = commands.add_parser("replay")
+    replay_cmd.add_argument("--dir", required=True)
+    replay_cmd.add_argument("--pace", choices=("full", "original"), default="full")
+    replay_cmd.add_argument("--speed", type=float, default=1.0)
+    replay_cmd.add_argument("--decoder", default="json")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        from boto3 import client
+
+        kinesis = client("kinesis", endpoint_url=os.getenv("ENDPOINT_URL"))
+        started = time.time()
+        count = record_stream(kinesis, args.stream, args.dir, args.since)
+        print(f"captured {count} records in {time.time() - started:.2f}s")
+        return
+    print(json.dumps(replay(args.dir, args.pace, args.speed, args.decoder)))
+
+
+if __name__ == "__main__":
+    main()
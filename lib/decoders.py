@@ -0,0 +1,51 @@
+"""Pluggable decoders for the records DMS writes to the Kinesis target.
+
+The decoder is looked up by the endpoint `MessageFormat`, so the consumers in
+run.py and tests/test_infra.py don't depend on the format the stack was
+deployed with. `orjson` parses the json formats when it is installed.
+"""
+
+import json
+from typing import Callable
+
+Decoder = Callable[[bytes | str], dict]
+
+MESSAGE_FORMATS = ("json", "json-unformatted")
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_json_loads: Decoder = orjson.loads if orjson else json.loads
+
+_decoders: dict[str, Decoder] = {
+    "json": _json_loads,
+    # a single line json document, the same parser applies
+    "json-unformatted": _json_loads,
+}
+if orjson:
+    _decoders["orjson"] = orjson.loads
+
+
+def register_decoder(name: str, decoder: Decoder):
+    _decoders[name] = decoder
+
+
+def available_decoders() -> list[str]:
+    return list(_decoders)
+
+
+def get_decoder(message_format: str = "json") -> Decoder:
+    try:
+        return _decoders[message_format]
+    except KeyError:
+        raise ValueError(
+            f"No decoder for message format {message_format!r}, "
+            f"available: {', '.join(_decoders)}"
+        ) from None
+
+
+def decode_record(record: dict, decoder: Decoder = json.loads) -> dict:
+    """Decode a Kinesis record the way wait_for_kinesis prints it"""
+    return {**decoder(record["Data"]), "partition_key": record["PartitionKey"]}
@@ -0,0 +1,244 @@
+"""Benchmark of the Kinesis target message formats on the `accounts` table.
+
+The offline mode encodes synthetic DMS `accounts` records (with `TEXT` and
+base64 encoded `BLOB` columns) in every message format and measures bytes per
+record and decode time for every available decoder:
+
+    python -m lib.format_bench --rows 2000 --blob-sizes 0,1024,65535
+
+The live mode inserts rows in the CDC source with `cdcTask1` running and
+measures the end to end throughput of the deployed format. Deploy the stack
+once per `MESSAGE_FORMAT` and append the results to the same file to compare:
+
+    python -m lib.format_bench --live --rows 200 --output formats.ndjson
+"""
+
+import argparse
+import base64
+import json
+import os
+import time
+
+from lib.decoders import MESSAGE_FORMATS, available_decoders, get_decoder
+from lib.query import LOB_COLUMN_MAX_SIZE
+
+ACCOUNTS_INSERT = """INSERT INTO accounts
+(name, age, birth_date, account_balance, is_active, last_login, bio, profile_picture, favorite_color, height, weight)
+VALUES ('{name}', 30, '1991-05-21', 1500.00, TRUE, '2021-03-10 08:00:00', '{bio}', {blob}, 'red', 1.70, 60.5);"""
+# the same row, for the inserts with bound parameters
+ACCOUNTS_ROW = {
+    "age": 30,
+    "birth_date": "1991-05-21",
+    "account_balance": 1500.00,
+    "is_active": True,
+    "last_login": "2021-03-10 08:00:00",
+    "favorite_color": "red",
+    "height": 1.70,
+    "weight": 60.5,
+}
+
+
+def make_accounts_message(row_id: int, bio_size: int, blob_size: int) -> dict:
+    """A DMS insert message for `accounts` as written by the Kinesis endpoint"""
+    return {
+        "data": {
+            "id": row_id,
+            "name": f"account-{row_id}",
+            "age": 30,
+            "birth_date": "1991-05-21",
+            "account_balance": 1500.0,
+            "is_active": 1,
+            "signup_time": "2021-01-08T09:00:00Z",
+            "last_login": "2021-03-10T08:00:00Z",
+            "bio": "b" * bio_size,
+            # DMS emits binary columns base64 encoded
+            "profile_picture": (
+                base64.b64encode(os.urandom(blob_size)).decode() if blob_size else None
+            ),
+            "favorite_color": "red",
+            "height": 1.7,
+            "weight": 60.5,
+        },
+        "metadata": {
+            "timestamp": "2024-05-02T10:00:00.000000Z",
+            "record-type": "data",
+            "operation": "insert",
+            "partition-key-type": "schema-table",
+            "partition-key-value": "dms_sample.accounts",
+            "schema-name": "dms_sample",
+            "table-name": "accounts",
+            "transaction-id": 12884901888 + row_id,
+            "transaction-record-id": 1,
+        },
+    }
+
+
+def encode(message: dict, message_format: str) -> bytes:
+    if message_format == "json":
+        return json.dumps(message, indent=4).encode()
+    return json.dumps(message, separators=(",", ":")).encode()
+
+
+def bench_decode(records: list[bytes], decoder_name: str, repeat: int = 3) -> float:
+    """Best seconds per record over `repeat` passes"""
+    decoder = get_decoder(decoder_name)
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for record in records:
+            decoder(record)
+        best = min(best, time.perf_counter() - started)
+    return best / len(records)
+
+
+def run_offline(rows: int, bio_size: int, blob_sizes: list[int]) -> list[dict]:
+    # decoders that aren't tied to a single format (e.g. orjson) apply to all
+    extra_decoders = [d for d in available_decoders() if d not in MESSAGE_FORMATS]
+    results = []
+    for blob_size in blob_sizes:
+        messages = [make_accounts_message(i, bio_size, blob_size) for i in range(rows)]
+        for message_format in MESSAGE_FORMATS:
+            records = [encode(m, message_format) for m in messages]
+            avg_bytes = sum(map(len, records)) / rows
+            for decoder in [message_format, *extra_decoders]:
+                per_record = bench_decode(records, decoder)
+                results.append(
+                    {
+                        "format": message_format,
+                        "decoder": decoder,
+                        "blob_size": blob_size,
+                        "bytes_per_record": round(avg_bytes, 1),
+                        "decode_us": round(per_record * 1e6, 2),
+                        "decode_mb_per_sec": round(avg_bytes / per_record / 1e6, 1),
+                    }
+                )
+    return results
+
+
+def deployed_message_format(dms_client, task_arn: str) -> str:
+    task = dms_client.describe_replication_tasks(
+        Filters=[{"Name": "replication-task-arn", "Values": [task_arn]}],
+        WithoutSettings=True,
+    )["ReplicationTasks"][0]
+    endpoint = dms_client.describe_endpoints(
+        Filters=[{"Name": "endpoint-arn", "Values": [task["TargetEndpointArn"]]}]
+    )["Endpoints"][0]
+    return endpoint.get("KinesisSettings", {}).get("MessageFormat", "json")
+
+
+def collect_inserts(cursor, decoder, rows: int, started: float, timeout: float):
+    """Read the `accounts` inserts from `cursor` until `rows` of them arrived.
+
+    Returns the inserts received, their bytes, the last arrival time, and the
+    records decoded with the seconds spent decoding them.
+    """
+    from dms_sample.runtime import config
+
+    received, total_bytes, decoded, decode_seconds = 0, 0, 0, 0.0
+    last_arrival = started
+    while received < rows and time.time() - started < timeout:
+        for record in cursor.read():
+            decode_started = time.perf_counter()
+            message = decoder(record["Data"])
+            decode_seconds += time.perf_counter() - decode_started
+            decoded += 1
+            if message["metadata"].get("table-name") != "accounts":
+                continue
+            if message["metadata"].get("operation") != "insert":
+                continue
+            received += 1
+            total_bytes += len(record["Data"])
+            arrival = record["ApproximateArrivalTimestamp"].timestamp()
+            last_arrival = max(last_arrival, arrival)
+        if received < rows:
+            time.sleep(config.RETRY_SLEEP)
+    return received, total_bytes, last_arrival, decoded, decode_seconds
+
+
+def run_live(rows: int, bio_size: int, blob_size: int, timeout: float) -> dict:
+    from dms_sample import runtime
+    from lib import query as q
+    from lib.kinesis_reader import StreamCursor
+    from lib.lobs import insert_rows
+
+    cfn_output = runtime.get_cfn_output()
+    credentials = runtime.get_credentials(cfn_output["cdcTaskSecret"])
+    task = cfn_output["cdcTask1"]
+    stream = cfn_output["kinesisStream"]
+    message_format = deployed_message_format(runtime.get_client("dms"), task)
+    decoder = get_decoder(message_format)
+
+    runtime.run_queries_on_mysql(credentials, q.DROP_TABLES)
+    runtime.run_queries_on_mysql(credentials, q.CREATE_TABLES)
+    runtime.start_task(task)
+    runtime.wait_for_task_status(task, "running")
+
+    blob = os.urandom(blob_size) if blob_size else None
+    started = time.time()
+    cursor = StreamCursor(runtime.get_client("kinesis"), stream, started)
+    insert_rows(
+        credentials,
+        "accounts",
+        [
+            {
+                **ACCOUNTS_ROW,
+                "name": f"account-{i}",
+                "bio": "b" * bio_size,
+                "profile_picture": blob,
+            }
+            for i in range(rows)
+        ],
+    )
+
+    received, total_bytes, last_arrival, decoded, decode_seconds = collect_inserts(
+        cursor, decoder, rows, started, timeout
+    )
+    # throughput from the arrival times so polling doesn't skew it
+    elapsed = max(last_arrival - started, 1e-3)
+
+    runtime.stop_task(task)
+    runtime.wait_for_task_status(task, "stopped")
+    runtime.run_queries_on_mysql(credentials, q.DROP_TABLES)
+    return {
+        "format": message_format,
+        "rows": rows,
+        "received": received,
+        "blob_size": blob_size,
+        "bytes_per_record": round(total_bytes / received, 1) if received else 0,
+        "decode_us": round(decode_seconds / decoded * 1e6, 2) if decoded else 0,
+        "records_per_sec": round(received / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.format_bench")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--bio-size", type=int, default=256)
+    parser.add_argument("--blob-sizes", default=f"0,1024,{LOB_COLUMN_MAX_SIZE}")
+    parser.add_argument("--live", action="store_true", help="run against the stack")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", help="append results as json lines")
+    args = parser.parse_args()
+
+    blob_sizes = [int(size) for size in args.blob_sizes.split(",")]
+    if max(blob_sizes) > LOB_COLUMN_MAX_SIZE:
+        parser.error(
+            f"accounts.profile_picture holds at most {LOB_COLUMN_MAX_SIZE} bytes"
+        )
+    if args.live:
+        results = [
+            run_live(args.rows, args.bio_size, blob_size, args.timeout)
+            for blob_size in blob_sizes
+        ]
+    else:
+        results = run_offline(args.rows, args.bio_size, blob_sizes)
+
+    for result in results:
+        print(json.dumps(result))
+    if args.output:
+        with open(args.output, "a") as f:
+            f.writelines(json.dumps(result) + "\n" for result in results)
+
+
+if __name__ == "__main__":
+    main()
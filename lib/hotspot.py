@@ -0,0 +1,229 @@
+"""Partition key hot-spot detector for the target stream.
+
+Kinesis routes a record to the shard whose hash key range contains the MD5 of
+its partition key. With `partition_include_schema_table=True` DMS uses
+`<schema>.<table>` as partition key, so every record of a table lands on the
+same shard. This tool maps the partition keys read from the stream to shards
+and reports per shard record/byte skew over time windows:
+
+    python -m lib.hotspot --stream <arn> [--since <ts>] [--window 10] [--shards 4]
+    python -m lib.hotspot --file capture.ndjson --shards 4
+
+`--shards N` additionally projects the distribution on N evenly split shards,
+which shows whether resharding alone would help or the table needs primary
+key partitioning.
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+from collections import Counter, defaultdict
+from typing import Iterable
+
+from lib.record_size import SHARD_WRITE_BYTES_PER_SEC, SHARD_WRITE_RECORDS_PER_SEC
+
+MAX_HASH_KEY = 2**128 - 1
+
+# A key using more than this share of a shard's write capacity is hot
+HOT_KEY_CAPACITY_SHARE = 0.5
+
+
+def hash_key(partition_key: str) -> int:
+    return int(hashlib.md5(partition_key.encode("utf-8")).hexdigest(), 16)
+
+
+def even_shards(count: int) -> list[dict]:
+    """Hash key ranges of a stream created with `count` shards"""
+    size = (MAX_HASH_KEY + 1) // count
+    return [
+        {
+            "ShardId": f"shardId-{i:012d}",
+            "HashKeyRange": {
+                "StartingHashKey": str(i * size),
+                "EndingHashKey": str(
+                    MAX_HASH_KEY if i == count - 1 else (i + 1) * size - 1
+                ),
+            },
+        }
+        for i in range(count)
+    ]
+
+
+class ShardMap:
+    """Maps partition keys to open shards through their hash key ranges"""
+
+    def __init__(self, shards: Iterable[dict]):
+        open_shards = [
+            shard
+            for shard in shards
+            if "EndingSequenceNumber" not in shard.get("SequenceNumberRange", {})
+        ]
+        open_shards.sort(key=lambda s: int(s["HashKeyRange"]["StartingHashKey"]))
+        self.shard_ids = [shard["ShardId"] for shard in open_shards]
+        self._starts = [int(s["HashKeyRange"]["StartingHashKey"]) for s in open_shards]
+        self._ends = [int(s["HashKeyRange"]["EndingHashKey"]) for s in open_shards]
+        self._cache: dict[str, str] = {}
+
+    def shard_for(self, partition_key: str) -> str:
+        shard_id = self._cache.get(partition_key)
+        if shard_id is None:
+            key = hash_key(partition_key)
+            index = bisect.bisect_right(self._starts, key) - 1
+            if index < 0 or key > self._ends[index]:
+                raise ValueError(f"No open shard covers hash key of {partition_key!r}")
+            shard_id = self._cache[partition_key] = self.shard_ids[index]
+        return shard_id
+
+
+def skew(values: Iterable[float], shard_count: int) -> float:
+    """Ratio of the hottest shard to the mean over all shards (1.0 is even)"""
+    values = list(values)
+    total = sum(values)
+    if not total:
+        return 0.0
+    return round(max(values) / (total / shard_count), 2)
+
+
+class HotspotReport:
+    def __init__(self, shard_map: ShardMap, window: float = 10.0):
+        self.shard_map = shard_map
+        self.window = window
+        self.shard_records = Counter()
+        self.shard_bytes = Counter()
+        self.key_records = Counter()
+        self.key_bytes = Counter()
+        self.windows: dict[int, dict[str, Counter]] = defaultdict(
+            lambda: {"records": Counter(), "bytes": Counter()}
+        )
+        self.first_arrival = None
+        self.last_arrival = None
+
+    def add(self, partition_key: str, size: int, arrival: float):
+        shard_id = self.shard_map.shard_for(partition_key)
+        self.shard_records[shard_id] += 1
+        self.shard_bytes[shard_id] += size
+        self.key_records[partition_key] += 1
+        self.key_bytes[partition_key] += size
+        bucket = self.windows[int(arrival // self.window)]
+        bucket["records"][shard_id] += 1
+        bucket["bytes"][shard_id] += size
+        self.first_arrival = min(arrival, self.first_arrival or arrival)
+        self.last_arrival = max(arrival, self.last_arrival or arrival)
+
+    def duration(self) -> float:
+        if self.first_arrival is None:
+            return 0.0
+        return max(self.last_arrival - self.first_arrival, self.window)
+
+    def hot_keys(self, limit: int = 10) -> list[dict]:
+        duration = self.duration()
+        keys = []
+        for partition_key, records in self.key_records.most_common(limit):
+            shard_id = self.shard_map.shard_for(partition_key)
+            key_bytes = self.key_bytes[partition_key]
+            capacity_share = max(
+                key_bytes / duration / SHARD_WRITE_BYTES_PER_SEC,
+                records / duration / SHARD_WRITE_RECORDS_PER_SEC,
+            )
+            keys.append(
+                {
+                    "partition_key": partition_key,
+                    "shard": shard_id,
+                    "records": records,
+                    "bytes": key_bytes,
+                    "share_of_shard": round(records / self.shard_records[shard_id], 3),
+                    "capacity_share": round(capacity_share, 3),
+                }
+            )
+        return keys
+
+    def summary(self) -> dict:
+        shard_count = len(self.shard_map.shard_ids)
+        hot_keys = self.hot_keys()
+        recommendations = [
+            f"{key['partition_key']} uses {key['capacity_share']:.0%} of the write "
+            f"capacity of {key['shard']}, consider primary key partitioning "
+            "(partition_include_schema_table=False)"
+            for key in hot_keys
+            if key["capacity_share"] > HOT_KEY_CAPACITY_SHARE
+        ]
+        return {
+            "shards": {
+                shard_id: {
+                    "records": self.shard_records[shard_id],
+                    "bytes": self.shard_bytes[shard_id],
+                }
+                for shard_id in self.shard_map.shard_ids
+            },
+            "skew": {
+                "records": skew(self.shard_records.values(), shard_count),
+                "bytes": skew(self.shard_bytes.values(), shard_count),
+            },
+            "windows": [
+                {
+                    "start": bucket * self.window,
+                    "records": dict(counts["records"]),
+                    "bytes": dict(counts["bytes"]),
+                    "skew": skew(counts["bytes"].values(), shard_count),
+                }
+                for bucket, counts in sorted(self.windows.items())
+            ],
+            "hot_keys": hot_keys,
+            "recommendations": recommendations,
+        }
+
+
+def load_capture(path: str) -> list[tuple[str, int, float]]:
+    """(partition key, size, arrival) of a capture written by lib.record_size"""
+    with open(path) as f:
+        return [
+            (line["partition_key"], len(line["data"].encode()), line["arrival"])
+            for line in map(json.loads, f)
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.hotspot")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--stream", help="Kinesis stream ARN")
+    source.add_argument("--file", help="capture file written by lib.record_size")
+    parser.add_argument("--since", type=float, help="only records after epoch")
+    parser.add_argument("--window", type=float, default=10.0, help="seconds")
+    parser.add_argument("--shards", type=int, help="project on N even shards")
+    args = parser.parse_args()
+
+    if args.file:
+        records = load_capture(args.file)
+        shards = even_shards(1)
+    else:
+        from boto3 import client
+
+        from lib.kinesis_reader import iter_stream_records, list_shards
+
+        kinesis = client("kinesis", endpoint_url=os.getenv("ENDPOINT_URL"))
+        shards = list_shards(kinesis, args.stream)
+        records = [
+            (
+                r["PartitionKey"],
+                len(r["Data"]),
+                r["ApproximateArrivalTimestamp"].timestamp(),
+            )
+            for r in iter_stream_records(kinesis, args.stream, args.since)
+        ]
+
+    layouts = {"current" if args.stream else "1-shard": shards}
+    if args.shards:
+        layouts[f"{args.shards}-even-shards"] = even_shards(args.shards)
+    result = {}
+    for label, layout in layouts.items():
+        report = HotspotReport(ShardMap(layout), args.window)
+        for partition_key, size, arrival in records:
+            report.add(partition_key, size, arrival)
+        result[label] = report.summary()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Enhanced fan-out (SubscribeToShard) consumer for the target stream.
+
+Each reader registers its own stream consumer, so it gets a dedicated 2 MB/s
+per shard push pipe instead of sharing the polling read budget with every
+other `get_records` caller. One thread per shard keeps a subscription open
+(subscriptions expire after 5 minutes and are renewed from the last
+continuation sequence number) and hands records over through a queue.
+
+Endpoints that don't implement enhanced fan-out (e.g. older LocalStack
+versions) raise `EfoUnsupported`, callers are expected to fall back to polling.
+"""
+
+import os
+import queue
+import threading
+import time
+import uuid
+
+from botocore.exceptions import ClientError
+
+from lib.kinesis_reader import list_shards
+
+CONSUMER_PREFIX = "dms-sample"
+# seconds `close()` waits for each subscriber thread
+CLOSE_TIMEOUT = 10
+
+# Error codes returned by endpoints without SubscribeToShard support
+UNSUPPORTED_ERROR_CODES = {
+    "UnknownOperationException",
+    "InvalidAction",
+    "NotImplemented",
+}
+
+
+class EfoUnsupported(Exception):
+    pass
+
+
+def _is_unsupported(error: ClientError) -> bool:
+    code = error.response.get("Error", {}).get("Code", "")
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in UNSUPPORTED_ERROR_CODES or status == 501
+
+
+def consumer_name(prefix: str = CONSUMER_PREFIX) -> str:
+    # unique per reader so concurrent verifiers don't share a consumer
+    return f"{prefix}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def register_consumer(kinesis_client, stream: str, name: str, timeout=60) -> str:
+    try:
+        consumer = kinesis_client.register_stream_consumer(
+            StreamARN=stream, ConsumerName=name
+        )["Consumer"]
+    except ClientError as error:
+        if _is_unsupported(error):
+            raise EfoUnsupported(str(error)) from error
+        raise
+    consumer_arn = consumer["ConsumerARN"]
+    deadline = time.time() + timeout
+    status = consumer.get("ConsumerStatus")
+    while status != "ACTIVE":
+        if time.time() > deadline:
+            raise TimeoutError(f"Consumer {consumer_arn} is still {status}")
+        time.sleep(1)
+        status = kinesis_client.describe_stream_consumer(ConsumerARN=consumer_arn)[
+            "ConsumerDescription"
+        ]["ConsumerStatus"]
+    return consumer_arn
+
+
+class EnhancedFanOutReader:
+    """Push based reader over all shards of `stream`.
+
+    `poll(timeout)` returns the records received so far, waiting up to
+    `timeout` seconds for the first one.
+    """
+
+    def __init__(
+        self,
+        kinesis_client,
+        stream: str,
+        threshold_timestamp: float | None = None,
+        name: str | None = None,
+    ):
+        self.kinesis = kinesis_client
+        self.stream = stream
+        self.threshold_timestamp = threshold_timestamp
+        self.name = name or consumer_name()
+        self.consumer_arn = None
+        self._records = queue.Queue()
+        self._errors = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+        # open subscriptions, closed to unblock their threads
+        self._event_streams = {}
+
+    def _starting_position(self) -> dict:
+        if self.threshold_timestamp:
+            return {"Type": "AT_TIMESTAMP", "Timestamp": self.threshold_timestamp}
+        return {"Type": "TRIM_HORIZON"}
+
+    def _subscribe(self, shard_id: str):
+        position = self._starting_position()
+        while not self._stop.is_set():
+            try:
+                res = self.kinesis.subscribe_to_shard(
+                    ConsumerARN=self.consumer_arn,
+                    ShardId=shard_id,
+                    StartingPosition=position,
+                )
+                event_stream = res["EventStream"]
+                self._event_streams[shard_id] = event_stream
+                for event in event_stream:
+                    if self._stop.is_set():
+                        event_stream.close()
+                        return
+                    shard_event = event.get("SubscribeToShardEvent")
+                    if not shard_event:
+                        continue
+                    for record in shard_event["Records"]:
+                        record["ShardId"] = shard_id
+                        self._records.put(record)
+                    continuation = shard_event.get("ContinuationSequenceNumber")
+                    if not continuation:
+                        # the shard is closed and fully consumed
+                        return
+                    position = {
+                        "Type": "AFTER_SEQUENCE_NUMBER",
+                        "SequenceNumber": continuation,
+                    }
+            except ClientError as error:
+                code = error.response.get("Error", {}).get("Code")
+                if code == "ResourceInUseException":
+                    # the previous subscription of this shard is still closing
+                    time.sleep(1)
+                    continue
+                if _is_unsupported(error):
+                    error = EfoUnsupported(str(error))
+                self._errors.put(error)
+                return
+            except Exception as error:
+                if not self._stop.is_set():
+                    self._errors.put(error)
+                return
+            finally:
+                self._event_streams.pop(shard_id, None)
+
+    def start(self):
+        self.consumer_arn = register_consumer(self.kinesis, self.stream, self.name)
+        try:
+            for shard in list_shards(self.kinesis, self.stream):
+                thread = threading.Thread(
+                    target=self._subscribe,
+                    args=(shard["ShardId"],),
+                    name=f"efo-{shard['ShardId']}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+        except BaseException:
+            # the context manager won't exit, don't leak the consumer
+            self.close()
+            raise
+        return self
+
+    def poll(self, timeout: float = 1.0) -> list[dict]:
+        if not self._errors.empty():
+            raise self._errors.get()
+        records = []
+        try:
+            records.append(self._records.get(timeout=timeout))
+            while True:
+                records.append(self._records.get_nowait())
+        except queue.Empty:
+            pass
+        return records
+
+    def close(self):
+        self._stop.set()
+        for event_stream in list(self._event_streams.values()):
+            event_stream.close()
+        for thread in self._threads:
+            thread.join(CLOSE_TIMEOUT)
+        self._threads = []
+        if self.consumer_arn:
+            try:
+                self.kinesis.deregister_stream_consumer(ConsumerARN=self.consumer_arn)
+            except ClientError as error:
+                print(f"Could not deregister consumer {self.name}: {error}")
+            self.consumer_arn = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_with_efo(
+    kinesis_client,
+    stream: str,
+    expected_count: int,
+    threshold_timestamp: float,
+    poll_interval: float = 1.0,
+    timeout: float = 300,
+) -> list[dict] | None:
+    """Records arrived after `threshold_timestamp`, or None without EFO support"""
+    deadline = time.time() + timeout
+    all_records = []
+    try:
+        with EnhancedFanOutReader(
+            kinesis_client, stream, threshold_timestamp
+        ) as reader:
+            while len(all_records) < expected_count:
+                if time.time() > deadline:
+                    raise TimeoutError(
+                        f"found {len(all_records)}, {expected_count=} after {timeout}s"
+                    )
+                for record in reader.poll(poll_interval):
+                    arrival = record["ApproximateArrivalTimestamp"].timestamp()
+                    if arrival > threshold_timestamp:
+                        all_records.append(record)
+                print(f"found {len(all_records)}, {expected_count=}")
+    except EfoUnsupported as error:
+        print(f"Enhanced fan-out not supported, falling back to polling: {error}")
+        return None
+    return all_records
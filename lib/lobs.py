@@ -0,0 +1,419 @@
+"""Large object path for the `TEXT` and `BLOB` columns of the sample tables.
+
+Seeding a row used to build the whole `INSERT` as a string with the blob hex
+encoded in it, and decoding a record parsed the whole JSON document before
+base64 decoding the blob, so every large value was copied several times.
+
+- `insert_row` binds every value, LOBs included, as a single parameter
+  instead of formatting it into the statement
+- `split_lobs` locates the LOB values in the raw record and returns them as
+  `memoryview` slices; only the rest of the document goes through the JSON
+  parser and `decode_binary` base64 decodes a slice without copying it first
+- `LobReport` reports the LOB sizes per column from the raw records
+
+    python -m lib.lobs report --stream <arn> [--since <ts>]
+    python -m lib.lobs report --file capture.ndjson
+    python -m lib.lobs bench --sizes 1024,16384,65535 [--db-secret <arn>]
+"""
+
+import argparse
+import base64
+import binascii
+import json
+import os
+import re
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Callable
+
+from lib.query import BINARY_COLUMNS, LOB_COLUMN_MAX_SIZE, LOB_COLUMNS
+from lib.record_size import load_capture, table_of
+
+SIZE_BUCKETS = (1024, 16 * 1024, 128 * 1024, 1024 * 1024)
+
+
+# Seeding
+
+
+def bind_value(value):
+    """`value` as a parameter pymysql escapes, binary files are read once"""
+    if hasattr(value, "read"):
+        value = value.read()
+    if isinstance(value, (bytearray, memoryview)):
+        # pymysql only escapes bytes
+        value = bytes(value)
+    return value
+
+
+def insert_row(cursor, table: str, row: dict) -> int:
+    """Insert `row` with bound parameters, returns the id of the inserted row.
+
+    Each LOB is sent as a single parameter: appending it in pieces would log a
+    binlog UPDATE with the before and after image of the value per piece.
+    """
+    values = [bind_value(value) for value in row.values()]
+    for column, value in zip(row, values):
+        if column not in LOB_COLUMNS.get(table, ()) or value is None:
+            continue
+        # TEXT is limited in bytes, not characters
+        size = len(value.encode("utf-8") if isinstance(value, str) else value)
+        if size > LOB_COLUMN_MAX_SIZE:
+            raise ValueError(
+                f"{table}.{column} holds at most {LOB_COLUMN_MAX_SIZE} bytes, "
+                f"got {size}"
+            )
+    cursor.execute(
+        f"INSERT INTO {table} ({', '.join(row)}) "
+        f"VALUES ({', '.join(['%s'] * len(row))})",
+        values,
+    )
+    return cursor.lastrowid
+
+
+def insert_rows(credentials, table: str, rows: list[dict]) -> list[int]:
+    """Insert `rows` in the source database in one transaction"""
+    from dms_sample.runtime import pool
+
+    with pool.connection(credentials) as cnx:
+        with cnx.cursor() as cursor:
+            ids = [insert_row(cursor, table, row) for row in rows]
+        cnx.commit()
+    return ids
+
+
+def source_lob_sizes(credentials, table: str) -> dict[str, dict]:
+    """LOB sizes in the source table, computed by the server"""
+    from dms_sample.runtime import get_query_result
+
+    columns = LOB_COLUMNS.get(table, ())
+    if not columns:
+        return {}
+    aggregates = ", ".join(
+        f"COUNT({c}) AS {c}_count, SUM(LENGTH({c})) AS {c}_total, "
+        f"MAX(LENGTH({c})) AS {c}_max"
+        for c in columns
+    )
+    result = get_query_result(credentials, f"SELECT {aggregates} FROM {table}")[0]
+    return {
+        column: {
+            "values": result[f"{column}_count"],
+            "total_bytes": int(result[f"{column}_total"] or 0),
+            "max_bytes": int(result[f"{column}_max"] or 0),
+        }
+        for column in columns
+    }
+
+
+# Decoding
+
+
+def _string_end(raw: bytes, start: int) -> int:
+    """Index of the quote closing the JSON string starting at `start`"""
+    end = raw.index(b'"', start)
+    while True:
+        backslashes = 0
+        while raw[end - 1 - backslashes] == 0x5C:
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return end
+        end = raw.index(b'"', end + 1)
+
+
+_patterns: dict[tuple, re.Pattern] = {}
+
+
+def _lob_pattern(columns: tuple) -> re.Pattern:
+    if columns not in _patterns:
+        names = b"|".join(re.escape(c.encode()) for c in columns)
+        # `"column": "` in both message formats, a null value doesn't match
+        _patterns[columns] = re.compile(rb'"(' + names + rb')"\s*:\s*"')
+    return _patterns[columns]
+
+
+def split_lobs(
+    raw: bytes, columns: tuple, decoder: Callable = json.loads
+) -> tuple[dict, dict[str, list[memoryview]]]:
+    """Decode `raw` without its LOB values and return them as raw slices.
+
+    The LOB values are null in the decoded message. A column has a slice for
+    `data` and one for `before-image`, in document order.
+    """
+    view = memoryview(raw)
+    lobs = defaultdict(list)
+    parts, position = [], 0
+    for match in _lob_pattern(columns).finditer(raw):
+        if match.start() < position:
+            continue
+        start = match.end()
+        end = _string_end(raw, start)
+        lobs[match.group(1).decode()].append(view[start:end])
+        parts.append(view[position : match.end() - 1])
+        parts.append(b"null")
+        position = end + 1
+    if not parts:
+        return decoder(raw), {}
+    parts.append(view[position:])
+    return decoder(b"".join(parts)), dict(lobs)
+
+
+def decode_binary(value: memoryview) -> bytes:
+    """Bytes of a base64 encoded BLOB value"""
+    return binascii.a2b_base64(value)
+
+
+def decode_text(value: memoryview) -> str:
+    """A TEXT value, with its JSON escapes resolved"""
+    return json.loads(b'"' + bytes(value) + b'"')
+
+
+def decoded_size(value: memoryview) -> int:
+    """Size of a base64 encoded value without decoding it"""
+    size = len(value) // 4 * 3
+    if len(value) and value[-1] == 0x3D:
+        size -= 2 if value[-2] == 0x3D else 1
+    return size
+
+
+# Reporting
+
+
+def size_bucket(size: int) -> str:
+    for bucket in SIZE_BUCKETS:
+        if size <= bucket:
+            return f"<={bucket // 1024}KB"
+    return f">{SIZE_BUCKETS[-1] // 1024}KB"
+
+
+class LobReport:
+    """LOB sizes per table column seen in the raw records of the stream"""
+
+    def __init__(
+        self,
+        lob_columns: dict[str, tuple] = LOB_COLUMNS,
+        binary_columns: dict[str, tuple] = BINARY_COLUMNS,
+    ):
+        self.lob_columns = lob_columns
+        self.binary_columns = binary_columns
+        self.all_columns = tuple(
+            sorted({c for columns in lob_columns.values() for c in columns})
+        )
+        self.records = defaultdict(int)
+        self.record_bytes = defaultdict(int)
+        self.columns: dict[tuple, dict] = {}
+
+    def add(self, raw: bytes):
+        message, lobs = split_lobs(raw, self.all_columns)
+        table = table_of(message)
+        name = message.get("metadata", {}).get("table-name", "")
+        self.records[table] += 1
+        self.record_bytes[table] += len(raw)
+        for column, values in lobs.items():
+            if column not in self.lob_columns.get(name, ()):
+                continue
+            # the first value is the new row image
+            value = values[0]
+            binary = column in self.binary_columns.get(name, ())
+            size = decoded_size(value) if binary else len(value)
+            stats = self.columns.setdefault(
+                (table, column),
+                {"values": 0, "encoded_bytes": 0, "bytes": 0, "max_bytes": 0},
+            )
+            stats["values"] += 1
+            stats["encoded_bytes"] += len(value)
+            stats["bytes"] += size
+            stats["max_bytes"] = max(stats["max_bytes"], size)
+            buckets = stats.setdefault("buckets", defaultdict(int))
+            buckets[size_bucket(size)] += 1
+
+    def summary(self) -> dict:
+        tables = {}
+        for (table, column), stats in sorted(self.columns.items()):
+            lob_bytes = stats["encoded_bytes"]
+            tables.setdefault(table, {})[column] = {
+                "values": stats["values"],
+                "avg_bytes": round(stats["bytes"] / stats["values"], 1),
+                "max_bytes": stats["max_bytes"],
+                "percent_of_record_bytes": round(
+                    100 * lob_bytes / self.record_bytes[table], 1
+                ),
+                "buckets": dict(stats["buckets"]),
+            }
+        return tables
+
+
+def report(raw_records) -> dict:
+    lob_report = LobReport()
+    for raw in raw_records:
+        lob_report.add(raw)
+    return lob_report.summary()
+
+
+# Benchmark
+
+
+def peak_memory(function: Callable, *args) -> int:
+    """Peak traced bytes of one call"""
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def best_time(function: Callable, items: list, repeat: int = 3) -> float:
+    """Best seconds per item over `repeat` passes"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in items:
+            function(item)
+        best = min(best, time.perf_counter() - started)
+    return best / len(items)
+
+
+def _decode_whole(raw: bytes):
+    message = json.loads(raw)
+    return base64.b64decode(message["data"]["profile_picture"])
+
+
+def _decode_split(raw: bytes):
+    _, lobs = split_lobs(raw, ("bio", "profile_picture"))
+    return decode_binary(lobs["profile_picture"][0])
+
+
+class StatementSizer:
+    """A cursor recording the size of the statements a client would send"""
+
+    lastrowid = 1
+
+    def __init__(self):
+        from pymysql.converters import escape_item
+
+        self.escape = escape_item
+        self.statements = 0
+        self.largest = 0
+
+    def execute(self, query: str, args=None):
+        escaped = [self.escape(arg, "utf8mb4") for arg in args or ()]
+        statement = query % tuple(escaped) if escaped else query
+        self.statements += 1
+        self.largest = max(self.largest, len(statement))
+
+
+def _insert_literal(cursor, blob: bytes):
+    from lib.format_bench import ACCOUNTS_INSERT
+
+    cursor.execute(ACCOUNTS_INSERT.format(name="lob", bio="b", blob=f"X'{blob.hex()}'"))
+
+
+def _insert_bound(cursor, blob: bytes):
+    insert_row(cursor, "accounts", {"name": "lob", "profile_picture": blob})
+
+
+def bench_decode(size: int, rows: int) -> dict:
+    from lib.format_bench import make_accounts_message
+
+    records = [
+        json.dumps(make_accounts_message(i, 256, size), separators=(",", ":")).encode()
+        for i in range(rows)
+    ]
+    result = {"blob_size": size, "record_bytes": len(records[0])}
+    for label, decode in (("whole", _decode_whole), ("split", _decode_split)):
+        result[f"{label}_decode_us"] = round(best_time(decode, records) * 1e6, 1)
+        # tracing slows the calls down, measure memory on its own
+        result[f"{label}_peak_bytes"] = peak_memory(decode, records[0])
+    return result
+
+
+def bench_insert(size: int) -> dict:
+    blob = os.urandom(size)
+    result = {"blob_size": size}
+    for label, insert in (
+        ("literal", lambda cursor: _insert_literal(cursor, blob)),
+        ("bound", lambda cursor: _insert_bound(cursor, blob)),
+    ):
+        cursor = StatementSizer()
+        result[f"{label}_peak_bytes"] = peak_memory(insert, cursor)
+        result[f"{label}_statements"] = cursor.statements
+        result[f"{label}_largest_statement"] = cursor.largest
+    return result
+
+
+def bench_insert_live(credentials, size: int, rows: int) -> dict:
+    from dms_sample.runtime import pool
+
+    blob = os.urandom(size)
+    result = {"blob_size": size, "rows": rows}
+    for label, insert in (
+        ("literal", lambda cursor: _insert_literal(cursor, blob)),
+        ("bound", lambda cursor: _insert_bound(cursor, blob)),
+    ):
+        with pool.connection(credentials) as cnx:
+            with cnx.cursor() as cursor:
+                started = time.perf_counter()
+                for _ in range(rows):
+                    insert(cursor)
+                cnx.commit()
+                result[f"{label}_rows_per_sec"] = round(
+                    rows / (time.perf_counter() - started), 1
+                )
+                cursor.execute("DELETE FROM accounts WHERE name = 'lob'")
+            cnx.commit()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.lobs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report_cmd = commands.add_parser("report")
+    source = report_cmd.add_mutually_exclusive_group(required=True)
+    source.add_argument("--stream", help="Kinesis stream ARN")
+    source.add_argument("--file", help="capture file of lib.record_size --save")
+    report_cmd.add_argument("--since", type=float, help="only records after epoch")
+    report_cmd.add_argument("--db-secret", help="also report the source sizes")
+    bench_cmd = commands.add_parser("bench")
+    bench_cmd.add_argument("--sizes", default=f"1024,16384,{LOB_COLUMN_MAX_SIZE}")
+    bench_cmd.add_argument("--rows", type=int, default=20)
+    bench_cmd.add_argument("--db-secret", help="also time the inserts")
+    args = parser.parse_args()
+
+    credentials = None
+    if args.db_secret:
+        from dms_sample.runtime import get_credentials
+
+        credentials = get_credentials(args.db_secret)
+
+    if args.command == "report":
+        if args.file:
+            raw_records = [raw for raw, _ in load_capture(args.file)]
+        else:
+            from boto3 import client
+
+            from lib.kinesis_reader import iter_stream_records
+
+            kinesis = client("kinesis", endpoint_url=os.getenv("ENDPOINT_URL"))
+            raw_records = [
+                r["Data"] for r in iter_stream_records(kinesis, args.stream, args.since)
+            ]
+        result = {"stream": report(raw_records)}
+        if credentials:
+            result["source"] = {
+                table: source_lob_sizes(credentials, table) for table in LOB_COLUMNS
+            }
+        print(json.dumps(result, indent=2))
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    if max(sizes) > LOB_COLUMN_MAX_SIZE:
+        parser.error(f"the LOB columns hold at most {LOB_COLUMN_MAX_SIZE} bytes")
+    for size in sizes:
+        result = {**bench_decode(size, args.rows), **bench_insert(size)}
+        if credentials:
+            result.update(bench_insert_live(credentials, size, args.rows))
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -82,3 +82,23 @@ PRESEED_DATA = [
     SQL_INSERT_ACCOUNTS_SAMPLE_DATA,
     SQL_INSERT_NOVELS_SAMPLE_DATA,
 ]
+
+PRIMARY_KEYS = {
+    "accounts": ("id",),
+    "authors": ("author_id",),
+    "novels": ("novel_id",),
+}
+
+# TEXT and BLOB columns
+LOB_COLUMNS = {
+    "accounts": ("bio", "profile_picture"),
+    "authors": ("biography",),
+}
+
+# largest value of the BLOB and TEXT columns
+LOB_COLUMN_MAX_SIZE = 65535
+
+# LOB columns DMS emits base64 encoded
+BINARY_COLUMNS = {
+    "accounts": ("profile_picture",),
+}
@@ -0,0 +1,336 @@
+"""Size analyzer for the DMS records written to the Kinesis target stream.
+
+Reports bytes per record per table, split between the payload (`data`
+columns) and the envelope DMS wraps around it (`metadata`, `before-image`,
+formatting whitespace), projects the number of shards a given record rate
+needs and estimates what each verbose endpoint setting costs.
+
+    python -m lib.record_size analyze --stream <arn> [--since <ts>] [--save capture.ndjson]
+    python -m lib.record_size analyze --file capture.ndjson --records-per-sec 500
+    python -m lib.record_size compare verbose=verbose.ndjson minimal=minimal.ndjson
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Iterable
+
+# Kinesis per shard limits
+SHARD_WRITE_BYTES_PER_SEC = 1024 * 1024
+SHARD_WRITE_RECORDS_PER_SEC = 1000
+SHARD_READ_BYTES_PER_SEC = 2 * 1024 * 1024
+
+TRANSACTION_FIELDS = (
+    "transaction-id",
+    "transaction-record-id",
+    "prev-transaction-id",
+    "prev-transaction-record-id",
+    "commit-timestamp",
+    "stream-position",
+)
+PARTITION_FIELDS = ("partition-key-type", "partition-key-value")
+ALTER_OPERATIONS = {
+    "rename-table",
+    "drop-table",
+    "add-column",
+    "drop-column",
+    "rename-column",
+    "column-type-change",
+}
+
+
+# one encoder for all calls, json.dumps with arguments builds a new one each time
+_compact_encode = json.JSONEncoder(separators=(",", ":"), default=str).encode
+
+
+def compact_size(value) -> int:
+    # ensure_ascii output, one byte per character
+    return len(_compact_encode(value))
+
+
+def field_size(key: str, value) -> int:
+    # "key":value plus the separating comma
+    return compact_size(key) + 1 + compact_size(value) + 1
+
+
+def table_of(message: dict) -> str:
+    metadata = message.get("metadata", {})
+    return f"{metadata.get('schema-name', '')}.{metadata.get('table-name', '')}"
+
+
+def breakdown(message: dict) -> Counter:
+    """Compact JSON bytes of each component of a decoded DMS message"""
+    sizes = Counter()
+    for key, value in message.items():
+        if key in ("data", "metadata") and isinstance(value, dict):
+            for inner_key, inner_value in value.items():
+                sizes[f"{key}.{inner_key}"] += field_size(inner_key, inner_value)
+            # braces of the nested object
+            sizes[f"{key}.{{}}"] += compact_size(key) + 4
+        else:
+            sizes[key] += field_size(key, value)
+    return sizes
+
+
+def is_payload(component: str) -> bool:
+    return component.startswith("data.")
+
+
+class SizeReport:
+    def __init__(self):
+        self.records = Counter()
+        self.bytes = Counter()
+        self.payload_bytes = Counter()
+        self.formatting_bytes = Counter()
+        self.components: dict[str, Counter] = defaultdict(Counter)
+        self.first_arrival = None
+        self.last_arrival = None
+
+    def add(self, raw: bytes, arrival: float | None = None):
+        message = json.loads(raw)
+        table = table_of(message)
+        sizes = breakdown(message)
+        compact = compact_size(message)
+        self.records[table] += 1
+        self.bytes[table] += len(raw)
+        self.payload_bytes[table] += sum(
+            size for component, size in sizes.items() if is_payload(component)
+        )
+        # whitespace of the formatted "json" message format
+        self.formatting_bytes[table] += max(len(raw) - compact, 0)
+        self.components[table].update(sizes)
+        if arrival is not None:
+            self.first_arrival = min(arrival, self.first_arrival or arrival)
+            self.last_arrival = max(arrival, self.last_arrival or arrival)
+
+    @property
+    def total_records(self) -> int:
+        return sum(self.records.values())
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.bytes.values())
+
+    def observed_rate(self) -> float | None:
+        if self.first_arrival is None or self.last_arrival == self.first_arrival:
+            return None
+        return self.total_records / (self.last_arrival - self.first_arrival)
+
+    def summary(self) -> dict:
+        tables = {}
+        for table, records in sorted(self.records.items()):
+            payload = self.payload_bytes[table]
+            formatting = self.formatting_bytes[table]
+            tables[table] = {
+                "records": records,
+                "avg_bytes": round(self.bytes[table] / records, 1),
+                "avg_payload_bytes": round(payload / records, 1),
+                "avg_envelope_bytes": round(
+                    (self.bytes[table] - payload - formatting) / records, 1
+                ),
+                "avg_formatting_bytes": round(formatting / records, 1),
+                "top_components": {
+                    component: round(size / records, 1)
+                    for component, size in self.components[table].most_common(8)
+                },
+            }
+        return tables
+
+
+def project_shards(avg_record_bytes: float, records_per_sec: float) -> dict:
+    write_bytes = records_per_sec * avg_record_bytes
+    return {
+        "records_per_sec": round(records_per_sec, 1),
+        "bytes_per_sec": round(write_bytes),
+        "write_shards": max(
+            math.ceil(write_bytes / SHARD_WRITE_BYTES_PER_SEC),
+            math.ceil(records_per_sec / SHARD_WRITE_RECORDS_PER_SEC),
+            1,
+        ),
+        # every polling consumer shares the read budget of a shard
+        "read_shards_per_consumer": max(
+            math.ceil(write_bytes / SHARD_READ_BYTES_PER_SEC), 1
+        ),
+    }
+
+
+# Flag estimation: strip from a captured message what each setting adds
+
+
+def _without_metadata(fields: Iterable[str]) -> Callable[[dict], dict | None]:
+    def strip(message: dict) -> dict | None:
+        metadata = {
+            k: v for k, v in message.get("metadata", {}).items() if k not in fields
+        }
+        return {**message, "metadata": metadata}
+
+    return strip
+
+
+def _without_null_and_empty(message: dict) -> dict | None:
+    data = message.get("data")
+    if not isinstance(data, dict):
+        return message
+    return {**message, "data": {k: v for k, v in data.items() if v not in (None, "")}}
+
+
+def _without_control_details(message: dict) -> dict | None:
+    if message.get("metadata", {}).get("record-type") != "control":
+        return message
+    return {k: v for k, v in message.items() if k not in ("control", "data")}
+
+
+def _without_alter_operations(message: dict) -> dict | None:
+    if message.get("metadata", {}).get("operation") in ALTER_OPERATIONS:
+        return None
+    return message
+
+
+def _without_before_image(message: dict) -> dict | None:
+    return {k: v for k, v in message.items() if k != "before-image"}
+
+
+FLAG_STRIPPERS: dict[str, Callable[[dict], dict | None]] = {
+    "include_transaction_details": _without_metadata(TRANSACTION_FIELDS),
+    "include_partition_value": _without_metadata(PARTITION_FIELDS),
+    "include_null_and_empty": _without_null_and_empty,
+    "include_control_details": _without_control_details,
+    "include_table_alter_operations": _without_alter_operations,
+    # not an endpoint setting but the task BeforeImageSettings
+    "before_image": _without_before_image,
+}
+
+
+def estimate_flag_costs(raw_records: list[bytes]) -> dict:
+    """Compact bytes each verbose option adds to the captured workload"""
+    messages = [json.loads(raw) for raw in raw_records]
+    baseline = sum(compact_size(m) for m in messages)
+    costs = {}
+    for flag, strip in FLAG_STRIPPERS.items():
+        stripped = [strip(m) for m in messages]
+        kept = [m for m in stripped if m is not None]
+        size = sum(compact_size(m) for m in kept)
+        costs[flag] = {
+            "bytes": baseline - size,
+            "records": len(messages) - len(kept),
+            "percent": round(100 * (baseline - size) / baseline, 1) if baseline else 0,
+        }
+    return {"compact_bytes": baseline, "flags": costs}
+
+
+# Capture files: one JSON object per line holding the raw record data
+
+
+def save_capture(records: Iterable[dict], path: str) -> int:
+    count = 0
+    with open(path, "w") as f:
+        for record in records:
+            data = record["Data"]
+            f.write(
+                json.dumps(
+                    {
+                        "partition_key": record["PartitionKey"],
+                        "shard": record.get("ShardId"),
+                        "arrival": record["ApproximateArrivalTimestamp"].timestamp(),
+                        "data": data.decode() if isinstance(data, bytes) else data,
+                    }
+                )
+                + "\n"
+            )
+            count += 1
+    return count
+
+
+def load_capture(path: str) -> list[tuple[bytes, float]]:
+    with open(path) as f:
+        return [
+            (line["data"].encode(), line.get("arrival")) for line in map(json.loads, f)
+        ]
+
+
+def analyze(records: list[tuple[bytes, float]], records_per_sec: float | None):
+    report = SizeReport()
+    for raw, arrival in records:
+        report.add(raw, arrival)
+    if not report.total_records:
+        return {"records": 0}
+    avg = report.total_bytes / report.total_records
+    rate = records_per_sec or report.observed_rate() or 1
+    return {
+        "records": report.total_records,
+        "bytes": report.total_bytes,
+        "avg_bytes": round(avg, 1),
+        "tables": report.summary(),
+        "shards": project_shards(avg, rate),
+        "flag_costs": estimate_flag_costs([raw for raw, _ in records]),
+    }
+
+
+def compare(captures: dict[str, list[tuple[bytes, float]]]) -> dict:
+    """Average record size of the same workload captured under several settings"""
+    results = {}
+    baseline = None
+    for label, records in captures.items():
+        report = SizeReport()
+        for raw, arrival in records:
+            report.add(raw, arrival)
+        avg = report.total_bytes / report.total_records if report.total_records else 0
+        baseline = avg if baseline is None else baseline
+        results[label] = {
+            "records": report.total_records,
+            "avg_bytes": round(avg, 1),
+            "vs_first": round(100 * (avg - baseline) / baseline, 1) if baseline else 0,
+            "tables": {
+                table: stats["avg_bytes"] for table, stats in report.summary().items()
+            },
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.record_size")
+    commands = parser.add_subparsers(dest="command", required=True)
+    analyze_cmd = commands.add_parser("analyze")
+    source = analyze_cmd.add_mutually_exclusive_group(required=True)
+    source.add_argument("--stream", help="Kinesis stream ARN")
+    source.add_argument("--file", help="capture file written with --save")
+    analyze_cmd.add_argument("--since", type=float, help="only records after epoch")
+    analyze_cmd.add_argument("--save", help="write the consumed records to a file")
+    analyze_cmd.add_argument("--records-per-sec", type=float)
+    compare_cmd = commands.add_parser("compare")
+    compare_cmd.add_argument("captures", nargs="+", metavar="LABEL=FILE")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        captures = {}
+        for capture in args.captures:
+            label, _, path = capture.partition("=")
+            captures[label] = load_capture(path or label)
+        print(json.dumps(compare(captures), indent=2))
+        return
+
+    if args.file:
+        records = load_capture(args.file)
+    else:
+        from boto3 import client
+
+        from lib.kinesis_reader import iter_stream_records
+
+        kinesis = client("kinesis", endpoint_url=os.getenv("ENDPOINT_URL"))
+        started = time.time()
+        raw_records = list(iter_stream_records(kinesis, args.stream, args.since))
+        print(f"read {len(raw_records)} records in {time.time() - started:.2f}s")
+        if args.save:
+            save_capture(raw_records, args.save)
+        records = [
+            (r["Data"], r["ApproximateArrivalTimestamp"].timestamp())
+            for r in raw_records
+        ]
+    print(json.dumps(analyze(records, args.records_per_sec), indent=2))
+
+
+if __name__ == "__main__":
+    main()
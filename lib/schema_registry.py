@@ -0,0 +1,215 @@
+"""Table schemas rebuilt from the control records of the target stream.
+
+With `include_control_details` DMS writes a control record with the table
+definition (`control.table-def`) for every `create-table` and column change.
+`SchemaRegistry` keeps one version per such record and a decoder compiled
+once per version, which converts the JSON values of data records to Python
+types (DMS writes `DATE`, `DATETIME`, `NUMERIC` and binary columns as
+strings) without asking the database for the current schema:
+
+    registry = SchemaRegistry()
+    for message in messages:
+        if not registry.observe(message):
+            row = registry.decode(message)
+
+    python -m lib.schema_registry --stream <arn> [--since <ts>]
+"""
+
+import argparse
+import base64
+import bisect
+import datetime
+import decimal
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Callable
+
+from lib.decoders import get_decoder
+
+SCHEMA_OPERATIONS = {
+    "create-table",
+    "add-column",
+    "drop-column",
+    "rename-column",
+    "column-type-change",
+}
+DROP_OPERATIONS = {"drop-table"}
+
+
+def _datetime(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value)
+
+
+def _bytes(value: str) -> bytes:
+    return base64.b64decode(value)
+
+
+def _numeric(value) -> decimal.Decimal:
+    return decimal.Decimal(str(value))
+
+
+# DMS column types that need a conversion, all others are used as decoded
+CONVERTERS: dict[str, Callable] = {
+    "DATE": datetime.date.fromisoformat,
+    "TIME": datetime.time.fromisoformat,
+    "DATETIME": _datetime,
+    "NUMERIC": _numeric,
+    "BYTES": _bytes,
+    "BLOB": _bytes,
+}
+
+
+@dataclass
+class TableSchema:
+    table: str
+    version: int
+    operation: str
+    timestamp: str
+    columns: dict[str, dict] = field(default_factory=dict)
+    primary_key: list[str] = field(default_factory=list)
+
+
+def compile_decoder(schema: TableSchema) -> Callable[[dict], dict]:
+    """Row converter for one schema version, touching only converted columns"""
+    conversions = tuple(
+        (column, CONVERTERS[definition.get("type", "").upper()])
+        for column, definition in schema.columns.items()
+        if definition.get("type", "").upper() in CONVERTERS
+    )
+    if not conversions:
+        return dict
+
+    def decode(data: dict) -> dict:
+        row = dict(data)
+        for column, convert in conversions:
+            value = row.get(column)
+            if value is not None:
+                row[column] = convert(value)
+        return row
+
+    return decode
+
+
+class SchemaRegistry:
+    def __init__(self):
+        self.versions: dict[str, list[TableSchema]] = {}
+        # version timestamps per table, for bisect
+        self._timestamps: dict[str, list[str]] = {}
+        self._decoders: dict[tuple[str, int], Callable[[dict], dict]] = {}
+
+    @staticmethod
+    def table_of(metadata: dict) -> str:
+        return f"{metadata.get('schema-name', '')}.{metadata.get('table-name', '')}"
+
+    def observe(self, message: dict) -> bool:
+        """Record the schema change of a control message, False for data"""
+        metadata = message.get("metadata", {})
+        if metadata.get("record-type") != "control":
+            return False
+        operation = metadata.get("operation")
+        table = self.table_of(metadata)
+        if operation in DROP_OPERATIONS:
+            self._add(table, operation, metadata.get("timestamp", ""), {}, [])
+        elif operation in SCHEMA_OPERATIONS:
+            table_def = (message.get("control") or {}).get("table-def") or {}
+            self._add(
+                table,
+                operation,
+                metadata.get("timestamp", ""),
+                table_def.get("columns", {}),
+                table_def.get("primary-key", []),
+            )
+        return True
+
+    def _add(self, table, operation, timestamp, columns, primary_key):
+        versions = self.versions.setdefault(table, [])
+        timestamps = self._timestamps.setdefault(table, [])
+        if not columns and versions and operation not in DROP_OPERATIONS:
+            # without control details only the operation is known
+            columns = versions[-1].columns
+            primary_key = primary_key or versions[-1].primary_key
+        schema = TableSchema(
+            table, len(versions) + 1, operation, timestamp, columns, primary_key
+        )
+        # control records of a task may overtake data records on other shards,
+        # keep the versions ordered by their timestamps
+        position = bisect.bisect_right(timestamps, timestamp)
+        if position != len(versions):
+            # renumber, decoders are cached by version
+            versions.insert(position, schema)
+            timestamps.insert(position, timestamp)
+            for number, version in enumerate(versions, 1):
+                version.version = number
+            self._decoders = {k: v for k, v in self._decoders.items() if k[0] != table}
+        else:
+            versions.append(schema)
+            timestamps.append(timestamp)
+
+    def schema_at(self, table: str, timestamp: str | None = None) -> TableSchema | None:
+        versions = self.versions.get(table)
+        if not versions:
+            return None
+        if timestamp is None:
+            return versions[-1]
+        # DMS timestamps are ISO 8601 in UTC and compare as strings
+        position = bisect.bisect_right(self._timestamps[table], timestamp)
+        return versions[max(position - 1, 0)]
+
+    def decoder(self, schema: TableSchema) -> Callable[[dict], dict]:
+        key = (schema.table, schema.version)
+        decoder = self._decoders.get(key)
+        if decoder is None:
+            decoder = self._decoders[key] = compile_decoder(schema)
+        return decoder
+
+    def decode(self, message: dict) -> dict | None:
+        """Typed row of a data message, as is when its table is unknown"""
+        data = message.get("data")
+        if data is None:
+            return None
+        metadata = message.get("metadata", {})
+        schema = self.schema_at(self.table_of(metadata), metadata.get("timestamp"))
+        if schema is None:
+            return data
+        return self.decoder(schema)(data)
+
+    def history(self) -> dict:
+        return {
+            table: [
+                {
+                    "version": schema.version,
+                    "operation": schema.operation,
+                    "timestamp": schema.timestamp,
+                    "columns": {
+                        column: definition.get("type")
+                        for column, definition in schema.columns.items()
+                    },
+                }
+                for schema in versions
+            ]
+            for table, versions in self.versions.items()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.schema_registry")
+    parser.add_argument("--stream", required=True, help="Kinesis stream ARN")
+    parser.add_argument("--since", type=float, help="only records after epoch")
+    parser.add_argument("--format", default=os.getenv("MESSAGE_FORMAT", "json"))
+    args = parser.parse_args()
+
+    from boto3 import client
+
+    from lib.kinesis_reader import iter_stream_records
+
+    kinesis = client("kinesis", endpoint_url=os.getenv("ENDPOINT_URL"))
+    decoder = get_decoder(args.format)
+    registry = SchemaRegistry()
+    for record in iter_stream_records(kinesis, args.stream, args.since):
+        registry.observe(decoder(record["Data"]))
+    print(json.dumps(registry.history(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
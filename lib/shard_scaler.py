@@ -0,0 +1,428 @@
+"""Scale the shards of the target stream with the load DMS writes.
+
+The stack creates the stream with a fixed shard count, so a burst of CDC
+writes is throttled and turns into lag. The controller looks at the incoming
+records and bytes per shard, the throttled writes and the CDC latency of a
+task every period, and calls `UpdateShardCount` when the stream stayed hot
+(or cold) for several periods in a row and the cooldown since the previous
+change is over:
+
+    python -m lib.shard_scaler run --stream <stream-arn> --task <task-arn> [--dry-run]
+
+Resharding takes a while and Kinesis allows few changes a day, so the policy
+is tuned offline: `record` saves the load of the stream from CloudWatch and
+`simulate` replays a load profile (or a capture of lib.record_size) against
+a model of the stream and reports the lag, the throttled records and the
+shard hours of the policy:
+
+    python -m lib.shard_scaler record --stream <stream-arn> --hours 24 --output load.ndjson
+    python -m lib.shard_scaler simulate --profile load.ndjson --up-periods 1
+"""
+
+import argparse
+import collections
+import datetime
+import json
+import math
+import os
+import time
+from dataclasses import asdict, dataclass, fields
+
+from lib.record_size import SHARD_WRITE_BYTES_PER_SEC, SHARD_WRITE_RECORDS_PER_SEC
+
+DAY = 24 * 3600
+
+
+@dataclass
+class ScalingPolicy:
+    min_shards: int = 1
+    max_shards: int = 16
+    # share of the shard write limits the new shard count aims at
+    target_utilization: float = 0.6
+    scale_up_utilization: float = 0.8
+    scale_down_utilization: float = 0.3
+    # seconds of CDC latency that count as lagging
+    lag_threshold: float = 30.0
+    # consecutive periods above / below the thresholds before acting
+    up_periods: int = 2
+    down_periods: int = 5
+    # seconds after a change before the next scale up / down
+    up_cooldown: float = 120.0
+    down_cooldown: float = 900.0
+    # UpdateShardCount calls allowed in a rolling day
+    max_actions_per_day: int = 10
+
+
+@dataclass
+class Observation:
+    timestamp: float
+    shards: int
+    records_per_sec: float
+    bytes_per_sec: float
+    throttled_records: float = 0
+    lag: float | None = None
+
+
+@dataclass
+class ScalingAction:
+    timestamp: float
+    shards: int
+    target: int
+    reason: str
+
+
+def utilization(observation: Observation) -> float:
+    """Share of the write limits of the stream used, the tighter of both"""
+    return max(
+        observation.records_per_sec / SHARD_WRITE_RECORDS_PER_SEC,
+        observation.bytes_per_sec / SHARD_WRITE_BYTES_PER_SEC,
+    ) / max(observation.shards, 1)
+
+
+def needed_shards(observation: Observation, target_utilization: float) -> int:
+    load = utilization(observation) * max(observation.shards, 1)
+    return max(math.ceil(load / target_utilization), 1)
+
+
+class ShardController:
+    def __init__(self, policy: ScalingPolicy | None = None):
+        self.policy = policy or ScalingPolicy()
+        self.hot_periods = 0
+        self.cold_periods = 0
+        self.actions: collections.deque[ScalingAction] = collections.deque()
+
+    def decide(self, observation: Observation) -> ScalingAction | None:
+        policy = self.policy
+        shards = observation.shards
+        used = utilization(observation)
+        throttled = observation.throttled_records > 0
+        lagging = (observation.lag or 0) >= policy.lag_threshold
+        hot = throttled or lagging or used >= policy.scale_up_utilization
+        cold = not (throttled or lagging) and used < policy.scale_down_utilization
+        self.hot_periods = self.hot_periods + 1 if hot else 0
+        self.cold_periods = self.cold_periods + 1 if cold else 0
+
+        target = needed_shards(observation, policy.target_utilization)
+        if hot and self.hot_periods >= policy.up_periods:
+            if (throttled or lagging) and used >= policy.scale_up_utilization:
+                # a saturated stream hides the demand, double the capacity
+                target = max(target, shards * 2)
+            target = max(target, shards + 1)
+            reason = "throttled" if throttled else "lag" if lagging else "utilization"
+        elif cold and self.cold_periods >= policy.down_periods:
+            reason = "idle"
+        else:
+            return None
+        # UpdateShardCount changes the count by a factor of two at most
+        target = min(target, shards * 2, policy.max_shards)
+        target = max(target, math.ceil(shards / 2), policy.min_shards)
+        if target == shards:
+            return None
+
+        last = self.actions[-1] if self.actions else None
+        cooldown = policy.up_cooldown if target > shards else policy.down_cooldown
+        if last and observation.timestamp - last.timestamp < cooldown:
+            return None
+        while self.actions and observation.timestamp - self.actions[0].timestamp >= DAY:
+            self.actions.popleft()
+        if len(self.actions) >= policy.max_actions_per_day:
+            return None
+        action = ScalingAction(observation.timestamp, shards, target, reason)
+        self.actions.append(action)
+        self.hot_periods = self.cold_periods = 0
+        return action
+
+
+# Live
+
+
+def open_shards(kinesis_client, stream: str) -> tuple[int, str]:
+    summary = kinesis_client.describe_stream_summary(StreamARN=stream)[
+        "StreamDescriptionSummary"
+    ]
+    return summary["OpenShardCount"], summary["StreamStatus"]
+
+
+def observation_from_sample(sample, shards: int, period: int) -> Observation:
+    """An Observation from a lib.throttle_probe sample of `period` seconds"""
+    return Observation(
+        timestamp=sample.timestamp,
+        shards=shards,
+        records_per_sec=sample.incoming_records / period,
+        bytes_per_sec=sample.incoming_bytes / period,
+        throttled_records=sample.throttled_records,
+        lag=sample.latency_target,
+    )
+
+
+def run(
+    kinesis_client,
+    cloudwatch_client,
+    dms_client,
+    stream: str,
+    task_arn: str,
+    policy: ScalingPolicy,
+    period: int = 60,
+    dry_run: bool = False,
+):
+    from lib.throttle_probe import fetch_samples
+
+    controller = ShardController(policy)
+    while True:
+        shards, status = open_shards(kinesis_client, stream)
+        end = datetime.datetime.now(datetime.timezone.utc)
+        samples = fetch_samples(
+            cloudwatch_client,
+            dms_client,
+            task_arn,
+            stream,
+            end - datetime.timedelta(seconds=3 * period),
+            end,
+            period,
+        )
+        if samples:
+            observation = observation_from_sample(samples[-1], shards, period)
+            print(json.dumps({**asdict(observation), "status": status}))
+        # a resharding stream rejects UpdateShardCount
+        if samples and status == "ACTIVE":
+            action = controller.decide(observation)
+            if action:
+                print(json.dumps({"action": asdict(action), "dry_run": dry_run}))
+                if not dry_run:
+                    kinesis_client.update_shard_count(
+                        StreamARN=stream,
+                        TargetShardCount=action.target,
+                        ScalingType="UNIFORM_SCALING",
+                    )
+        time.sleep(period)
+
+
+def record_profile(
+    cloudwatch_client, stream: str, start, end, period: int = 60
+) -> list[dict]:
+    """Records and bytes per second written to the stream, per period"""
+    from lib.throttle_probe import _query
+
+    stream_name = {"StreamName": stream.rsplit("/", 1)[-1]}
+    queries = [
+        _query("records", "AWS/Kinesis", "IncomingRecords", stream_name, "Sum"),
+        _query("bytes", "AWS/Kinesis", "IncomingBytes", stream_name, "Sum"),
+    ]
+    for query in queries:
+        query["MetricStat"]["Period"] = period
+    profile: dict[float, dict] = {}
+    kwargs = {"MetricDataQueries": queries, "StartTime": start, "EndTime": end}
+    while True:
+        res = cloudwatch_client.get_metric_data(**kwargs)
+        for result in res["MetricDataResults"]:
+            for timestamp, value in zip(result["Timestamps"], result["Values"]):
+                key = timestamp.timestamp()
+                entry = profile.setdefault(
+                    key, {"timestamp": key, "records": 0.0, "bytes": 0.0}
+                )
+                entry[result["Id"]] = value / period
+        if not res.get("NextToken"):
+            break
+        kwargs["NextToken"] = res["NextToken"]
+    return [profile[key] for key in sorted(profile)]
+
+
+# Simulation
+
+
+def load_profile(path: str) -> list[dict]:
+    """Records and bytes per second, from a profile or a capture file"""
+    with open(path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    if not lines or "data" not in lines[0]:
+        return lines
+    # a capture of lib.record_size, one line per record
+    seconds: dict[int, dict] = {}
+    for line in lines:
+        second = int(line["arrival"])
+        entry = seconds.setdefault(
+            second, {"timestamp": float(second), "records": 0, "bytes": 0}
+        )
+        entry["records"] += 1
+        entry["bytes"] += len(line["data"]) + len(line["partition_key"])
+    first, last = min(seconds), max(seconds)
+    return [
+        seconds.get(s, {"timestamp": float(s), "records": 0, "bytes": 0})
+        for s in range(first, last + 1)
+    ]
+
+
+def simulate(
+    profile: list[dict],
+    policy: ScalingPolicy,
+    shards: int = 1,
+    period: int = 60,
+    reshard_seconds: float = 30,
+) -> dict:
+    """Replay `profile` second by second against a stream of `shards` shards.
+
+    Every second the writer sends its backlog in commit order up to the write
+    limits of the open shards, the rest is throttled and retried. The
+    controller sees the accepted load every `period` seconds, a new shard
+    count applies `reshard_seconds` after the call.
+    """
+    controller = ShardController(policy)
+    start = int(profile[0]["timestamp"])
+    # commit time, records and bytes still to write, oldest first
+    backlog: collections.deque[list] = collections.deque()
+    pending: tuple[float, int] | None = None
+    accepted_records = accepted_bytes = throttled = 0.0
+    lags: list[float] = []
+    timeline, actions = [], []
+    totals = {"throttled_records": 0.0, "shard_seconds": 0.0}
+
+    for index, entry in enumerate(profile):
+        if index + 1 < len(profile):
+            end = profile[index + 1]["timestamp"]
+        else:
+            # the last entry lasts as long as the one before it
+            end = (
+                entry["timestamp"] * 2 - profile[index - 1]["timestamp"]
+                if index
+                else entry["timestamp"] + 1
+            )
+        for now in range(int(entry["timestamp"]), int(end)):
+            if pending and now >= pending[0]:
+                shards, pending = pending[1], None
+            if entry["records"]:
+                backlog.append([now, entry["records"], entry["bytes"]])
+            records_left = shards * SHARD_WRITE_RECORDS_PER_SEC
+            bytes_left = shards * SHARD_WRITE_BYTES_PER_SEC
+            while backlog and records_left > 0 and bytes_left > 0:
+                chunk = backlog[0]
+                share = min(
+                    1.0,
+                    records_left / chunk[1],
+                    bytes_left / chunk[2] if chunk[2] else 1.0,
+                )
+                records, size = chunk[1] * share, chunk[2] * share
+                records_left -= records
+                bytes_left -= size
+                accepted_records += records
+                accepted_bytes += size
+                if share == 1.0:
+                    backlog.popleft()
+                else:
+                    chunk[1] -= records
+                    chunk[2] -= size
+            rejected = sum(chunk[1] for chunk in backlog)
+            throttled += rejected
+            totals["throttled_records"] += rejected
+            totals["shard_seconds"] += shards
+            lag = now - backlog[0][0] if backlog else 0.0
+            lags.append(lag)
+
+            if (now - start + 1) % period:
+                continue
+            observation = Observation(
+                timestamp=float(now),
+                shards=shards,
+                records_per_sec=accepted_records / period,
+                bytes_per_sec=accepted_bytes / period,
+                throttled_records=throttled,
+                lag=max(lags[-period:]),
+            )
+            accepted_records = accepted_bytes = throttled = 0.0
+            timeline.append(asdict(observation))
+            if pending:
+                # the stream is updating, UpdateShardCount would be rejected
+                continue
+            action = controller.decide(observation)
+            if action:
+                actions.append(asdict(action))
+                pending = (now + reshard_seconds, action.target)
+
+    ordered = sorted(lags)
+    return {
+        "seconds": len(lags),
+        "actions": actions,
+        "max_shards": max([shards, *(a["target"] for a in actions)]),
+        "shard_hours": round(totals["shard_seconds"] / 3600, 2),
+        "throttled_records": round(totals["throttled_records"]),
+        "lag_p99": ordered[max(math.ceil(len(ordered) * 99 / 100) - 1, 0)],
+        "lag_max": ordered[-1],
+        "timeline": timeline,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.shard_scaler")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_cmd = commands.add_parser("run")
+    run_cmd.add_argument("--stream", required=True, help="Kinesis stream ARN")
+    run_cmd.add_argument("--task", required=True, help="replication task ARN")
+    run_cmd.add_argument("--dry-run", action="store_true")
+    record = commands.add_parser("record")
+    record.add_argument("--stream", required=True, help="Kinesis stream ARN")
+    record.add_argument("--hours", type=float, default=24)
+    record.add_argument("--output", required=True)
+    sim = commands.add_parser("simulate")
+    sim.add_argument("--profile", required=True, help="profile or capture file")
+    sim.add_argument("--shards", type=int, default=1, help="initial shard count")
+    sim.add_argument("--reshard-seconds", type=float, default=30)
+    sim.add_argument("--timeline", action="store_true", help="print the periods")
+    for command in (run_cmd, record, sim):
+        command.add_argument("--period", type=int, default=60)
+    for command in (run_cmd, sim):
+        for policy_field in fields(ScalingPolicy):
+            command.add_argument(
+                f"--{policy_field.name.replace('_', '-')}",
+                type=policy_field.type,
+                default=policy_field.default,
+            )
+    args = parser.parse_args()
+
+    if args.command != "record":
+        policy = ScalingPolicy(
+            **{f.name: getattr(args, f.name) for f in fields(ScalingPolicy)}
+        )
+    if args.command == "simulate":
+        result = simulate(
+            load_profile(args.profile),
+            policy,
+            args.shards,
+            args.period,
+            args.reshard_seconds,
+        )
+        if not args.timeline:
+            result.pop("timeline")
+        print(json.dumps(result, indent=2))
+        return
+
+    from boto3 import client
+
+    endpoint_url = os.getenv("ENDPOINT_URL")
+    cloudwatch = client("cloudwatch", endpoint_url=endpoint_url)
+    if args.command == "record":
+        end = datetime.datetime.now(datetime.timezone.utc)
+        profile = record_profile(
+            cloudwatch,
+            args.stream,
+            end - datetime.timedelta(hours=args.hours),
+            end,
+            args.period,
+        )
+        with open(args.output, "w") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in profile)
+        print(f"recorded {len(profile)} periods")
+        return
+
+    run(
+        client("kinesis", endpoint_url=endpoint_url),
+        cloudwatch,
+        client("dms", endpoint_url=endpoint_url),
+        args.stream,
+        args.task,
+        policy,
+        args.period,
+        args.dry_run,
+    )
+
+
+if __name__ == "__main__":
+    main()
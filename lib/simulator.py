@@ -0,0 +1,679 @@
+"""Offline stand-in for DMS and Kinesis to benchmark the consumer side.
+
+`LocalKinesis` implements the subset of the boto3 Kinesis client used by the
+harness (`describe_stream`, `list_shards`, `get_shard_iterator`,
+`get_records`, `put_record(s)`) on top of in-memory shards, optionally
+persisted to a directory, so it can be passed wherever a `kinesis` client is
+expected (e.g. `lib.kinesis_reader.iter_stream_records`).
+
+`DmsEmitter` writes DMS shaped JSON messages to it, either generated
+(`python -m lib.simulator bench`) or from the row events of the local MariaDB
+binlog with `BinlogTailer`, which needs the optional `mysql-replication`
+package:
+
+    python -m lib.simulator bench --events 1000000 --shards 4
+    python -m lib.simulator tail --seconds 30 --stream-dir ./sim-stream
+"""
+
+import argparse
+import base64
+import bisect
+import datetime
+import decimal
+import json
+import os
+import struct
+import time
+from typing import Iterable
+
+from lib.decoders import get_decoder
+from lib.hotspot import ShardMap, even_shards
+from lib.record_size import SHARD_WRITE_BYTES_PER_SEC, SHARD_WRITE_RECORDS_PER_SEC
+
+ACCOUNT_ID = "000000000000"
+REGION = "local"
+
+# sequence number, arrival timestamp, partition key length, data length
+RECORD_HEADER = struct.Struct("<QdHI")
+
+
+class ResourceNotFoundException(Exception):
+    pass
+
+
+class ProvisionedThroughputExceededException(Exception):
+    pass
+
+
+class InvalidArgumentException(Exception):
+    pass
+
+
+class LocalShard:
+    def __init__(self, shard: dict):
+        self.description = shard
+        self.sequence_numbers: list[int] = []
+        self.arrivals: list[float] = []
+        self.partition_keys: list[str] = []
+        self.data: list[bytes] = []
+        # writes of the current one second window, for the write limits
+        self.window = 0
+        self.window_records = 0
+        self.window_bytes = 0
+
+    def accept(self, size: int, now: float) -> bool:
+        window = int(now)
+        if window != self.window:
+            self.window, self.window_records, self.window_bytes = window, 0, 0
+        if (
+            self.window_records + 1 > SHARD_WRITE_RECORDS_PER_SEC
+            or self.window_bytes + size > SHARD_WRITE_BYTES_PER_SEC
+        ):
+            return False
+        self.window_records += 1
+        self.window_bytes += size
+        return True
+
+    def append(self, sequence_number, arrival, partition_key, data):
+        self.sequence_numbers.append(sequence_number)
+        self.arrivals.append(arrival)
+        self.partition_keys.append(partition_key)
+        self.data.append(data)
+
+
+class LocalKinesis:
+    """In-memory Kinesis stream store, optionally persisted to `directory`.
+
+    With `write_limits` every shard rejects writes above the Kinesis limits of
+    1000 records and 1 MB per second, like a provisioned stream does.
+    """
+
+    def __init__(self, directory: str | None = None, write_limits: bool = False):
+        self.directory = directory
+        self.write_limits = write_limits
+        # records rejected by the write limits
+        self.throttled = 0
+        # arrival timestamps, replaceable by a simulated clock
+        self.clock = time.time
+        self.streams: dict[str, dict[str, LocalShard]] = {}
+        self._shard_maps: dict[str, ShardMap] = {}
+        self._sequence_number = 0
+        self._files = {}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    # stream management
+
+    @staticmethod
+    def stream_arn(name: str) -> str:
+        return f"arn:aws:kinesis:{REGION}:{ACCOUNT_ID}:stream/{name}"
+
+    def create_stream(self, StreamName: str, ShardCount: int = 1, **kwargs):
+        arn = self.stream_arn(StreamName)
+        shards = even_shards(ShardCount)
+        self.streams[arn] = {shard["ShardId"]: LocalShard(shard) for shard in shards}
+        self._shard_maps[arn] = ShardMap(shards)
+        if self.directory:
+            with open(os.path.join(self.directory, f"{StreamName}.json"), "w") as f:
+                json.dump({"shards": shards}, f)
+        return {}
+
+    def _stream(self, StreamARN: str | None = None, StreamName: str | None = None):
+        arn = StreamARN or self.stream_arn(StreamName)
+        try:
+            return arn, self.streams[arn]
+        except KeyError:
+            raise ResourceNotFoundException(f"Stream {arn} not found") from None
+
+    def describe_stream(self, StreamARN=None, StreamName=None, **kwargs):
+        arn, shards = self._stream(StreamARN, StreamName)
+        return {
+            "StreamDescription": {
+                "StreamARN": arn,
+                "StreamName": arn.rsplit("/", 1)[-1],
+                "StreamStatus": "ACTIVE",
+                "Shards": [shard.description for shard in shards.values()],
+                "HasMoreShards": False,
+            }
+        }
+
+    def list_shards(self, StreamARN=None, StreamName=None, **kwargs):
+        _, shards = self._stream(StreamARN, StreamName)
+        return {"Shards": [shard.description for shard in shards.values()]}
+
+    # writes
+
+    def _put(self, arn: str, partition_key: str, data: bytes, arrival: float):
+        shard_id = self._shard_maps[arn].shard_for(partition_key)
+        if self.write_limits and not self.streams[arn][shard_id].accept(
+            len(data) + len(partition_key), arrival
+        ):
+            self.throttled += 1
+            return None
+        self._sequence_number += 1
+        self.streams[arn][shard_id].append(
+            self._sequence_number, arrival, partition_key, data
+        )
+        if self.directory:
+            self._persist(
+                arn, shard_id, self._sequence_number, arrival, partition_key, data
+            )
+        return {"ShardId": shard_id, "SequenceNumber": str(self._sequence_number)}
+
+    def put_record(self, Data, PartitionKey, StreamARN=None, StreamName=None, **kwargs):
+        arn, _ = self._stream(StreamARN, StreamName)
+        result = self._put(arn, PartitionKey, _as_bytes(Data), self.clock())
+        if result is None:
+            raise ProvisionedThroughputExceededException(
+                "Rate exceeded for shard in stream"
+            )
+        return result
+
+    def put_records(self, Records, StreamARN=None, StreamName=None, **kwargs):
+        arn, _ = self._stream(StreamARN, StreamName)
+        arrival = self.clock()
+        results = [
+            self._put(arn, record["PartitionKey"], _as_bytes(record["Data"]), arrival)
+            for record in Records
+        ]
+        failed = 0
+        for i, result in enumerate(results):
+            if result is None:
+                failed += 1
+                results[i] = {
+                    "ErrorCode": "ProvisionedThroughputExceededException",
+                    "ErrorMessage": "Rate exceeded for shard in stream",
+                }
+        return {"FailedRecordCount": failed, "Records": results}
+
+    # reads
+
+    def get_shard_iterator(
+        self,
+        ShardId: str,
+        ShardIteratorType: str,
+        StreamARN=None,
+        StreamName=None,
+        StartingSequenceNumber=None,
+        Timestamp=None,
+        **kwargs,
+    ):
+        arn, shards = self._stream(StreamARN, StreamName)
+        shard = shards[ShardId]
+        if ShardIteratorType == "TRIM_HORIZON":
+            position = 0
+        elif ShardIteratorType == "LATEST":
+            position = len(shard.data)
+        elif ShardIteratorType == "AT_TIMESTAMP":
+            if isinstance(Timestamp, datetime.datetime):
+                Timestamp = Timestamp.timestamp()
+            position = bisect.bisect_left(shard.arrivals, float(Timestamp))
+        elif ShardIteratorType in ("AT_SEQUENCE_NUMBER", "AFTER_SEQUENCE_NUMBER"):
+            sequence_number = int(StartingSequenceNumber)
+            bisect_fn = (
+                bisect.bisect_left
+                if ShardIteratorType == "AT_SEQUENCE_NUMBER"
+                else bisect.bisect_right
+            )
+            position = bisect_fn(shard.sequence_numbers, sequence_number)
+        else:
+            raise ValueError(f"Unsupported ShardIteratorType {ShardIteratorType}")
+        return {"ShardIterator": f"{arn}|{ShardId}|{position}"}
+
+    def get_records(self, ShardIterator: str, Limit: int = 10000, **kwargs):
+        arn, shard_id, position = ShardIterator.rsplit("|", 2)
+        shard = self.streams[arn][shard_id]
+        start = int(position)
+        end = min(start + Limit, len(shard.data))
+        fromtimestamp = datetime.datetime.fromtimestamp
+        records = [
+            {
+                "SequenceNumber": str(shard.sequence_numbers[i]),
+                "ApproximateArrivalTimestamp": fromtimestamp(
+                    shard.arrivals[i], datetime.timezone.utc
+                ),
+                "Data": shard.data[i],
+                "PartitionKey": shard.partition_keys[i],
+            }
+            for i in range(start, end)
+        ]
+        behind = 0
+        if end < len(shard.data):
+            behind = int((shard.arrivals[-1] - shard.arrivals[end]) * 1000)
+        return {
+            "Records": records,
+            "NextShardIterator": f"{arn}|{shard_id}|{end}",
+            "MillisBehindLatest": behind,
+        }
+
+    # persistence
+
+    def _persist(self, arn, shard_id, sequence_number, arrival, partition_key, data):
+        key = (arn, shard_id)
+        f = self._files.get(key)
+        if f is None:
+            name = arn.rsplit("/", 1)[-1]
+            path = os.path.join(self.directory, f"{name}.{shard_id}.bin")
+            f = self._files[key] = open(path, "ab")
+        partition_key = partition_key.encode()
+        f.write(
+            RECORD_HEADER.pack(sequence_number, arrival, len(partition_key), len(data))
+        )
+        f.write(partition_key)
+        f.write(data)
+
+    def flush(self):
+        for f in self._files.values():
+            f.flush()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def _load(self):
+        for entry in sorted(os.listdir(self.directory)):
+            if not entry.endswith(".json"):
+                continue
+            name = entry[: -len(".json")]
+            with open(os.path.join(self.directory, entry)) as f:
+                shards = json.load(f)["shards"]
+            arn = self.stream_arn(name)
+            self.streams[arn] = {s["ShardId"]: LocalShard(s) for s in shards}
+            self._shard_maps[arn] = ShardMap(shards)
+            for shard_id, shard in self.streams[arn].items():
+                path = os.path.join(self.directory, f"{name}.{shard_id}.bin")
+                if os.path.exists(path):
+                    for record in _read_shard_file(path):
+                        shard.append(*record)
+                        self._sequence_number = max(self._sequence_number, record[0])
+
+
+def _read_shard_file(path: str) -> Iterable[tuple]:
+    with open(path, "rb") as f:
+        buffer = f.read()
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(buffer):
+        sequence_number, arrival, key_length, data_length = RECORD_HEADER.unpack_from(
+            buffer, offset
+        )
+        offset += RECORD_HEADER.size
+        partition_key = buffer[offset : offset + key_length].decode()
+        offset += key_length
+        data = buffer[offset : offset + data_length]
+        offset += data_length
+        yield sequence_number, arrival, partition_key, data
+
+
+def _as_bytes(data) -> bytes:
+    return data.encode() if isinstance(data, str) else bytes(data)
+
+
+def _json_default(value):
+    # DMS emits binary columns base64 encoded and temporal columns as strings
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return str(value)
+    if isinstance(value, set):
+        return ",".join(sorted(value))
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class DmsEmitter:
+    """Writes DMS shaped messages to a Kinesis compatible client.
+
+    Mirrors the target endpoint of the stack: partition key `<schema>.<table>`,
+    transaction details, partition value and before images on updates.
+    """
+
+    def __init__(self, kinesis_client, stream: str, message_format: str = "json"):
+        self.kinesis = kinesis_client
+        self.stream = stream
+        self.indent = 4 if message_format == "json" else None
+        self.separators = None if message_format == "json" else (",", ":")
+        self.transaction_id = 0
+        self.transaction_record_id = 0
+        # last message, DMS links every message to its predecessor
+        self.previous: tuple[int, int] | None = None
+        self.emitted = 0
+
+    def begin(self):
+        self.transaction_id += 1
+        self.transaction_record_id = 0
+
+    def message(
+        self,
+        schema: str,
+        table: str,
+        operation: str,
+        data: dict | None,
+        record_type: str = "data",
+        before_image: dict | None = None,
+    ) -> dict:
+        self.transaction_record_id += 1
+        message = {
+            "data": data,
+            "metadata": {
+                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "record-type": record_type,
+                "operation": operation,
+                "partition-key-type": "schema-table",
+                "partition-key-value": f"{schema}.{table}",
+                "schema-name": schema,
+                "table-name": table,
+                "transaction-id": self.transaction_id,
+                "transaction-record-id": self.transaction_record_id,
+            },
+        }
+        if self.previous:
+            message["metadata"]["prev-transaction-id"] = self.previous[0]
+            message["metadata"]["prev-transaction-record-id"] = self.previous[1]
+        self.previous = (self.transaction_id, self.transaction_record_id)
+        if before_image is not None:
+            message["before-image"] = before_image
+        return message
+
+    def encode(self, message: dict) -> bytes:
+        return json.dumps(
+            message,
+            indent=self.indent,
+            separators=self.separators,
+            default=_json_default,
+        ).encode()
+
+    def emit(self, messages: list[dict]):
+        for start in range(0, len(messages), 500):
+            # PutRecords accepts up to 500 records per call
+            self.kinesis.put_records(
+                StreamARN=self.stream,
+                Records=[
+                    {"Data": self.encode(m), "PartitionKey": _partition_key(m)}
+                    for m in messages[start : start + 500]
+                ],
+            )
+        self.emitted += len(messages)
+
+
+def _partition_key(message: dict) -> str:
+    metadata = message["metadata"]
+    return f"{metadata['schema-name']}.{metadata['table-name']}"
+
+
+DDL_OPERATIONS = (
+    ("CREATE TABLE", "create-table"),
+    ("DROP TABLE", "drop-table"),
+    ("RENAME TABLE", "rename-table"),
+    ("ALTER TABLE", "alter-table"),
+)
+ALTER_OPERATIONS = (
+    ("ADD COLUMN", "add-column"),
+    ("DROP COLUMN", "drop-column"),
+    ("MODIFY COLUMN", "column-type-change"),
+    ("CHANGE COLUMN", "rename-column"),
+)
+
+
+def ddl_operation(query: str) -> tuple[str, str] | None:
+    """(DMS control operation, table) of a DDL statement"""
+    upper = query.strip().upper()
+    for prefix, operation in DDL_OPERATIONS:
+        if not upper.startswith(prefix):
+            continue
+        words = query.strip()[len(prefix) :].split()
+        if words[:2] and words[0].upper() == "IF":
+            # DROP TABLE IF EXISTS <table>, CREATE TABLE IF NOT EXISTS <table>
+            words = words[2:] if words[1].upper() == "EXISTS" else words[3:]
+        table = words[0].split("(")[0].strip("`;").split(".")[-1].strip("`")
+        if operation == "alter-table":
+            for clause, alter_operation in ALTER_OPERATIONS:
+                if clause in upper:
+                    operation = alter_operation
+                    break
+        return operation, table
+    return None
+
+
+# operation of the binlog row events
+ROW_OPERATIONS = {
+    "WriteRowsEvent": "insert",
+    "UpdateRowsEvent": "update",
+    "DeleteRowsEvent": "delete",
+}
+# seconds between reads of an idle binlog while tailing with a deadline
+TAIL_POLL_SECONDS = 0.2
+
+
+class BinlogTailer:
+    """Tails the row events of a MariaDB/MySQL binlog into a `DmsEmitter`.
+
+    The source needs the same settings DMS requires (`binlog_format=ROW`,
+    `binlog_row_image=FULL`, `binlog_checksum=NONE`) and
+    `binlog_row_metadata=FULL` for the column names of the row events, which
+    docker-compose.yml configures for the local MariaDB container.
+    """
+
+    def __init__(self, credentials: dict, emitter: DmsEmitter, server_id: int = 4242):
+        self.credentials = credentials
+        self.emitter = emitter
+        self.server_id = server_id
+        # between the start of a transaction and its commit
+        self.in_transaction = False
+
+    def _begin(self):
+        self.emitter.begin()
+        self.in_transaction = True
+
+    def _reader(self, blocking: bool):
+        try:
+            from pymysqlreplication import BinLogStreamReader
+        except ImportError:
+            raise RuntimeError(
+                "Tailing the binlog requires the optional "
+                "'mysql-replication' package: pip install mysql-replication"
+            ) from None
+        return BinLogStreamReader(
+            connection_settings={
+                "host": self.credentials["host"],
+                "port": int(self.credentials["port"]),
+                "user": self.credentials["username"],
+                "passwd": self.credentials["password"],
+            },
+            server_id=self.server_id,
+            only_schemas=[self.credentials["dbname"]],
+            resume_stream=True,
+            blocking=blocking,
+            is_mariadb=True,
+        )
+
+    def messages_for(self, event) -> list[dict]:
+        # dispatch on the class name, only the reader needs mysql-replication
+        kind = type(event).__name__
+        emitter = self.emitter
+        query = event.query.strip().upper() if kind == "QueryEvent" else ""
+        if kind == "MariadbGtidEvent" or query == "BEGIN":
+            # MariaDB starts each transaction with a GTID event, MySQL with BEGIN
+            if not self.in_transaction:
+                self._begin()
+            return []
+        if kind == "XidEvent" or query == "COMMIT":
+            self.in_transaction = False
+            return []
+        if kind in ROW_OPERATIONS:
+            if not self.in_transaction:
+                self._begin()
+            operation = ROW_OPERATIONS[kind]
+            if operation == "update":
+                return [
+                    emitter.message(
+                        event.schema,
+                        event.table,
+                        operation,
+                        row["after_values"],
+                        before_image=row["before_values"],
+                    )
+                    for row in event.rows
+                ]
+            return [
+                emitter.message(event.schema, event.table, operation, row["values"])
+                for row in event.rows
+            ]
+        if kind == "QueryEvent":
+            ddl = ddl_operation(event.query)
+            if ddl:
+                operation, table = ddl
+                schema = event.schema
+                if isinstance(schema, bytes):
+                    schema = schema.decode()
+                # DDL commits implicitly, in its own transaction
+                if not self.in_transaction:
+                    self._begin()
+                self.in_transaction = False
+                return [
+                    emitter.message(
+                        schema or "", table, operation, None, record_type="control"
+                    )
+                ]
+        return []
+
+    def run(self, seconds: float | None = None, blocking: bool = True) -> int:
+        if seconds is None:
+            reader = self._reader(blocking)
+            try:
+                for event in reader:
+                    self._emit(event)
+            finally:
+                reader.close()
+            return self.emitter.emitted
+
+        # a blocking reader waits for the next event and would miss the
+        # deadline on an idle source, poll a non-blocking one instead
+        reader = self._reader(blocking=False)
+        deadline = time.time() + seconds
+        try:
+            while time.time() < deadline:
+                event = reader.fetchone()
+                if event is not None:
+                    self._emit(event)
+                elif not blocking:
+                    break
+                else:
+                    time.sleep(min(TAIL_POLL_SECONDS, max(deadline - time.time(), 0)))
+        finally:
+            reader.close()
+        return self.emitter.emitted
+
+    def _emit(self, event):
+        messages = self.messages_for(event)
+        if messages:
+            self.emitter.emit(messages)
+
+
+def synthetic_messages(emitter: DmsEmitter, count: int, tables: list[str]) -> list:
+    messages = []
+    for i in range(count):
+        if i % 10 == 0:
+            emitter.begin()
+        table = tables[i % len(tables)]
+        messages.append(
+            emitter.message(
+                "dms_sample",
+                table,
+                "insert",
+                {"id": i, "name": f"row-{i}", "balance": 1500.0, "bio": "x" * 64},
+            )
+        )
+    return messages
+
+
+def bench(
+    events: int,
+    shards: int,
+    message_format: str,
+    batch: int,
+    decoder_name: str | None = None,
+) -> dict:
+    """Throughput of writing, reading and decoding `events` records in process"""
+    from lib.kinesis_reader import iter_stream_records
+
+    kinesis = LocalKinesis()
+    kinesis.create_stream(StreamName="bench", ShardCount=shards)
+    stream = LocalKinesis.stream_arn("bench")
+    emitter = DmsEmitter(kinesis, stream, message_format)
+    template = synthetic_messages(emitter, batch, ["authors", "accounts", "novels"])
+    encoded = [
+        {"Data": emitter.encode(m), "PartitionKey": _partition_key(m)} for m in template
+    ]
+
+    started = time.perf_counter()
+    for _ in range(events // batch):
+        kinesis.put_records(StreamARN=stream, Records=encoded)
+    put_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    read = sum(1 for _ in iter_stream_records(kinesis, stream))
+    read_seconds = time.perf_counter() - started
+
+    decoder = get_decoder(decoder_name or message_format)
+    started = time.perf_counter()
+    for record in iter_stream_records(kinesis, stream):
+        decoder(record["Data"])
+    decode_seconds = time.perf_counter() - started
+
+    return {
+        "events": read,
+        "shards": shards,
+        "format": message_format,
+        "decoder": decoder_name or message_format,
+        "put_per_sec": round(read / put_seconds),
+        "read_per_sec": round(read / read_seconds),
+        "read_decode_per_sec": round(read / decode_seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.simulator")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench_cmd = commands.add_parser("bench")
+    bench_cmd.add_argument("--events", type=int, default=1_000_000)
+    bench_cmd.add_argument("--shards", type=int, default=1)
+    bench_cmd.add_argument("--format", default="json-unformatted")
+    bench_cmd.add_argument("--batch", type=int, default=500)
+    bench_cmd.add_argument("--decoder", help="defaults to the format's decoder")
+    tail_cmd = commands.add_parser("tail")
+    tail_cmd.add_argument("--seconds", type=float)
+    tail_cmd.add_argument("--stream-dir", default="sim-stream")
+    tail_cmd.add_argument("--shards", type=int, default=1)
+    tail_cmd.add_argument("--format", default="json")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        result = bench(args.events, args.shards, args.format, args.batch, args.decoder)
+        print(json.dumps(result))
+        return
+
+    credentials = {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": os.getenv("DB_PORT", "3306"),
+        "username": os.getenv("USERNAME", "admin"),
+        "password": os.getenv("USERPWD", ""),
+        "dbname": os.getenv("DB_NAME", "dms_sample"),
+    }
+    kinesis = LocalKinesis(args.stream_dir)
+    if LocalKinesis.stream_arn("target") not in kinesis.streams:
+        kinesis.create_stream(StreamName="target", ShardCount=args.shards)
+    emitter = DmsEmitter(kinesis, LocalKinesis.stream_arn("target"), args.format)
+    try:
+        emitted = BinlogTailer(credentials, emitter).run(args.seconds)
+    finally:
+        kinesis.close()
+    print(f"emitted {emitted} records to {args.stream_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Background sampler for DMS table and task statistics.
+
+Polls `describe_table_statistics` and `describe_replication_tasks` at a fixed
+cadence while a flow is running and appends one CSV row per table and sample,
+including per-second rates computed against the previous sample.
+"""
+
+import csv
+import threading
+import time
+from collections import Counter
+from typing import Iterator
+
+TABLE_STATS_PAGE_SIZE = 500
+TASKS_PAGE_SIZE = 100
+
+CSV_FIELDS = [
+    "timestamp",
+    "task",
+    "task_status",
+    "full_load_progress",
+    "schema",
+    "table",
+    "table_state",
+    "inserts",
+    "updates",
+    "deletes",
+    "ddls",
+    "full_load_rows",
+    "insert_rate",
+    "update_rate",
+    "delete_rate",
+    "full_load_rows_per_sec",
+]
+
+# Counters from TableStatistics and the rate column derived from each of them
+RATE_FIELDS = {
+    "Inserts": "insert_rate",
+    "Updates": "update_rate",
+    "Deletes": "delete_rate",
+    "FullLoadRows": "full_load_rows_per_sec",
+}
+
+
+def iter_table_statistics(dms_client, task_arn: str) -> Iterator[dict]:
+    marker = None
+    while True:
+        kwargs = {"ReplicationTaskArn": task_arn, "MaxRecords": TABLE_STATS_PAGE_SIZE}
+        if marker:
+            kwargs["Marker"] = marker
+        res = dms_client.describe_table_statistics(**kwargs)
+        yield from res["TableStatistics"]
+        marker = res.get("Marker")
+        if not marker:
+            return
+
+
+def iter_replication_tasks(dms_client, task_arns: list[str]) -> Iterator[dict]:
+    marker = None
+    while True:
+        kwargs = {
+            "Filters": [{"Name": "replication-task-arn", "Values": task_arns}],
+            "WithoutSettings": True,
+            "MaxRecords": TASKS_PAGE_SIZE,
+        }
+        if marker:
+            kwargs["Marker"] = marker
+        res = dms_client.describe_replication_tasks(**kwargs)
+        yield from res["ReplicationTasks"]
+        marker = res.get("Marker")
+        if not marker:
+            return
+
+
+def task_id(task_arn: str) -> str:
+    return task_arn.rsplit(":", 1)[-1]
+
+
+def compute_rates(previous: dict | None, current: dict, elapsed: float) -> dict:
+    """Per-second deltas of the TableStatistics counters between two samples"""
+    rates = {}
+    for counter, rate_field in RATE_FIELDS.items():
+        if previous is None or elapsed <= 0:
+            rates[rate_field] = 0.0
+            continue
+        delta = current.get(counter, 0) - previous.get(counter, 0)
+        # counters reset when a task is restarted, don't report negative rates
+        rates[rate_field] = round(max(delta, 0) / elapsed, 3)
+    return rates
+
+
+class TableStatsSampler:
+    """Sample statistics of `task_arns` every `interval` seconds into `output`.
+
+    Use as a context manager around a flow, or call `start()`/`stop()`.
+    """
+
+    def __init__(
+        self, dms_client, task_arns: list[str], output: str, interval: float = 1.0
+    ):
+        self.dms = dms_client
+        self.task_arns = list(task_arns)
+        self.output = output
+        self.interval = interval
+        self.errors = 0
+        # failed describe calls per task, the others keep being sampled
+        self.task_errors: Counter[str] = Counter()
+        self._last_error: dict[str, str] = {}
+        self._previous: dict[tuple, tuple[float, dict]] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self, writer: csv.DictWriter) -> int:
+        now = time.time()
+        tasks = {
+            t["ReplicationTaskArn"]: t
+            for t in iter_replication_tasks(self.dms, self.task_arns)
+        }
+        rows = 0
+        for task_arn in self.task_arns:
+            try:
+                rows += self._sample_task(
+                    writer, now, task_arn, tasks.get(task_arn, {})
+                )
+            except Exception as error:
+                # e.g. a CDC task not started yet or a deleted task
+                self.errors += 1
+                self.task_errors[task_arn] += 1
+                if self._last_error.get(task_arn) != str(error):
+                    print(f"stats sampler: {task_id(task_arn)}: {error}")
+                self._last_error[task_arn] = str(error)
+            else:
+                self._last_error.pop(task_arn, None)
+        return rows
+
+    def _sample_task(
+        self, writer: csv.DictWriter, now: float, task_arn: str, task: dict
+    ) -> int:
+        task_stats = task.get("ReplicationTaskStats", {})
+        rows = 0
+        for stat in iter_table_statistics(self.dms, task_arn):
+            key = (task_arn, stat["SchemaName"], stat["TableName"])
+            previous_ts, previous = self._previous.get(key, (now, None))
+            writer.writerow(
+                {
+                    "timestamp": round(now, 3),
+                    "task": task_id(task_arn),
+                    "task_status": task.get("Status", ""),
+                    "full_load_progress": task_stats.get("FullLoadProgressPercent", ""),
+                    "schema": stat["SchemaName"],
+                    "table": stat["TableName"],
+                    "table_state": stat.get("TableState", ""),
+                    "inserts": stat.get("Inserts", 0),
+                    "updates": stat.get("Updates", 0),
+                    "deletes": stat.get("Deletes", 0),
+                    "ddls": stat.get("Ddls", 0),
+                    "full_load_rows": stat.get("FullLoadRows", 0),
+                    **compute_rates(previous, stat, now - previous_ts),
+                }
+            )
+            self._previous[key] = (now, stat)
+            rows += 1
+        return rows
+
+    def _run(self):
+        with open(self.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            while True:
+                started = time.monotonic()
+                try:
+                    self.sample(writer)
+                    f.flush()
+                except Exception as error:
+                    # tasks may not be describable yet (e.g. never started)
+                    self.errors += 1
+                    print(f"stats sampler: {error}")
+                remaining = self.interval - (time.monotonic() - started)
+                if self._stop.wait(max(remaining, 0)):
+                    break
+            # take a final sample so the file always ends with the latest counters
+            try:
+                self.sample(writer)
+            except Exception:
+                self.errors += 1
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="dms-stats-sampler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
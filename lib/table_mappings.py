@@ -0,0 +1,331 @@
+"""Selection rules of the replication tasks, compiled for local routing.
+
+The tasks of the stack select their tables with DMS table mappings, whose
+`schema-name` and `table-name` patterns use `%` for any run of characters
+and `_` for a single one. The mappings are defined here, keyed by the stack
+output of their task, so the stack, the consumer and the load tools share
+them without calling AWS. A `TableMatcher` compiles the selection rules of
+a task into literal lookups and one regex and caches every answer, a
+`TaskRouter` gives the tasks owning a table and groups events by task:
+
+    python -m lib.table_mappings check --schema dms_sample
+    python -m lib.table_mappings bench --events 1000000
+"""
+
+import argparse
+import fnmatch
+import itertools
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Iterable
+
+from lib import query as q
+
+# answers kept per matcher before the cache starts over
+CACHE_SIZE = 65536
+
+
+def selection(rule_name: str, schema: str, table: str) -> dict:
+    """Table mappings including the tables of `schema` matching `table`"""
+    return {
+        "rules": [
+            {
+                "rule-type": "selection",
+                "rule-id": "1",
+                "rule-name": rule_name,
+                "object-locator": {"schema-name": schema, "table-name": table},
+                "rule-action": "include",
+            }
+        ]
+    }
+
+
+# tasks sharing a source endpoint, two of them must not select the same table
+TASK_MIGRATION_TYPES = {
+    "cdcTask1": "cdc",
+    "cdcTask2": "cdc",
+    "fullTask1": "full-load",
+    "fullTask2": "full-load",
+}
+
+
+def task_table_mappings(schema: str) -> dict[str, dict]:
+    """Table mappings of the tasks of the stack, by their output key"""
+    return {
+        "cdcTask1": selection("tables-a-to-m", schema, "a%"),
+        "cdcTask2": selection("tables-n-to-z", schema, "novels"),
+        "fullTask1": selection("tables-a-to-m", schema, "a%"),
+        "fullTask2": selection("tables-n-to-z", schema, "novels"),
+    }
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    action: str
+    schema: str
+    table: str
+
+
+def selection_rules(table_mappings: dict) -> list[Rule]:
+    return [
+        Rule(
+            rule["rule-name"],
+            rule["rule-action"],
+            rule["object-locator"]["schema-name"],
+            rule["object-locator"]["table-name"],
+        )
+        for rule in table_mappings["rules"]
+        if rule.get("rule-type") == "selection"
+    ]
+
+
+def is_literal(pattern: str) -> bool:
+    return "%" not in pattern and "_" not in pattern
+
+
+def pattern_regex(pattern: str) -> str:
+    return "".join(
+        ".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern
+    )
+
+
+def _compile(rules: list[Rule]) -> tuple[set, re.Pattern | None]:
+    """Literal `(schema, table)` pairs and one regex for the wildcard rules"""
+    literals = {(r.schema, r.table) for r in rules if is_literal(r.schema + r.table)}
+    patterns = [
+        # the NUL separator can't appear in either name
+        pattern_regex(r.schema) + "\x00" + pattern_regex(r.table)
+        for r in rules
+        if not is_literal(r.schema + r.table)
+    ]
+    regex = (
+        re.compile("|".join(f"(?:{p})" for p in patterns), re.S) if patterns else None
+    )
+    return literals, regex
+
+
+class TableMatcher:
+    """Whether the selection rules of a task select a table.
+
+    A table is selected when an `include` (or `explicit`) rule matches it
+    and no `exclude` rule does. `explicit` rules only match literally.
+    """
+
+    def __init__(self, table_mappings: dict):
+        rules = selection_rules(table_mappings)
+        self.rules = rules
+        self.explicit = {(r.schema, r.table) for r in rules if r.action == "explicit"}
+        self.include = _compile([r for r in rules if r.action == "include"])
+        self.exclude = _compile([r for r in rules if r.action == "exclude"])
+        self._cache: dict[tuple[str, str], bool] = {}
+
+    @staticmethod
+    def _matches(compiled: tuple[set, re.Pattern | None], key: tuple) -> bool:
+        literals, regex = compiled
+        if key in literals:
+            return True
+        return regex is not None and regex.fullmatch("\x00".join(key)) is not None
+
+    def __call__(self, schema: str, table: str) -> bool:
+        key = (schema, table)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        selected = key in self.explicit or (
+            self._matches(self.include, key) and not self._matches(self.exclude, key)
+        )
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = selected
+        return selected
+
+
+class TaskRouter:
+    """The tasks whose table mappings select a table, from their mappings"""
+
+    def __init__(self, mappings: dict[str, dict]):
+        self.matchers = {task: TableMatcher(m) for task, m in mappings.items()}
+        self._cache: dict[tuple[str, str], tuple[str, ...]] = {}
+
+    def tasks(self, schema: str, table: str) -> tuple[str, ...]:
+        key = (schema, table)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        tasks = tuple(
+            task for task, matcher in self.matchers.items() if matcher(schema, table)
+        )
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = tasks
+        return tasks
+
+    def task_tables(self, schema: str, tables: Iterable[str]) -> dict[str, list]:
+        owned = {task: [] for task in self.matchers}
+        for table in tables:
+            for task in self.tasks(schema, table):
+                owned[task].append(table)
+        return owned
+
+    def route(self, events: Iterable[dict]) -> dict[str | None, list[dict]]:
+        """Group decoded events by task, events no task selects under None"""
+        routed: dict[str | None, list[dict]] = {}
+        for event in events:
+            metadata = event.get("metadata", {})
+            tasks = self.tasks(
+                metadata.get("schema-name", ""), metadata.get("table-name", "")
+            )
+            for task in tasks or (None,):
+                routed.setdefault(task, []).append(event)
+        return routed
+
+
+# Overlaps between tasks
+
+
+def common_name(a: str, b: str) -> str | None:
+    """A name both patterns match, None when they don't intersect"""
+    memo = {}
+
+    def walk(i: int, j: int) -> str | None:
+        if (i, j) in memo:
+            return memo[(i, j)]
+        memo[(i, j)] = None
+        name = None
+        if i == len(a) and j == len(b):
+            name = ""
+        # a `%` matching nothing
+        elif i < len(a) and a[i] == "%" and (rest := walk(i + 1, j)) is not None:
+            name = rest
+        elif j < len(b) and b[j] == "%" and (rest := walk(i, j + 1)) is not None:
+            name = rest
+        elif i < len(a) and j < len(b):
+            x, y = a[i], b[j]
+            # `_` is a name character too, the name keeps it where it can
+            if x == "%" and y != "%" and (rest := walk(i, j + 1)) is not None:
+                name = y + rest
+            elif y == "%" and x != "%" and (rest := walk(i + 1, j)) is not None:
+                name = x + rest
+            elif "%" not in (x, y) and (x == y or "_" in (x, y)):
+                if (rest := walk(i + 1, j + 1)) is not None:
+                    name = (y if x == "_" else x) + rest
+        memo[(i, j)] = name
+        return name
+
+    return walk(0, 0)
+
+
+def find_overlaps(
+    mappings: dict[str, dict], tables: Iterable[tuple[str, str]] = ()
+) -> list[tuple[str, str, str, str]]:
+    """`(task, task, schema, table)` for every pair of tasks selecting a table.
+
+    Each pair of include rules is checked for a common schema and table name,
+    and the known `tables` are checked one by one. A common name an exclude
+    rule removes isn't reported, even if another name would overlap.
+    """
+    router = TaskRouter(mappings)
+    candidates = list(tables)
+    for (_, first), (_, second) in itertools.combinations(router.matchers.items(), 2):
+        for a, b in itertools.product(first.rules, second.rules):
+            if "exclude" in (a.action, b.action):
+                continue
+            schema = common_name(a.schema, b.schema)
+            table = common_name(a.table, b.table)
+            if schema is not None and table is not None:
+                candidates.append((schema, table))
+    overlaps = set()
+    for schema, table in candidates:
+        for pair in itertools.combinations(router.tasks(schema, table), 2):
+            overlaps.add((*pair, schema, table))
+    return sorted(overlaps)
+
+
+def check_overlaps(groups: dict[str, dict[str, dict]], schema: str):
+    """Raise when two tasks of a group replicate the same table twice"""
+    messages = [
+        f"{first} and {second} both select {s}.{t} ({group})"
+        for group, mappings in groups.items()
+        for first, second, s, t in find_overlaps(
+            mappings, [(schema, table) for table in q.PRIMARY_KEYS]
+        )
+    ]
+    if messages:
+        raise ValueError("Overlapping table mappings: " + "; ".join(messages))
+
+
+def migration_groups(mappings: dict[str, dict]) -> dict[str, dict[str, dict]]:
+    groups = {}
+    for task, table_mappings in mappings.items():
+        groups.setdefault(TASK_MIGRATION_TYPES[task], {})[task] = table_mappings
+    return groups
+
+
+# Routing throughput
+
+
+def bench(events: int, schema: str) -> dict:
+    mappings = task_table_mappings(schema)
+    tables = [(schema, table) for table in q.PRIMARY_KEYS] + [(schema, "other")]
+    names = [tables[i % len(tables)] for i in range(events)]
+
+    patterns = {
+        task: [
+            (r.schema.replace("%", "*"), r.table.replace("%", "*"))
+            for r in selection_rules(m)
+        ]
+        for task, m in mappings.items()
+    }
+    started = time.perf_counter()
+    for s, t in names:
+        [
+            task
+            for task, rules in patterns.items()
+            if any(
+                fnmatch.fnmatchcase(s, a) and fnmatch.fnmatchcase(t, b)
+                for a, b in rules
+            )
+        ]
+    scanned = time.perf_counter() - started
+
+    router = TaskRouter(mappings)
+    started = time.perf_counter()
+    for s, t in names:
+        router.tasks(s, t)
+    routed = time.perf_counter() - started
+    return {
+        "events": events,
+        "fnmatch_per_sec": round(events / scanned),
+        "router_per_sec": round(events / routed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.table_mappings")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check = commands.add_parser("check")
+    check.add_argument("--schema", default=os.getenv("DB_NAME", "dms_sample"))
+    bench_cmd = commands.add_parser("bench")
+    bench_cmd.add_argument("--schema", default="dms_sample")
+    bench_cmd.add_argument("--events", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        print(bench(args.events, args.schema))
+        return
+
+    mappings = task_table_mappings(args.schema)
+    router = TaskRouter(mappings)
+    for task, tables in router.task_tables(args.schema, q.PRIMARY_KEYS).items():
+        print(f"{task}: {', '.join(tables) or '-'}")
+    check_overlaps(migration_groups(mappings), args.schema)
+    print("no overlapping tasks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Locate the bottleneck of the DMS to Kinesis write path.
+
+When DMS writes more than the shards of the stream accept, Kinesis throttles
+`PutRecords` and DMS retries silently: the only visible effect is lag. The
+probe lines up, per period, the throttled writes of the stream with the CDC
+latencies of a task and the CPU of its replication instance, and tells
+whether the lag comes from the stream, the source or the replication
+instance:
+
+    python -m lib.throttle_probe live --task <task-arn> --stream <stream-arn>
+
+DMS does not return the CDC latencies in `describe_replication_tasks`, they
+are read from the `CDCLatencySource` and `CDCLatencyTarget` CloudWatch
+metrics next to `WriteProvisionedThroughputExceeded` of the stream.
+
+The simulate mode replays the same analysis against `LocalKinesis` with write
+limits, fed by a DMS-like writer that retries rejected records in order:
+
+    python -m lib.throttle_probe simulate --rate 3000 --shards 1 --seconds 10
+"""
+
+import argparse
+import datetime
+import json
+import os
+from collections import Counter
+from dataclasses import asdict, dataclass
+
+# Seconds of CDC latency from which a period counts as lagging
+LATENCY_THRESHOLD = 5.0
+CPU_THRESHOLD = 80.0
+
+
+@dataclass
+class ProbeSample:
+    timestamp: float
+    throttled_records: float = 0
+    incoming_records: float = 0
+    incoming_bytes: float = 0
+    latency_source: float | None = None
+    latency_target: float | None = None
+    cpu: float | None = None
+
+
+def classify(
+    sample: ProbeSample,
+    latency_threshold: float = LATENCY_THRESHOLD,
+    cpu_threshold: float = CPU_THRESHOLD,
+) -> str:
+    """ "stream", "source", "replication-instance" or "none" for one period"""
+    if sample.throttled_records:
+        return "stream"
+    source = sample.latency_source or 0
+    target = sample.latency_target or 0
+    if max(source, target) < latency_threshold:
+        return "none"
+    if sample.cpu is not None and sample.cpu >= cpu_threshold:
+        return "replication-instance"
+    # target latency includes the source latency, the rest is spent in DMS
+    if target - source >= latency_threshold:
+        return "replication-instance"
+    return "source"
+
+
+def report(samples: list[ProbeSample], **thresholds) -> dict:
+    verdicts = [classify(sample, **thresholds) for sample in samples]
+    lagging = Counter(verdict for verdict in verdicts if verdict != "none")
+    return {
+        "periods": len(samples),
+        "verdicts": dict(Counter(verdicts)),
+        "bottleneck": lagging.most_common(1)[0][0] if lagging else "none",
+        "throttled_records": sum(s.throttled_records for s in samples),
+        "max_latency_source": max((s.latency_source or 0 for s in samples), default=0),
+        "max_latency_target": max((s.latency_target or 0 for s in samples), default=0),
+        "samples": [
+            {**asdict(sample), "verdict": verdict}
+            for sample, verdict in zip(samples, verdicts)
+        ],
+    }
+
+
+# Live signals from CloudWatch
+
+
+def task_dimensions(dms_client, task_arn: str) -> dict:
+    task = dms_client.describe_replication_tasks(
+        Filters=[{"Name": "replication-task-arn", "Values": [task_arn]}],
+        WithoutSettings=True,
+    )["ReplicationTasks"][0]
+    instance = dms_client.describe_replication_instances(
+        Filters=[
+            {
+                "Name": "replication-instance-arn",
+                "Values": [task["ReplicationInstanceArn"]],
+            }
+        ]
+    )["ReplicationInstances"][0]
+    return {
+        # the metrics are keyed by the resource id ending the task ARN
+        "ReplicationTaskIdentifier": task_arn.rsplit(":", 1)[-1],
+        "ReplicationInstanceIdentifier": instance["ReplicationInstanceIdentifier"],
+    }
+
+
+def _query(id: str, namespace: str, metric: str, dimensions: dict, stat: str):
+    return {
+        "Id": id,
+        "MetricStat": {
+            "Metric": {
+                "Namespace": namespace,
+                "MetricName": metric,
+                "Dimensions": [{"Name": k, "Value": v} for k, v in dimensions.items()],
+            },
+            "Period": 60,
+            "Stat": stat,
+        },
+    }
+
+
+def fetch_samples(
+    cloudwatch_client,
+    dms_client,
+    task_arn: str,
+    stream: str,
+    start: datetime.datetime,
+    end: datetime.datetime,
+    period: int = 60,
+) -> list[ProbeSample]:
+    task = task_dimensions(dms_client, task_arn)
+    instance = {"ReplicationInstanceIdentifier": task["ReplicationInstanceIdentifier"]}
+    stream_name = {"StreamName": stream.rsplit("/", 1)[-1]}
+    queries = [
+        _query(
+            "throttled_records",
+            "AWS/Kinesis",
+            "WriteProvisionedThroughputExceeded",
+            stream_name,
+            "Sum",
+        ),
+        _query(
+            "incoming_records", "AWS/Kinesis", "IncomingRecords", stream_name, "Sum"
+        ),
+        _query("incoming_bytes", "AWS/Kinesis", "IncomingBytes", stream_name, "Sum"),
+        _query("latency_source", "AWS/DMS", "CDCLatencySource", task, "Average"),
+        _query("latency_target", "AWS/DMS", "CDCLatencyTarget", task, "Average"),
+        _query("cpu", "AWS/DMS", "CPUUtilization", instance, "Average"),
+    ]
+    for query in queries:
+        query["MetricStat"]["Period"] = period
+
+    samples: dict[float, ProbeSample] = {}
+    kwargs = {"MetricDataQueries": queries, "StartTime": start, "EndTime": end}
+    while True:
+        res = cloudwatch_client.get_metric_data(**kwargs)
+        for result in res["MetricDataResults"]:
+            for timestamp, value in zip(result["Timestamps"], result["Values"]):
+                key = timestamp.timestamp()
+                sample = samples.setdefault(key, ProbeSample(key))
+                setattr(sample, result["Id"], value)
+        if not res.get("NextToken"):
+            break
+        kwargs["NextToken"] = res["NextToken"]
+    return [samples[key] for key in sorted(samples)]
+
+
+# Simulation against the local stand-in
+
+
+def simulate(
+    rate: float,
+    shards: int,
+    seconds: float,
+    tables: int = 3,
+    record_bytes: int = 512,
+    tick: float = 0.01,
+) -> list[ProbeSample]:
+    """Per second samples of a writer committing `rate` records per second"""
+    from lib.simulator import LocalKinesis
+
+    now = 0.0
+    kinesis = LocalKinesis(write_limits=True)
+    kinesis.clock = lambda: now
+    kinesis.create_stream(StreamName="probe", ShardCount=shards)
+    stream = LocalKinesis.stream_arn("probe")
+    data = b"x" * record_bytes
+
+    # commit timestamps of the records DMS still has to write, in order
+    backlog: list[tuple[float, str]] = []
+    committed = 0.0
+    # the writer reads the changes as soon as they are committed
+    samples = [
+        ProbeSample(float(second), latency_source=0.0) for second in range(int(seconds))
+    ]
+    while now < seconds:
+        sample = samples[int(now)]
+        committed += rate * tick
+        for i in range(int(committed)):
+            backlog.append((now, f"dms_sample.table_{len(backlog) % tables}"))
+        committed -= int(committed)
+
+        sent = 0
+        while sent < len(backlog):
+            batch = backlog[sent : sent + 500]
+            res = kinesis.put_records(
+                StreamARN=stream,
+                Records=[{"Data": data, "PartitionKey": key} for _, key in batch],
+            )
+            sample.throttled_records += res["FailedRecordCount"]
+            if res["FailedRecordCount"]:
+                # DMS retries the rejected records, keep them in order and drop
+                # the ones the earlier batches of this tick delivered
+                retry = [r for r, o in zip(batch, res["Records"]) if "ErrorCode" in o]
+                sample.incoming_records += len(batch) - len(retry)
+                sample.incoming_bytes += (len(batch) - len(retry)) * record_bytes
+                backlog = retry + backlog[sent + len(batch) :]
+                break
+            sample.incoming_records += len(batch)
+            sample.incoming_bytes += len(batch) * record_bytes
+            sent += len(batch)
+        else:
+            backlog = []
+        if backlog:
+            lag = now - backlog[0][0]
+            sample.latency_target = max(sample.latency_target or 0, lag)
+        now += tick
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.throttle_probe")
+    commands = parser.add_subparsers(dest="command", required=True)
+    live = commands.add_parser("live")
+    live.add_argument("--task", required=True, help="replication task ARN")
+    live.add_argument("--stream", required=True, help="Kinesis stream ARN")
+    live.add_argument("--minutes", type=float, default=30)
+    live.add_argument("--period", type=int, default=60)
+    sim = commands.add_parser("simulate")
+    sim.add_argument("--rate", type=float, default=3000, help="records per second")
+    sim.add_argument("--shards", type=int, default=1)
+    sim.add_argument("--seconds", type=float, default=10)
+    sim.add_argument("--tables", type=int, default=3)
+    sim.add_argument("--record-bytes", type=int, default=512)
+    for command in (live, sim):
+        command.add_argument("--latency-threshold", type=float, default=5.0)
+        command.add_argument("--samples", action="store_true", help="print periods")
+    args = parser.parse_args()
+
+    if args.command == "live":
+        from boto3 import client
+
+        endpoint_url = os.getenv("ENDPOINT_URL")
+        end = datetime.datetime.now(datetime.timezone.utc)
+        samples = fetch_samples(
+            client("cloudwatch", endpoint_url=endpoint_url),
+            client("dms", endpoint_url=endpoint_url),
+            args.task,
+            args.stream,
+            end - datetime.timedelta(minutes=args.minutes),
+            end,
+            args.period,
+        )
+    else:
+        samples = simulate(
+            args.rate, args.shards, args.seconds, args.tables, args.record_bytes
+        )
+    result = report(samples, latency_threshold=args.latency_threshold)
+    if not args.samples:
+        result.pop("samples")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
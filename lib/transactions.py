@@ -0,0 +1,258 @@
+"""Regroup the CDC records of the target stream into source transactions.
+
+With `include_transaction_details` every DMS record carries its
+`transaction-id` and `transaction-record-id` and points to the record DMS
+wrote before it (`prev-transaction-id`, `prev-transaction-record-id`). The
+first record of a transaction therefore tells the size of the previous one,
+which makes it complete. `TransactionAssembler` buffers records across shards
+until their transaction is complete and its predecessor was emitted, so an
+applier can commit once per source transaction. When several tasks write to
+the stream, `source` maps a record to its task so their transaction ids don't
+mix; a record id seen twice in a transaction is counted in `duplicates` and
+the transaction is released as incomplete:
+
+    assembler = TransactionAssembler(max_buffered=10000)
+    for message in messages:
+        for transaction in assembler.add(message):
+            applier(transaction)
+    for transaction in assembler.flush():
+        applier(transaction)
+
+    python -m lib.transactions --stream <arn> [--since <ts>] [--schema <db>]
+
+The CLI keys the records by the CDC task of the stack whose table mappings
+select their table, `cdcTask1` and `cdcTask2` share the stream.
+"""
+
+import argparse
+import json
+import os
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Hashable, Iterable, Iterator
+
+from lib.decoders import get_decoder
+from lib.table_mappings import TaskRouter, task_table_mappings
+
+# Emitted transaction ids remembered to release their successors
+EMITTED_HISTORY = 10000
+# tasks of the stack writing changes to the stream
+CDC_TASKS = ("cdcTask1", "cdcTask2")
+
+
+@dataclass
+class Transaction:
+    transaction_id: int | None
+    records: list[dict] = field(default_factory=list)
+    # False when released before all its records were seen
+    complete: bool = True
+    source: Hashable = None
+    # records dropped because their transaction-record-id was already buffered
+    duplicates: int = 0
+
+
+@dataclass
+class _Pending:
+    records: dict[int, dict] = field(default_factory=dict)
+    previous: tuple | None = None
+    # number of records, known once the first record of the successor is seen
+    size: int | None = None
+    duplicates: int = 0
+
+
+class TransactionAssembler:
+    """Pending state is keyed by (source, transaction-id)"""
+
+    def __init__(
+        self,
+        max_buffered: int = 10000,
+        source: Callable[[dict], Hashable] | None = None,
+    ):
+        self.max_buffered = max_buffered
+        self.source = source or (lambda message: None)
+        self.pending: OrderedDict[tuple, _Pending] = OrderedDict()
+        self.sizes: dict[tuple, int] = {}
+        self.successors: dict[tuple, tuple] = {}
+        self.emitted: OrderedDict[tuple, None] = OrderedDict()
+        # sources with an emitted transaction
+        self.started: set = set()
+        self.buffered = 0
+        self.max_seen_buffered = 0
+        self.duplicates = 0
+
+    def add(self, message: dict) -> list[Transaction]:
+        metadata = message.get("metadata", {})
+        transaction_id = metadata.get("transaction-id")
+        if transaction_id is None:
+            # full load and control records are not part of a transaction
+            return [Transaction(None, [message])]
+        source = self.source(message)
+        key = (source, transaction_id)
+        if key in self.emitted:
+            # straggler of a transaction released early by the buffer bound
+            return [Transaction(transaction_id, [message], False, source)]
+
+        pending = self.pending.setdefault(key, _Pending())
+        record_id = metadata.get("transaction-record-id", len(pending.records) + 1)
+        if record_id in pending.records:
+            # another writer of the stream uses the same ids, keep the first
+            pending.duplicates += 1
+            self.duplicates += 1
+        else:
+            pending.records[record_id] = message
+            self.buffered += 1
+            self.max_seen_buffered = max(self.max_seen_buffered, self.buffered)
+
+        released = []
+        previous = metadata.get("prev-transaction-id")
+        if previous is not None and previous != transaction_id:
+            # first record of the transaction, closes the previous one
+            pending.previous = (source, previous)
+            self.successors[pending.previous] = key
+            self._set_size(pending.previous, metadata.get("prev-transaction-record-id"))
+            released.extend(self._release(pending.previous))
+        released.extend(self._release(key))
+        while self.buffered > self.max_buffered:
+            released.extend(self._evict())
+        return released
+
+    def _set_size(self, key: tuple, size: int | None):
+        if size is None:
+            return
+        if key in self.pending:
+            self.pending[key].size = size
+        elif key not in self.emitted:
+            self.sizes[key] = size
+
+    def _ready(self, key: tuple) -> bool:
+        pending = self.pending.get(key)
+        if pending is None:
+            return False
+        if pending.size is None:
+            pending.size = self.sizes.pop(key, None)
+        if pending.size is None or len(pending.records) < pending.size:
+            return False
+        if pending.previous is None or pending.previous in self.emitted:
+            return True
+        # the start of the read: the predecessor was never seen
+        started = pending.previous[0] in self.started
+        return not started and pending.previous not in self.pending
+
+    def _release(self, key: tuple | None) -> list[Transaction]:
+        released = []
+        while key is not None and self._ready(key):
+            released.append(self._emit(key, complete=True))
+            key = self.successors.pop(key, None)
+        return released
+
+    def _emit(self, key: tuple, complete: bool) -> Transaction:
+        pending = self.pending.pop(key)
+        self.buffered -= len(pending.records)
+        self.emitted[key] = None
+        if len(self.emitted) > EMITTED_HISTORY:
+            self.emitted.popitem(last=False)
+        records = [pending.records[r] for r in sorted(pending.records)]
+        source, transaction_id = key
+        self.started.add(source)
+        return Transaction(
+            transaction_id,
+            records,
+            complete and not pending.duplicates,
+            source,
+            pending.duplicates,
+        )
+
+    def _evict(self) -> list[Transaction]:
+        # oldest buffered transaction first, then whatever it unblocks
+        key = next(iter(self.pending))
+        pending = self.pending[key]
+        complete = pending.size is not None and len(pending.records) >= pending.size
+        released = [self._emit(key, complete)]
+        successor = self.successors.pop(key, None)
+        if successor is not None:
+            released.extend(self._release(successor))
+        return released
+
+    def flush(self) -> list[Transaction]:
+        """Release everything buffered, e.g. the last transaction of the stream"""
+        released = []
+        while self.pending:
+            released.extend(self._evict())
+        return released
+
+
+def assemble(
+    messages: Iterable[dict],
+    max_buffered: int = 10000,
+    source: Callable[[dict], Hashable] | None = None,
+) -> Iterator[Transaction]:
+    assembler = TransactionAssembler(max_buffered, source)
+    for message in messages:
+        yield from assembler.add(message)
+    yield from assembler.flush()
+
+
+def task_source(schema: str) -> Callable[[dict], str | None]:
+    """The CDC task selecting the table of a record, None for other tables"""
+    mappings = task_table_mappings(schema)
+    router = TaskRouter({task: mappings[task] for task in CDC_TASKS})
+
+    def source(message: dict) -> str | None:
+        metadata = message.get("metadata", {})
+        tasks = router.tasks(
+            metadata.get("schema-name", ""), metadata.get("table-name", "")
+        )
+        return tasks[0] if tasks else None
+
+    return source
+
+
+def summarize(transactions: Iterable[Transaction]) -> dict:
+    sizes = Counter()
+    incomplete = 0
+    duplicates = 0
+    records = 0
+    count = 0
+    for transaction in transactions:
+        if transaction.transaction_id is None:
+            continue
+        count += 1
+        records += len(transaction.records)
+        sizes[len(transaction.records)] += 1
+        incomplete += not transaction.complete
+        duplicates += transaction.duplicates
+    return {
+        "transactions": count,
+        "records": records,
+        "avg_records": round(records / count, 2) if count else 0,
+        "incomplete": incomplete,
+        "duplicates": duplicates,
+        "sizes": dict(sorted(sizes.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m lib.transactions")
+    parser.add_argument("--stream", required=True, help="Kinesis stream ARN")
+    parser.add_argument("--since", type=float, help="only records after epoch")
+    parser.add_argument("--format", default=os.getenv("MESSAGE_FORMAT", "json"))
+    parser.add_argument("--max-buffered", type=int, default=10000)
+    parser.add_argument("--schema", default=os.getenv("DB_NAME", "dms_sample"))
+    args = parser.parse_args()
+
+    from boto3 import client
+
+    from lib.kinesis_reader import iter_stream_records
+
+    kinesis = client("kinesis", endpoint_url=os.getenv("ENDPOINT_URL"))
+    decoder = get_decoder(args.format)
+    messages = (
+        decoder(record["Data"])
+        for record in iter_stream_records(kinesis, args.stream, args.since)
+    )
+    transactions = assemble(messages, args.max_buffered, task_source(args.schema))
+    print(json.dumps(summarize(transactions), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,212 +1,40 @@
-import json
+import contextlib
 import os
 import time
 from pprint import pprint
 from time import sleep
-from typing import Callable, TypedDict, TypeVar
-
-import pymysql.cursors
-from boto3 import client
 
+from dms_sample.runtime import (
+    CfnOutput,
+    describe_table_statistics,
+    get_cfn_output,
+    get_client,
+    get_credentials,
+    get_query_result,
+    run_queries_on_mysql,
+    start_task,
+    start_type,
+    stop_task,
+    wait_for_kinesis,
+    wait_for_task_status,
+)
+from dms_sample.runtime.journal import Journal
+from dms_sample.runtime.verify import FullLoadVerifier
 from lib import query as q
+from lib.binlog_sampler import BinlogSampler
+from lib.stats_sampler import TableStatsSampler
+from lib.table_mappings import TaskRouter, task_table_mappings
 
-STACK_NAME = os.getenv("STACK_NAME", "")
-
-ENDPOINT_URL = os.getenv("ENDPOINT_URL")
-
-cfn = client("cloudformation", endpoint_url=ENDPOINT_URL)
-dms = client("dms", endpoint_url=ENDPOINT_URL)
-kinesis = client("kinesis", endpoint_url=ENDPOINT_URL)
-secretsmanager = client("secretsmanager", endpoint_url=ENDPOINT_URL)
-
-
-retries = 100 if not ENDPOINT_URL else 10
-retry_sleep = 5 if not ENDPOINT_URL else 1
-
-
-class CfnOutput(TypedDict):
-    cdcTaskSecret: str
-    cdcTask1: str
-    cdcTask2: str
-
-    fullTaskSecret: str
-    fullTask1: str
-    fullTask2: str
-
-    kinesisStream: str
-
-
-class Credentials(TypedDict):
-    host: str
-    port: int
-    username: str
-    password: str
-    dbname: str
-
-
-def get_cfn_output():
-    stacks = cfn.describe_stacks()["Stacks"]
-    stack = None
-    for s in stacks:
-        if s["StackName"] == STACK_NAME:
-            stack = s
-            break
-    if not stack:
-        raise Exception(f"Stack {STACK_NAME} Not found")
-
-    outputs = stack["Outputs"]
-    cfn_output = CfnOutput()
-    for output in outputs:
-        cfn_output[output["OutputKey"]] = output["OutputValue"]
-    return cfn_output
-
-
-def get_credentials(secret_arn: str) -> Credentials:
-    secret_value = secretsmanager.get_secret_value(SecretId=secret_arn)
-    credentials = Credentials(**json.loads(secret_value["SecretString"]))
-    if credentials["host"] == "mariadb_server":
-        credentials["host"] = "localhost"
-    return credentials
-
-
-T = TypeVar("T")
-
-
-def retry(
-    function: Callable[..., T], retries=retries, sleep=retry_sleep, **kwargs
-) -> T:
-    raise_error = None
-    retries = int(retries)
-    for i in range(0, retries + 1):
-        try:
-            return function(**kwargs)
-        except Exception as error:
-            raise_error = error
-            time.sleep(sleep)
-    raise raise_error
-
-
-def run_queries_on_mysql(
-    credentials: Credentials,
-    queries: list[str],
-):
-    cursor = None
-    cnx = None
-    try:
-        cnx = pymysql.connect(
-            user=credentials["username"],
-            password=credentials["password"],
-            host=credentials["host"],
-            database=credentials["dbname"],
-            cursorclass=pymysql.cursors.DictCursor,
-            port=int(credentials["port"]),
-        )
-        cursor = cnx.cursor()
-        for query in queries:
-            cursor.execute(query)
-        cnx.commit()
-    finally:
-        if cursor:
-            cursor.close()
-        if cnx:
-            cnx.close()
-
-
-def get_query_result(
-    credentials: Credentials,
-    query: str,
-):
-    cursor = None
-    cnx = None
-    try:
-        cnx = pymysql.connect(
-            user=credentials["username"],
-            password=credentials["password"],
-            host=credentials["host"],
-            database=credentials["dbname"],
-            cursorclass=pymysql.cursors.DictCursor,
-            port=int(credentials["port"]),
-        )
-        cursor = cnx.cursor()
-        cursor.execute(query)
-        return cursor.fetchall()
-    finally:
-        if cursor:
-            cursor.close()
-        if cnx:
-            cnx.close()
-
-
-def start_task(task: str):
-    response = dms.start_replication_task(
-        ReplicationTaskArn=task, StartReplicationTaskType="start-replication"
-    )
-    status = response["ReplicationTask"].get("Status")
-    print(f"Replication Task {task} status: {status}")
-
-
-def stop_task(task: str):
-    response = dms.stop_replication_task(ReplicationTaskArn=task)
-    status = response["ReplicationTask"].get("Status")
-    print(f"\n Replication Task {task} status: {status}")
+# When set, table statistics are sampled in the background into this CSV file
+STATS_SAMPLE_FILE = os.getenv("STATS_SAMPLE_FILE", "")
+STATS_SAMPLE_INTERVAL = float(os.getenv("STATS_SAMPLE_INTERVAL", "1"))
+# When set, the binlog growth of the CDC source is sampled into this CSV file
+BINLOG_SAMPLE_FILE = os.getenv("BINLOG_SAMPLE_FILE", "")
+BINLOG_SAMPLE_INTERVAL = float(os.getenv("BINLOG_SAMPLE_INTERVAL", "5"))
 
-
-def wait_for_task_status(task: str, expected_status: str):
-    print(f"Waiting for task status {expected_status}")
-
-    def _wait_for_status():
-        status = dms.describe_replication_tasks(
-            Filters=[{"Name": "replication-task-arn", "Values": [task]}],
-            WithoutSettings=True,
-        )["ReplicationTasks"][0].get("Status")
-        print(f"{task=} {status=}")
-        assert status == expected_status
-
-    retry(_wait_for_status)
-
-
-def wait_for_kinesis(stream: str, expected_count: int, threshold_timestamp: int):
-    print("\n\tKinesis events\n")
-    print("fetching Kinesis event")
-
-    shard_id = kinesis.describe_stream(StreamARN=stream)["StreamDescription"]["Shards"][
-        0
-    ]["ShardId"]
-    shard_iterator = kinesis.get_shard_iterator(
-        StreamARN=stream,
-        ShardId=shard_id,
-        ShardIteratorType="TRIM_HORIZON",
-    )
-    shard_iter = shard_iterator["ShardIterator"]
-    all_records = []
-    while shard_iter is not None:
-        res = kinesis.get_records(ShardIterator=shard_iter, Limit=50)
-        shard_iter = res["NextShardIterator"]
-        records = res["Records"]
-        for r in records:
-            if r["ApproximateArrivalTimestamp"].timestamp() > threshold_timestamp:
-                all_records.append(r)
-        if len(all_records) >= expected_count:
-            break
-        print(f"found {len(all_records)}, {expected_count=}")
-        sleep(retry_sleep)
-    print(f"Received: {len(all_records)} events")
-    pprint(
-        [
-            {**json.loads(record["Data"]), "partition_key": record["PartitionKey"]}
-            for record in all_records
-        ]
-    )
-
-
-def describe_table_statistics(task_arn: str):
-    res = dms.describe_table_statistics(
-        ReplicationTaskArn=task_arn,
-    )
-    res["TableStatistics"] = sorted(
-        res["TableStatistics"], key=lambda x: (x["SchemaName"], x["TableName"])
-    )
-    return res
+# When set, the full load flow is verified row by row and journaled in this
+# SQLite file, a rerun after a failure resumes where it stopped
+FULL_LOAD_JOURNAL = os.getenv("FULL_LOAD_JOURNAL", "")
 
 
 def execute_full_load(cfn_output: CfnOutput):
@@ -268,6 +96,55 @@ def execute_full_load(cfn_output: CfnOutput):
     run_queries_on_mysql(credentials, q.DROP_TABLES)
 
 
+def execute_full_load_resumable(cfn_output: CfnOutput, journal_path: str):
+    credentials = get_credentials(cfn_output["fullTaskSecret"])
+    stream = cfn_output["kinesisStream"]
+    mappings = task_table_mappings(credentials["dbname"])
+    router = TaskRouter({key: mappings[key] for key in ("fullTask1", "fullTask2")})
+    tasks = router.task_tables(credentials["dbname"], q.PRIMARY_KEYS)
+
+    print("*" * 12)
+    print("STARTING RESUMABLE FULL LOAD FLOW")
+    print("*" * 12)
+    print(f"journal: {journal_path}\n")
+    with Journal(journal_path) as journal:
+        verifier = FullLoadVerifier(journal, credentials, stream, q.PRIMARY_KEYS)
+        started = verifier.step("started", lambda: {"timestamp": time.time()})
+
+        def seed():
+            print("\tCleaning tables")
+            run_queries_on_mysql(credentials, q.DROP_TABLES)
+            print("\tCreating tables")
+            run_queries_on_mysql(credentials, q.CREATE_TABLES)
+            print("\tInserting data")
+            run_queries_on_mysql(credentials, q.PRESEED_DATA)
+
+        verifier.step("seeded", seed)
+        for key, tables in tasks.items():
+
+            def run_task(task=cfn_output[key]):
+                # a rerun after a failure restarts a task that already ran
+                start_task(task, start_type(task, "full-load"))
+                wait_for_task_status(task, "stopped")
+
+            verifier.step(f"{key}:stopped", run_task)
+            verifier.step(
+                f"{key}:verified",
+                lambda tables=tables: verifier.verify(tables, started["timestamp"]),
+            )
+            print(f"\n****{key} verified****\n")
+
+        print("\n****Table Statistics****\n")
+        for key in tasks:
+            print(f"\tTable Statistics {key}")
+            pprint(describe_table_statistics(cfn_output[key]))
+
+        verifier.step(
+            "cleaned", lambda: run_queries_on_mysql(credentials, q.DROP_TABLES)
+        )
+    print(f"\tFull load verified, remove {journal_path} to run it again")
+
+
 def execute_cdc(cfn_output: CfnOutput):
     # CDC Flow
     credentials = get_credentials(cfn_output["cdcTaskSecret"])
@@ -329,8 +206,36 @@ def execute_cdc(cfn_output: CfnOutput):
     run_queries_on_mysql(credentials, q.DROP_TABLES)
 
 
+def stats_sampler(cfn_output: CfnOutput):
+    if not STATS_SAMPLE_FILE:
+        return contextlib.nullcontext()
+    tasks = [
+        cfn_output["fullTask1"],
+        cfn_output["fullTask2"],
+        cfn_output["cdcTask1"],
+        cfn_output["cdcTask2"],
+    ]
+    return TableStatsSampler(
+        get_client("dms"), tasks, STATS_SAMPLE_FILE, STATS_SAMPLE_INTERVAL
+    )
+
+
+def binlog_sampler(cfn_output: CfnOutput):
+    if not BINLOG_SAMPLE_FILE:
+        return contextlib.nullcontext()
+    return BinlogSampler(
+        get_credentials(cfn_output["cdcTaskSecret"]),
+        BINLOG_SAMPLE_FILE,
+        BINLOG_SAMPLE_INTERVAL,
+    )
+
+
 if __name__ == "__main__":
     cfn_output = get_cfn_output()
 
-    execute_full_load(cfn_output)
-    execute_cdc(cfn_output)
+    with stats_sampler(cfn_output), binlog_sampler(cfn_output):
+        if FULL_LOAD_JOURNAL:
+            execute_full_load_resumable(cfn_output, FULL_LOAD_JOURNAL)
+        else:
+            execute_full_load(cfn_output)
+        execute_cdc(cfn_output)
@@ -0,0 +1,61 @@
+import json
+
+from lib import before_image
+
+
+def update(row_id: int, before: dict, after: dict) -> dict:
+    return {
+        "data": {"id": row_id, **after},
+        "before-image": {"id": row_id, **before},
+        "metadata": {
+            "operation": "update",
+            "record-type": "data",
+            "schema-name": "dms_sample",
+            "table-name": "accounts",
+        },
+    }
+
+
+UPDATES = [
+    update(
+        1, {"name": "Alice", "bio": "x" * 100}, {"name": "Alicia", "bio": "x" * 100}
+    ),
+    update(2, {"name": "Bob", "bio": "y"}, {"name": "Bob", "bio": "z"}),
+    update(3, {"name": "Carol", "bio": ""}, {"name": "Carol", "bio": ""}),
+]
+
+
+def test_diff_table_and_change_sets():
+    columns, masks = before_image.diff_table(UPDATES)
+    assert columns == ["bio", "id", "name"]
+    assert before_image.change_sets(columns, masks) == [("name",), ("bio",), ()]
+
+
+def test_pk_only_before_image_is_never_a_change():
+    pk_only = [{**UPDATES[0], "before-image": {"id": 1}}]
+    columns, masks = before_image.diff_table(pk_only)
+    assert before_image.change_sets(columns, masks) == [()]
+
+
+def test_analyze_frequency_and_overhead():
+    insert = {"data": {"id": 4}, "metadata": {"operation": "insert"}}
+    raw = [json.dumps(m).encode() for m in UPDATES + [insert]]
+    accounts = before_image.analyze(raw)["dms_sample.accounts"]
+
+    assert accounts["updates"] == 3
+    assert accounts["noop_updates"] == 1
+    assert accounts["unknown_updates"] == 0
+    assert accounts["column_change_frequency"]["name"] == round(1 / 3, 3)
+    assert accounts["column_change_frequency"]["id"] == 0
+    costs = accounts["before_image"]
+    assert costs["pk-only"]["avg_bytes"] < costs["non-lob"]["avg_bytes"]
+    assert costs["non-lob"]["avg_bytes"] < costs["all"]["avg_bytes"]
+    assert costs["all"]["saved_vs_all_percent"] == 0
+
+
+def test_pk_only_before_images_are_not_counted_as_noop():
+    pk_only = [{**m, "before-image": {"id": m["data"]["id"]}} for m in UPDATES]
+    raw = [json.dumps(m).encode() for m in pk_only]
+    accounts = before_image.analyze(raw)["dms_sample.accounts"]
+    assert accounts["noop_updates"] == 0
+    assert accounts["unknown_updates"] == 3
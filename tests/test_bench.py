@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from dms_sample import bench
+from dms_sample.bench import Scenario, insert_statements, load_scenario, percentiles
+from dms_sample.runtime import config
+from dms_sample.runtime.bench import using
+from lib.simulator import LocalKinesis
+
+SCENARIOS = os.path.join(os.path.dirname(__file__), "..", "scenarios")
+
+
+def test_scenario_files_load():
+    smoke = load_scenario(os.path.join(SCENARIOS, "smoke.yaml"))
+    assert smoke.cdc.tables == {"authors": 1, "accounts": 1, "novels": 1}
+    steady = load_scenario(os.path.join(SCENARIOS, "accounts-steady.json"))
+    assert steady.full_load.rows == {"accounts": 20000}
+    assert steady.timeout == 600
+
+
+def test_scenario_rejects_unknown_settings_and_tables():
+    with pytest.raises(ValueError, match="rows_per_sec"):
+        Scenario.from_dict({"name": "x", "cdc": {"tasks": [], "rows_per_sec": 1}})
+    with pytest.raises(ValueError, match="orders"):
+        Scenario.from_dict(
+            {"name": "x", "full_load": {"tasks": [], "rows": {"orders": 1}}}
+        )
+
+
+def test_insert_statements_batch_rows():
+    statements = insert_statements("accounts", 0, 5, 2, 3)
+    assert len(statements) == 3
+    assert statements[0].count("'account-") == 2
+    assert "'account-4'" in statements[-1] and "'ttt'" in statements[-1]
+
+
+def test_percentiles():
+    result = percentiles([float(i) for i in range(1, 101)])
+    assert result == {"p50": 50.0, "p90": 90.0, "p99": 99.0, "max": 100.0}
+    assert percentiles([3.0])["p50"] == 3.0
+    assert percentiles([]) == {}
+
+
+def test_lob_matrix_scenario():
+    lob_modes = load_scenario(os.path.join(SCENARIOS, "lob-modes.yaml"))
+    assert lob_modes.lob.modes == ["none", "limited", "full"]
+    assert lob_modes.lob.max_size_kb == 32
+    with pytest.raises(ValueError, match="65535 bytes"):
+        Scenario.from_dict({"name": "x", "lob": {"modes": [], "sizes": [1 << 20]}})
+
+
+def test_insert_statements_generate_blobs():
+    assert "REPEAT('b', 2048)" in insert_statements("accounts", 0, 1, 1, 3, 2048)[0]
+    assert "NULL, 'red'" in insert_statements("accounts", 0, 1, 1, 3)[0]
+
+
+def test_cdc_run_fails_when_the_inserts_fail(monkeypatch):
+    def run_queries(credentials, queries):
+        if queries[0].startswith("INSERT"):
+            raise ConnectionError("lost connection")
+
+    for name, function in {
+        "get_credentials": lambda arn: {"dbname": "dms_sample"},
+        "run_queries_on_mysql": run_queries,
+        "start_type": lambda task, migration_type: "start-replication",
+        "start_task": lambda task, start_type: None,
+        "wait_for_task_status": lambda task, status: None,
+    }.items():
+        monkeypatch.setattr(bench.runtime, name, function)
+    monkeypatch.setattr(config, "RETRY_SLEEP", 0)
+    kinesis = LocalKinesis()
+    kinesis.create_stream(StreamName="bench", ShardCount=1)
+    scenario = Scenario.from_dict(
+        {"name": "x", "cdc": {"tasks": ["cdcTask1"], "rate": 100, "duration": 1}}
+    )
+    cfn_output = {
+        "cdcTaskSecret": "secret",
+        "cdcTask1": "task",
+        "kinesisStream": kinesis.stream_arn("bench"),
+    }
+    with using("kinesis", kinesis), pytest.raises(ConnectionError):
+        bench.run_cdc(scenario, cfn_output)
@@ -0,0 +1,110 @@
+import csv
+import io
+
+import pymysql
+
+from lib import binlog_sampler
+from lib.binlog_sampler import CSV_FIELDS, BinlogSampler
+
+
+class FakeSource:
+    """Answers the sampler statements from the attributes of the instance"""
+
+    def __init__(self):
+        self.logs = {"mysql-bin.000001": 1000}
+        self.tables = {
+            "novels": {"table_rows": 10, "data_length": 1000, "avg_row_length": 100},
+            "authors": {"table_rows": 5, "data_length": 250, "avg_row_length": 50},
+        }
+        self.statements = []
+
+    def __call__(self, credentials, query, params=None):
+        self.statements.append((query, params))
+        if query == "SHOW BINARY LOGS":
+            return [{"Log_name": n, "File_size": s} for n, s in self.logs.items()]
+        if query == "SHOW MASTER STATUS":
+            name = max(self.logs)
+            return [{"File": name, "Position": self.logs[name]}]
+        if query == binlog_sampler.TABLE_STATISTICS_QUERY:
+            raise pymysql.err.OperationalError(1109, "Unknown table")
+        return [{"name": name, **table} for name, table in self.tables.items()]
+
+
+def test_binlog_growth_across_a_rotation():
+    previous = {"mysql-bin.000001": 1000}
+    current = {"mysql-bin.000001": 1500, "mysql-bin.000002": 300}
+    assert binlog_sampler.binlog_growth(previous, current) == 800
+    # purged files don't count as shrinking
+    assert binlog_sampler.binlog_growth(current, {"mysql-bin.000002": 400}) == 100
+
+
+def test_attribution_by_changed_row_bytes():
+    previous = {
+        "a": {"table_rows": 10, "data_length": 0, "avg_row_length": 100},
+        "b": {"rows_changed": 100},
+    }
+    current = {
+        "a": {"table_rows": 20, "data_length": 0, "avg_row_length": 100},
+        "b": {"rows_changed": 130},
+        "new": {"table_rows": 5, "data_length": 0, "avg_row_length": 10},
+    }
+    weights = binlog_sampler.table_weights(previous, current)
+    assert weights == {"a": 10, "b": 30}
+    shares = binlog_sampler.attribute(4000, weights, {"a": 100, "b": 100})
+    assert shares == {"a": 1000, "b": 3000}
+    assert binlog_sampler.attribute(500, {"a": 0}, {}) == {"(unattributed)": 500}
+
+
+def test_sample_writes_a_row_per_table(monkeypatch):
+    source = FakeSource()
+    sampler = BinlogSampler({"dbname": "dms_sample"}, "unused.csv", query=source)
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+    clock = iter([100.0, 102.0])
+    monkeypatch.setattr(binlog_sampler.time, "time", lambda: next(clock))
+
+    assert sampler.sample(writer) == 0
+    source.logs = {"mysql-bin.000001": 1600, "mysql-bin.000002": 400}
+    source.tables["novels"]["table_rows"] = 20
+    assert sampler.sample(writer) == 3
+
+    rows = {
+        row["table"]: row
+        for row in csv.DictReader(io.StringIO(out.getvalue()), CSV_FIELDS)
+    }
+    assert rows["*"]["binlog_bytes_per_sec"] == "500.0"
+    assert rows["*"]["binlog_file"] == "mysql-bin.000002"
+    assert rows["novels"]["binlog_bytes_per_sec"] == "500.0"
+    assert rows["novels"]["rows_changed_per_sec"] == "5.0"
+    assert rows["authors"]["binlog_bytes_per_sec"] == "0.0"
+    # the schema is bound, and the missing userstat plugin isn't queried again
+    statistics = [
+        params
+        for query, params in source.statements
+        if query == binlog_sampler.TABLE_STATISTICS_QUERY
+    ]
+    assert statistics == [("dms_sample",)]
+
+
+def test_compare_with_the_stream(tmp_path):
+    path = tmp_path / "binlog.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for timestamp, rate in ((10, 100), (20, 300)):
+            for table in ("*", "novels"):
+                writer.writerow(
+                    {
+                        "timestamp": timestamp,
+                        "table": table,
+                        "binlog_bytes_per_sec": rate,
+                    }
+                )
+    source, span = binlog_sampler.binlog_rates(str(path))
+    assert (source, span) == ({"*": 200, "novels": 200}, 10)
+
+    data = b'{"data": {}, "metadata": {"table-name": "novels"}}'
+    stream = binlog_sampler.stream_rates([{"Data": data}] * 40, span)
+    result = binlog_sampler.compare(source, stream)
+    assert result["novels"]["stream_bytes_per_sec"] == round(40 * len(data) / 10, 1)
+    assert result["*"]["amplification"] == round(4 * len(data) / 200, 2)
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from lib import capture
+from lib.kinesis_reader import iter_stream_records
+from lib.simulator import (
+    DmsEmitter,
+    InvalidArgumentException,
+    LocalKinesis,
+    synthetic_messages,
+)
+
+
+def test_replay_serves_the_captured_records(tmp_path, monkeypatch):
+    # small blocks so records of a shard span several blocks
+    monkeypatch.setattr(capture, "BLOCK_RECORDS", 7)
+    kinesis = LocalKinesis()
+    kinesis.create_stream(StreamName="target", ShardCount=3)
+    stream = LocalKinesis.stream_arn("target")
+    emitter = DmsEmitter(kinesis, stream)
+    emitter.emit(synthetic_messages(emitter, 200, ["authors", "accounts", "novels"]))
+
+    assert capture.record_stream(kinesis, stream, str(tmp_path)) == 200
+
+    def key(record):
+        return record["ShardId"], record["SequenceNumber"], record["Data"]
+
+    with capture.ReplayKinesis(str(tmp_path)) as replay:
+        assert [key(r) for r in iter_stream_records(replay, stream)] == [
+            key(r) for r in iter_stream_records(kinesis, stream)
+        ]
+    assert replay._maps == []
+
+
+def test_replay_seeks_after_sequence_number(tmp_path):
+    kinesis = LocalKinesis()
+    kinesis.create_stream(StreamName="target", ShardCount=1)
+    stream = LocalKinesis.stream_arn("target")
+    for i in range(10):
+        kinesis.put_record(StreamARN=stream, Data=f"{i}", PartitionKey="k")
+    capture.record_stream(kinesis, stream, str(tmp_path))
+
+    with capture.ReplayKinesis(str(tmp_path)) as replay:
+        shard_id = replay.shards[0]["ShardId"]
+        iterator = replay.get_shard_iterator(
+            ShardId=shard_id,
+            ShardIteratorType="AFTER_SEQUENCE_NUMBER",
+            StartingSequenceNumber="5",
+        )["ShardIterator"]
+        records = replay.get_records(ShardIterator=iterator, Limit=2)["Records"]
+    assert [r["Data"] for r in records] == [b"5", b"6"]
+
+
+def record_seconds(tmp_path) -> str:
+    """A capture of 10 records arriving a second apart"""
+    kinesis = LocalKinesis()
+    kinesis.create_stream(StreamName="target", ShardCount=1)
+    stream = LocalKinesis.stream_arn("target")
+    for i in range(10):
+        kinesis.clock = lambda: 1000.0 + i
+        kinesis.put_record(StreamARN=stream, Data=f"{i}", PartitionKey="k")
+    capture.record_stream(kinesis, stream, str(tmp_path))
+    return str(tmp_path)
+
+
+def test_replay_seeks_to_a_timestamp_and_rejects_unknown_sequence_numbers(tmp_path):
+    with capture.ReplayKinesis(record_seconds(tmp_path), speed=2.0) as replay:
+        shard_id = replay.shards[0]["ShardId"]
+        replay.started = 50.0
+        # the replay runs twice as fast, record 6 arrives 3 seconds in
+        iterator = replay.get_shard_iterator(
+            ShardId=shard_id, ShardIteratorType="AT_TIMESTAMP", Timestamp=53.0
+        )["ShardIterator"]
+        records = replay.get_records(ShardIterator=iterator, Limit=2)["Records"]
+        assert [r["Data"] for r in records] == [b"6", b"7"]
+
+        for unknown in ("12345", "-1", "not-a-number"):
+            with pytest.raises(InvalidArgumentException):
+                replay.get_shard_iterator(
+                    ShardId=shard_id,
+                    ShardIteratorType="AT_SEQUENCE_NUMBER",
+                    StartingSequenceNumber=unknown,
+                )
+
+
+def test_paced_replay_hands_out_the_records_that_are_due(tmp_path):
+    with capture.ReplayKinesis(record_seconds(tmp_path), pace="original") as replay:
+        replay.started = time.time() - 3.5
+        iterator = replay.get_shard_iterator(
+            ShardId=replay.shards[0]["ShardId"], ShardIteratorType="TRIM_HORIZON"
+        )["ShardIterator"]
+        res = replay.get_records(ShardIterator=iterator)
+    assert [r["Data"] for r in res["Records"]] == [b"0", b"1", b"2", b"3"]
+    assert res["MillisBehindLatest"] == 5000
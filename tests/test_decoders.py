@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from lib import decoders
+
+
+def test_every_message_format_has_a_decoder():
+    message = {"data": {"id": 1}, "metadata": {"operation": "insert"}}
+    for message_format in decoders.MESSAGE_FORMATS:
+        decoder = decoders.get_decoder(message_format)
+        assert decoder(json.dumps(message, indent=4).encode()) == message
+        assert decoder(json.dumps(message, separators=(",", ":"))) == message
+
+
+def test_unknown_format_and_registered_decoders(monkeypatch):
+    with pytest.raises(ValueError, match="No decoder for message format 'avro'"):
+        decoders.get_decoder("avro")
+    monkeypatch.setattr(decoders, "_decoders", dict(decoders._decoders))
+    decoders.register_decoder("avro", lambda raw: {"raw": raw})
+    assert "avro" in decoders.available_decoders()
+    assert decoders.get_decoder("avro")(b"x") == {"raw": b"x"}
+
+
+def test_decode_record_adds_the_partition_key():
+    record = {"Data": b'{"data": {"id": 1}}', "PartitionKey": "dms_sample.novels"}
+    assert decoders.decode_record(record) == {
+        "data": {"id": 1},
+        "partition_key": "dms_sample.novels",
+    }
+
+
+def test_json_formats_use_orjson_when_installed():
+    orjson = pytest.importorskip("orjson")
+    for message_format in decoders.MESSAGE_FORMATS:
+        assert decoders.get_decoder(message_format) is orjson.loads
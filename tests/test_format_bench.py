@@ -0,0 +1,61 @@
+import json
+import sys
+import time
+
+import pytest
+
+from lib import format_bench
+from lib.decoders import get_decoder
+from lib.kinesis_reader import StreamCursor
+from lib.simulator import LocalKinesis
+
+
+def test_formats_differ_in_size_not_content():
+    message = format_bench.make_accounts_message(1, 16, 300)
+    pretty = format_bench.encode(message, "json")
+    compact = format_bench.encode(message, "json-unformatted")
+    assert len(compact) < len(pretty)
+    assert json.loads(pretty) == json.loads(compact)
+
+
+def test_offline_run_covers_every_format_and_size():
+    results = format_bench.run_offline(rows=5, bio_size=8, blob_sizes=[0, 1024])
+    pairs = {(r["format"], r["blob_size"]) for r in results}
+    assert pairs == {
+        (message_format, size)
+        for message_format in ("json", "json-unformatted")
+        for size in (0, 1024)
+    }
+    assert all(r["bytes_per_record"] > 0 and r["decode_us"] > 0 for r in results)
+
+
+def test_blob_sizes_above_the_column_are_rejected(monkeypatch):
+    monkeypatch.setattr(
+        sys, "argv", ["format_bench", "--rows", "1", "--blob-sizes", "0,65536"]
+    )
+    with pytest.raises(SystemExit):
+        format_bench.main()
+
+
+def test_collect_inserts_reads_each_record_once():
+    kinesis = LocalKinesis()
+    kinesis.create_stream(StreamName="test", ShardCount=2)
+    stream = kinesis.stream_arn("test")
+    started = time.time() - 1
+    cursor = StreamCursor(kinesis, stream, started)
+    messages = [format_bench.make_accounts_message(i, 8, 0) for i in range(3)]
+    messages[1]["metadata"]["table-name"] = "novels"
+    for i, message in enumerate(messages):
+        kinesis.put_record(
+            StreamARN=stream,
+            Data=format_bench.encode(message, "json"),
+            PartitionKey=str(i),
+        )
+
+    received, total_bytes, _, decoded, _ = format_bench.collect_inserts(
+        cursor, get_decoder("json"), 2, started, timeout=5
+    )
+    assert (received, decoded) == (2, 3)
+    assert total_bytes == sum(
+        len(format_bench.encode(messages[i], "json")) for i in (0, 2)
+    )
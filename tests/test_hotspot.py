@@ -0,0 +1,53 @@
+import hashlib
+
+import pytest
+
+from lib import hotspot
+
+
+def test_even_shards_cover_the_hash_key_space():
+    shards = hotspot.even_shards(3)
+    assert shards[0]["HashKeyRange"]["StartingHashKey"] == "0"
+    assert shards[-1]["HashKeyRange"]["EndingHashKey"] == str(hotspot.MAX_HASH_KEY)
+    for previous, shard in zip(shards, shards[1:]):
+        assert int(shard["HashKeyRange"]["StartingHashKey"]) == (
+            int(previous["HashKeyRange"]["EndingHashKey"]) + 1
+        )
+
+
+def test_shard_map_uses_md5_of_the_partition_key():
+    shard_map = hotspot.ShardMap(hotspot.even_shards(2))
+    key = "dms_sample.novels"
+    md5 = int(hashlib.md5(key.encode()).hexdigest(), 16)
+    expected = 0 if md5 < 2**127 else 1
+    assert shard_map.shard_for(key) == f"shardId-{expected:012d}"
+
+
+def test_shard_map_ignores_closed_shards():
+    closed = {
+        **hotspot.even_shards(1)[0],
+        "ShardId": "shardId-closed",
+        "SequenceNumberRange": {
+            "StartingSequenceNumber": "1",
+            "EndingSequenceNumber": "2",
+        },
+    }
+    shard_map = hotspot.ShardMap([closed, *hotspot.even_shards(2)])
+    assert "shardId-closed" not in shard_map.shard_ids
+
+    with pytest.raises(ValueError):
+        hotspot.ShardMap([]).shard_for("dms_sample.novels")
+
+
+def test_report_flags_a_table_saturating_its_shard():
+    report = hotspot.HotspotReport(hotspot.ShardMap(hotspot.even_shards(4)), window=1)
+    for i in range(2000):
+        report.add("dms_sample.novels", 1024, i / 1000)
+    report.add("dms_sample.authors", 1024, 0.5)
+    summary = report.summary()
+
+    assert summary["skew"]["records"] > 3
+    assert summary["hot_keys"][0]["partition_key"] == "dms_sample.novels"
+    assert summary["hot_keys"][0]["share_of_shard"] >= 0.99
+    assert len(summary["recommendations"]) == 1
+    assert len(summary["windows"]) == 2
@@ -0,0 +1,141 @@
+import json
+import re
+
+import pytest
+
+import run
+from dms_sample.runtime import retry, tasks, verify
+from dms_sample.runtime.bench import using
+from dms_sample.runtime.journal import Journal
+from lib.simulator import LocalKinesis
+
+SOURCE = {"accounts": list(range(1, 26))}
+
+
+def fake_query(credentials, query):
+    table = re.search(r"FROM (\w+)", query).group(1)
+    keys = SOURCE[table]
+    if query.startswith("SELECT MIN"):
+        return [{"low": min(keys), "high": max(keys)}]
+    low, high = map(int, re.findall(r"[<>]=? (\d+)", query))
+    return [{"id": pk} for pk in keys if low <= pk < high]
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    monkeypatch.setattr(verify, "get_query_result", fake_query)
+    kinesis = LocalKinesis()
+    kinesis.create_stream(StreamName="journal", ShardCount=2)
+    with using("kinesis", kinesis):
+        yield kinesis, kinesis.stream_arn("journal")
+
+
+def put_loads(kinesis, stream, keys):
+    for pk in keys:
+        message = {
+            "data": {"id": pk},
+            "metadata": {"operation": "load", "table-name": "accounts"},
+        }
+        kinesis.put_record(
+            StreamARN=stream, Data=json.dumps(message), PartitionKey=str(pk)
+        )
+
+
+def test_verification_resumes_from_the_journal(tmp_path, stream, capsys):
+    kinesis, arn = stream
+    path = str(tmp_path / "journal.sqlite")
+    put_loads(kinesis, arn, range(1, 21))
+
+    with Journal(path) as journal:
+        verifier = verify.FullLoadVerifier(
+            journal, {}, arn, {"accounts": ("id",)}, range_size=10
+        )
+        with pytest.raises(Exception, match="missing keys"):
+            verifier.verify(["accounts"], 0, retries=0)
+        # 0-9 and 10-19 are complete, 20-29 misses 20 to 25
+        assert journal.verified("accounts") == {0, 10}
+
+    put_loads(kinesis, arn, range(21, 26))
+    read = []
+    get_records = kinesis.get_records
+
+    def counting_get_records(**kwargs):
+        res = get_records(**kwargs)
+        read.extend(res["Records"])
+        return res
+
+    kinesis.get_records = counting_get_records
+
+    with Journal(path) as journal:
+        verifier = verify.FullLoadVerifier(
+            journal, {}, arn, {"accounts": ("id",)}, range_size=10
+        )
+        verifier.verify(["accounts"], 0, retries=0)
+        assert journal.verified("accounts") == {0, 10, 20}
+        assert journal.seen_keys("accounts", 0, 100) == set(range(1, 26))
+    # only the records after the checkpoints were read again
+    assert len(read) == 5
+
+
+def test_steps_run_once(tmp_path):
+    path = str(tmp_path / "journal.sqlite")
+    runs = []
+    with Journal(path) as journal:
+        verifier = verify.FullLoadVerifier(journal, {}, "stream", {})
+        assert verifier.step("seeded", lambda: runs.append(1) or {"rows": 3}) == {
+            "rows": 3
+        }
+    with Journal(path) as journal:
+        verifier = verify.FullLoadVerifier(journal, {}, "stream", {})
+        assert verifier.step("seeded", lambda: runs.append(1)) == {"rows": 3}
+    assert runs == [1]
+
+
+class FakeDms:
+    """Tasks that stop right after they start, or hang in `running`"""
+
+    def __init__(self):
+        self.status = {}
+        self.started = []
+        self.hang = True
+
+    def start_replication_task(self, ReplicationTaskArn, StartReplicationTaskType):
+        self.started.append((ReplicationTaskArn, StartReplicationTaskType))
+        self.status[ReplicationTaskArn] = "running" if self.hang else "stopped"
+        return {"ReplicationTask": {"Status": "starting"}}
+
+    def describe_replication_tasks(self, Filters, WithoutSettings):
+        (task,) = Filters[0]["Values"]
+        return {"ReplicationTasks": [{"Status": self.status.get(task, "ready")}]}
+
+
+def test_resumed_full_load_reloads_a_task_that_already_ran(
+    tmp_path, monkeypatch, capsys
+):
+    path = str(tmp_path / "journal.sqlite")
+    cfn_output = {
+        "fullTaskSecret": "secret",
+        "kinesisStream": "stream",
+        "fullTask1": "task-1",
+        "fullTask2": "task-2",
+    }
+    monkeypatch.setattr(run, "get_credentials", lambda arn: {"dbname": "dms_sample"})
+    monkeypatch.setattr(run, "run_queries_on_mysql", lambda credentials, q: None)
+    monkeypatch.setattr(run, "describe_table_statistics", lambda task: {})
+    monkeypatch.setattr(verify.FullLoadVerifier, "verify", lambda *args: None)
+    # the waiter gives up at once instead of retrying
+    monkeypatch.setattr(
+        tasks, "retry", lambda function: retry(function, retries=0, sleep=0)
+    )
+    dms = FakeDms()
+    with using("dms", dms):
+        with pytest.raises(AssertionError):
+            run.execute_full_load_resumable(cfn_output, path)
+        dms.hang = False
+        run.execute_full_load_resumable(cfn_output, path)
+
+    assert dms.started == [
+        ("task-1", "start-replication"),
+        ("task-1", "reload-target"),
+        ("task-2", "start-replication"),
+    ]
@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+from lib.kinesis_efo import EnhancedFanOutReader, read_with_efo
+
+
+def client_error(code: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+class BlockingEventStream:
+    """A subscription that delivers nothing until it's closed"""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        self.closed.wait()
+        raise ConnectionError("stream closed")
+
+    def close(self):
+        self.closed.set()
+
+
+class StubKinesis:
+    def __init__(self, register_error=None, list_error=None):
+        self.register_error = register_error
+        self.list_error = list_error
+        self.deregistered = []
+        self.event_streams = []
+
+    def register_stream_consumer(self, StreamARN, ConsumerName):
+        if self.register_error:
+            raise self.register_error
+        return {"Consumer": {"ConsumerARN": "consumer", "ConsumerStatus": "ACTIVE"}}
+
+    def deregister_stream_consumer(self, ConsumerARN):
+        self.deregistered.append(ConsumerARN)
+
+    def list_shards(self, StreamARN):
+        if self.list_error:
+            raise self.list_error
+        return {"Shards": [{"ShardId": "shard-0"}, {"ShardId": "shard-1"}]}
+
+    def subscribe_to_shard(self, **kwargs):
+        self.event_streams.append(BlockingEventStream())
+        return {"EventStream": self.event_streams[-1]}
+
+
+def test_unsupported_endpoints_fall_back_to_polling(capsys):
+    error = client_error("UnknownOperationException", "RegisterStreamConsumer")
+    assert read_with_efo(StubKinesis(error), "stream", 1, 0) is None
+    assert "falling back to polling" in capsys.readouterr().out
+
+
+def test_service_errors_are_raised():
+    error = client_error("InternalFailure", "RegisterStreamConsumer")
+    with pytest.raises(ClientError, match="InternalFailure"):
+        read_with_efo(StubKinesis(error), "stream", 1, 0)
+
+
+def test_failed_start_deregisters_the_consumer():
+    kinesis = StubKinesis(list_error=client_error("LimitExceeded", "ListShards"))
+    with pytest.raises(ClientError):
+        EnhancedFanOutReader(kinesis, "stream").start()
+    assert kinesis.deregistered == ["consumer"]
+
+
+def test_close_stops_the_subscribers():
+    kinesis = StubKinesis()
+    with EnhancedFanOutReader(kinesis, "stream") as reader:
+        threads = list(reader._threads)
+        while len(reader._event_streams) < 2:
+            assert reader.poll(0.01) == []
+    assert not any(thread.is_alive() for thread in threads)
+    assert all(stream.closed.is_set() for stream in kinesis.event_streams)
+    assert kinesis.deregistered == ["consumer"]
@@ -0,0 +1,53 @@
+from dms_sample.lint import StackConfig, Workload, estimate_record_bytes, evaluate
+
+VERBOSE = {"control_details", "partition_value", "transaction_details"}
+
+
+def sample_config(**overrides) -> StackConfig:
+    config = StackConfig(
+        instance=("S/instance", "dms.t2.micro", 5),
+        stream=("S/stream", 1),
+        endpoint=("S/target", "json", VERBOSE),
+        cdc_tasks={"S/cdc-1": {}, "S/cdc-2": {}},
+    )
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    return config
+
+
+def test_sample_workload_fits_the_defaults():
+    assert evaluate(sample_config(), Workload(50, 512)) == []
+
+
+def test_undersized_stack_fails_each_capacity_check():
+    findings = evaluate(sample_config(), Workload(3000, 512))
+    errors = {f.check: f.path for f in findings if f.level == "error"}
+    assert errors == {
+        "stream-shards": "S/stream",
+        "instance-cpu": "S/instance",
+        "parallel-apply": "S/cdc-1",
+    }
+    warnings = {f.check for f in findings if f.level == "warning"}
+    assert warnings == {"verbose-records", "instance-storage"}
+
+
+def test_parallel_apply_and_sizing_fix_it():
+    config = sample_config(
+        instance=("S/instance", "dms.c5.xlarge", 50),
+        stream=("S/stream", 8),
+        endpoint=("S/target", "json-unformatted", set()),
+        cdc_tasks={
+            "S/cdc-1": {"TargetMetadata": {"ParallelApplyThreads": 4}},
+            "S/cdc-2": {"TargetMetadata": {"ParallelApplyThreads": 4}},
+        },
+    )
+    assert evaluate(config, Workload(3000, 512)) == []
+    # close to a limit only warns
+    findings = evaluate(config, Workload(3500, 512))
+    assert [(f.level, f.check) for f in findings] == [("warning", "parallel-apply")]
+
+
+def test_record_estimate_grows_with_the_verbose_settings():
+    compact = estimate_record_bytes(512, "json-unformatted", set())
+    assert 512 < compact < estimate_record_bytes(512, "json-unformatted", VERBOSE)
+    assert estimate_record_bytes(512, "json", set()) > compact
@@ -0,0 +1,92 @@
+import base64
+import io
+import json
+
+import pytest
+
+from lib import lobs
+from lib.format_bench import make_accounts_message
+from lib.query import LOB_COLUMN_MAX_SIZE
+
+
+class RecordingCursor:
+    lastrowid = 7
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, query, args=None):
+        self.executed.append((query, args))
+
+
+def test_insert_row_binds_each_lob_once():
+    cursor = RecordingCursor()
+    blob = bytes(range(256)) * 10
+    row_id = lobs.insert_row(
+        cursor,
+        "accounts",
+        {"name": "lob", "bio": "short", "profile_picture": memoryview(blob)},
+    )
+
+    assert row_id == 7
+    [(insert, values)] = cursor.executed
+    assert insert.startswith("INSERT INTO accounts (name, bio, profile_picture)")
+    assert values == ["lob", "short", blob]
+
+
+def test_insert_row_reads_files_once_and_checks_the_column_size():
+    cursor = RecordingCursor()
+    lobs.insert_row(cursor, "accounts", {"profile_picture": io.BytesIO(b"x" * 10)})
+    assert cursor.executed[0][1] == [b"x" * 10]
+
+    too_large = b"x" * (LOB_COLUMN_MAX_SIZE + 1)
+    with pytest.raises(ValueError, match="at most 65535 bytes"):
+        lobs.insert_row(cursor, "accounts", {"profile_picture": too_large})
+    assert len(cursor.executed) == 1
+
+
+def test_insert_row_measures_text_in_utf8_bytes():
+    cursor = RecordingCursor()
+    # fewer characters than the limit, but two bytes each
+    bio = "é" * (LOB_COLUMN_MAX_SIZE // 2 + 1)
+    with pytest.raises(ValueError, match=f"got {len(bio) * 2}"):
+        lobs.insert_row(cursor, "accounts", {"bio": bio})
+    lobs.insert_row(cursor, "accounts", {"bio": "é" * (LOB_COLUMN_MAX_SIZE // 2)})
+    assert len(cursor.executed) == 1
+
+
+def test_split_lobs_in_both_message_formats():
+    message = make_accounts_message(1, 16, 300)
+    message["data"]["bio"] = 'quoted "bio" \\ with escapes'
+    message["before-image"] = {"profile_picture": message["data"]["profile_picture"]}
+    blob = base64.b64decode(message["data"]["profile_picture"])
+
+    for raw in (json.dumps(message).encode(), json.dumps(message, indent=4).encode()):
+        decoded, values = lobs.split_lobs(raw, ("bio", "profile_picture"))
+
+        assert decoded["data"]["profile_picture"] is None
+        assert decoded["data"]["bio"] is None
+        assert decoded["data"]["name"] == "account-1"
+        assert len(values["profile_picture"]) == 2
+        assert lobs.decode_binary(values["profile_picture"][0]) == blob
+        assert lobs.decoded_size(values["profile_picture"][1]) == len(blob)
+        assert lobs.decode_text(values["bio"][0]) == message["data"]["bio"]
+
+
+def test_decoded_size_handles_padding():
+    for size in (0, 1, 2, 3, 1000):
+        encoded = memoryview(base64.b64encode(b"x" * size))
+        assert lobs.decoded_size(encoded) == size
+
+
+def test_report_sizes_per_column():
+    raw = [
+        json.dumps(make_accounts_message(i, 100, size)).encode()
+        for i, size in enumerate((1000, 20000))
+    ]
+    summary = lobs.report(raw)["dms_sample.accounts"]
+
+    assert summary["profile_picture"]["values"] == 2
+    assert summary["profile_picture"]["max_bytes"] == 20000
+    assert summary["profile_picture"]["buckets"] == {"<=1KB": 1, "<=128KB": 1}
+    assert summary["bio"]["avg_bytes"] == 100
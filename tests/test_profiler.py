@@ -0,0 +1,60 @@
+import json
+import time
+
+from dms_sample.runtime import config, consumer, profiler
+from dms_sample.runtime.bench import using
+from lib.simulator import LocalKinesis
+
+
+def test_stages_record_self_time_and_sampled_allocations():
+    stages = profiler.StageProfiler(sample_every=2)
+    kept = []
+    for _ in range(3):
+        with stages.stage("outer"):
+            with stages.stage("inner"):
+                time.sleep(0.01)
+                kept.append(bytearray(100_000))
+
+    assert stages.calls == {"outer": 3, "outer;inner": 3}
+    # the inner sleeps aren't counted twice
+    assert stages.wall["outer;inner"] >= 0.03
+    assert stages.wall["outer"] < stages.wall["outer;inner"]
+    # runs 1 and 3 are sampled
+    assert stages.sampled["outer;inner"] == 2
+    inner = {
+        stack: size
+        for stack, size in stages.allocations.items()
+        if stack.startswith("outer;inner;")
+    }
+    assert sum(inner.values()) >= 2 * 100_000
+    assert any("test_profiler.py" in stack for stack in inner)
+
+
+def test_wait_for_kinesis_dumps_collapsed_stacks(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(config, "CONSUMER_PROFILE", str(tmp_path))
+    monkeypatch.setattr(config, "CONSUMER_PROFILE_SAMPLE", 1)
+    monkeypatch.setattr(profiler, "_profiler", None)
+    kinesis = LocalKinesis()
+    kinesis.create_stream(StreamName="test", ShardCount=1)
+    stream = kinesis.stream_arn("test")
+    threshold = time.time() - 1
+    for i in range(3):
+        kinesis.put_record(
+            StreamARN=stream, Data=json.dumps({"id": i}).encode(), PartitionKey="a"
+        )
+
+    with using("kinesis", kinesis):
+        events = consumer.wait_for_kinesis(stream, 3, threshold)
+
+    assert len(events) == 3
+    lines = (tmp_path / "consumer.time.collapsed").read_text().splitlines()
+    assert {line.rsplit(" ", 1)[0] for line in lines} == {
+        "fetch",
+        "filter",
+        "decode",
+        "sink",
+    }
+    assert all(int(line.rsplit(" ", 1)[1]) >= 0 for line in lines)
+    summary = json.loads((tmp_path / "consumer.summary.json").read_text())
+    assert summary["decode"]["calls"] == 1
+    monkeypatch.setattr(profiler, "_profiler", None)
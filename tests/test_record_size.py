@@ -0,0 +1,77 @@
+import json
+
+from lib import record_size
+
+INSERT_RECORD = {
+    "data": {
+        "id": 1,
+        "name": "Alice",
+        "bio": "Bio of Alice",
+        "profile_picture": None,
+    },
+    "metadata": {
+        "timestamp": "2024-05-02T10:00:00.000000Z",
+        "record-type": "data",
+        "operation": "insert",
+        "partition-key-type": "schema-table",
+        "partition-key-value": "dms_sample.accounts",
+        "schema-name": "dms_sample",
+        "table-name": "accounts",
+        "transaction-id": 12884901888,
+        "transaction-record-id": 1,
+    },
+}
+
+ALTER_RECORD = {
+    "control": {"table-def": {"columns": {"email": {"type": "STRING"}}}},
+    "metadata": {
+        "timestamp": "2024-05-02T10:00:01.000000Z",
+        "record-type": "control",
+        "operation": "column-type-change",
+        "partition-key-type": "task-id",
+        "schema-name": "dms_sample",
+        "table-name": "authors",
+    },
+}
+
+
+def test_breakdown_matches_compact_size():
+    sizes = record_size.breakdown(INSERT_RECORD)
+    # one trailing comma per field is counted, the outer braces are not
+    assert sum(sizes.values()) == record_size.compact_size(INSERT_RECORD) + 1
+    assert sizes["data.name"] == len('"name":"Alice",')
+
+
+def test_analyze_splits_payload_envelope_and_formatting():
+    formatted = json.dumps(INSERT_RECORD, indent=4).encode()
+    result = record_size.analyze([(formatted, 1.0), (formatted, 2.0)], None)
+    accounts = result["tables"]["dms_sample.accounts"]
+
+    assert result["records"] == 2
+    assert accounts["avg_bytes"] == len(formatted)
+    assert accounts["avg_formatting_bytes"] == len(formatted) - len(
+        json.dumps(INSERT_RECORD, separators=(",", ":"))
+    )
+    assert (
+        accounts["avg_payload_bytes"]
+        + accounts["avg_envelope_bytes"]
+        + accounts["avg_formatting_bytes"]
+        == accounts["avg_bytes"]
+    )
+
+
+def test_project_shards_uses_the_tighter_limit():
+    # record count bound: 2500 small records need 3 shards
+    assert record_size.project_shards(100, 2500)["write_shards"] == 3
+    # byte bound: 500 records of 10 KB need 5 shards
+    assert record_size.project_shards(10 * 1024, 500)["write_shards"] == 5
+
+
+def test_estimate_flag_costs():
+    raw = [json.dumps(INSERT_RECORD).encode(), json.dumps(ALTER_RECORD).encode()]
+    costs = record_size.estimate_flag_costs(raw)["flags"]
+
+    assert costs["include_table_alter_operations"]["records"] == 1
+    assert costs["include_null_and_empty"]["bytes"] == len('"profile_picture":null,')
+    assert costs["include_transaction_details"]["bytes"] > 0
+    assert costs["before_image"]["bytes"] == 0
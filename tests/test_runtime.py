@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import pytest
+
+from dms_sample.runtime import aio, clients, consumer, db, outputs
+from dms_sample.runtime.bench import FakeDms, FakeSecrets, using
+from lib.simulator import LocalKinesis
+
+CREDENTIALS = {
+    "host": "localhost",
+    "port": 3306,
+    "username": "admin",
+    "password": "secret",
+    "dbname": "dms_sample",
+}
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.pings = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = db.ConnectionPool(max_idle=1)
+    monkeypatch.setattr(pool, "_connect", lambda credentials: FakeConnection())
+    return pool
+
+
+def test_pool_reuses_connections_per_credentials(pool):
+    with pool.connection(CREDENTIALS) as first:
+        pass
+    with pool.connection(CREDENTIALS) as second:
+        with pool.connection(CREDENTIALS) as third:
+            pass
+    assert second is first and second.pings == 1
+    # only one idle connection is kept, the one released last is closed
+    assert third is not first and not third.closed and first.closed
+
+    with pool.connection({**CREDENTIALS, "dbname": "other"}) as other:
+        pass
+    assert other is not first
+
+
+def test_pool_discards_connection_on_error(pool):
+    with pytest.raises(RuntimeError):
+        with pool.connection(CREDENTIALS) as broken:
+            raise RuntimeError()
+    with pool.connection(CREDENTIALS) as cnx:
+        pass
+    assert broken.closed and cnx is not broken
+
+
+def test_credentials_are_fetched_once_and_copied():
+    with using("secretsmanager", FakeSecrets()) as fake:
+        first = outputs.get_credentials("test-secret")
+        first["dbname"] = "changed"
+        second = outputs.get_credentials("test-secret")
+    outputs._secrets.pop("test-secret")
+
+    assert fake.calls == 1
+    assert second["dbname"] == "dms_sample"
+    assert second["host"] == "localhost"
+
+
+def test_poll_kinesis_skips_older_records_on_all_shards(capsys):
+    kinesis = LocalKinesis()
+    kinesis.create_stream(StreamName="test", ShardCount=2)
+    stream = kinesis.stream_arn("test")
+    kinesis.put_record(StreamARN=stream, Data=b"old", PartitionKey="a")
+    time.sleep(0.01)
+    threshold = time.time()
+    for key in "abcdef":
+        kinesis.put_record(StreamARN=stream, Data=b"new", PartitionKey=key)
+
+    with using("kinesis", kinesis):
+        records = consumer.poll_kinesis(stream, 6, threshold)
+
+    assert [r["Data"] for r in records] == [b"new"] * 6
+    assert {r["ShardId"] for r in records} == set(kinesis.streams[stream])
+    assert "kinesis" not in clients._clients
+
+
+def test_async_waiters_run_concurrently(capsys):
+    async def wait_all():
+        await asyncio.gather(
+            *(aio.wait_for_task_status(f"task-{i}", "running") for i in range(8))
+        )
+
+    with using("dms", FakeDms(latency=0.05)):
+        started = time.perf_counter()
+        asyncio.run(wait_all())
+        elapsed = time.perf_counter() - started
+
+    assert elapsed < 8 * 0.05
+
+
+def test_async_waiter_raises_after_retries(capsys):
+    with using("dms", FakeDms()):
+        with pytest.raises(AssertionError):
+            asyncio.run(aio.wait_for_task_status("task", "stopped", 1, 0))
+
+
+class FakeAsyncPool:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+def test_async_pools_are_created_once_per_event_loop(monkeypatch):
+    created = []
+
+    async def create_pool(credentials):
+        await asyncio.sleep(0.01)
+        created.append(FakeAsyncPool())
+        return created[-1]
+
+    monkeypatch.setattr(aio, "_create_pool", create_pool)
+
+    async def concurrent_users():
+        first, second = await asyncio.gather(
+            aio._aiomysql_pool(CREDENTIALS), aio._aiomysql_pool(CREDENTIALS)
+        )
+        assert first is second
+        await aio.close()
+
+    asyncio.run(concurrent_users())
+    asyncio.run(concurrent_users())
+    assert len(created) == 2 and all(pool.closed for pool in created)
@@ -0,0 +1,87 @@
+import datetime
+import decimal
+
+from lib.schema_registry import SchemaRegistry
+
+
+def control(operation: str, timestamp: str, columns: dict) -> dict:
+    return {
+        "control": {"table-def": {"columns": columns, "primary-key": ["id"]}},
+        "metadata": {
+            "timestamp": timestamp,
+            "record-type": "control",
+            "operation": operation,
+            "partition-key-type": "task-id",
+            "schema-name": "dms_sample",
+            "table-name": "accounts",
+        },
+    }
+
+
+def data(timestamp: str, row: dict) -> dict:
+    return {
+        "data": row,
+        "metadata": {
+            "timestamp": timestamp,
+            "record-type": "data",
+            "operation": "insert",
+            "schema-name": "dms_sample",
+            "table-name": "accounts",
+        },
+    }
+
+
+CREATE = control(
+    "create-table",
+    "2024-05-02T10:00:00.000000Z",
+    {"id": {"type": "INT4"}, "balance": {"type": "NUMERIC"}, "pic": {"type": "BLOB"}},
+)
+# the column type change arrives first, from another shard
+ALTER = control(
+    "column-type-change",
+    "2024-05-02T10:05:00.000000Z",
+    {"id": {"type": "INT4"}, "balance": {"type": "STRING"}, "pic": {"type": "BLOB"}},
+)
+
+
+def test_decode_against_the_version_of_the_record():
+    registry = SchemaRegistry()
+    assert registry.observe(ALTER) and registry.observe(CREATE)
+    assert [v.operation for v in registry.versions["dms_sample.accounts"]] == [
+        "create-table",
+        "column-type-change",
+    ]
+
+    before = data(
+        "2024-05-02T10:01:00.000000Z", {"id": 1, "balance": 1.5, "pic": "AAE="}
+    )
+    after = data(
+        "2024-05-02T10:06:00.000000Z", {"id": 2, "balance": "1.5", "pic": None}
+    )
+    assert not registry.observe(before)
+    assert registry.decode(before) == {
+        "id": 1,
+        "balance": decimal.Decimal("1.5"),
+        "pic": b"\x00\x01",
+    }
+    assert registry.decode(after) == {"id": 2, "balance": "1.5", "pic": None}
+
+
+def test_decoders_are_compiled_once_per_version():
+    registry = SchemaRegistry()
+    registry.observe(CREATE)
+    schema = registry.schema_at("dms_sample.accounts")
+    assert registry.decoder(schema) is registry.decoder(schema)
+
+
+def test_unknown_table_is_returned_as_is():
+    registry = SchemaRegistry()
+    row = {"birth_date": "1991-05-21"}
+    assert registry.decode(data("2024-05-02T10:00:00Z", row)) is row
+
+
+def test_date_columns():
+    registry = SchemaRegistry()
+    registry.observe(control("create-table", "1", {"d": {"type": "DATE"}}))
+    row = registry.decode(data("2", {"d": "1991-05-21"}))
+    assert row["d"] == datetime.date(1991, 5, 21)
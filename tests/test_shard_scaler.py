@@ -0,0 +1,101 @@
+import json
+
+from lib import shard_scaler
+from lib.shard_scaler import Observation, ScalingPolicy, ShardController
+
+
+def observe(timestamp, shards, records, throttled=0, lag=None):
+    return Observation(timestamp, shards, records, records * 100, throttled, lag)
+
+
+def test_scale_up_needs_consecutive_hot_periods():
+    controller = ShardController(ScalingPolicy(up_periods=2))
+    assert controller.decide(observe(0, 1, 900)) is None
+    # a quiet period resets the count
+    assert controller.decide(observe(60, 1, 100)) is None
+    assert controller.decide(observe(120, 1, 900)) is None
+    action = controller.decide(observe(180, 1, 900))
+    assert (action.shards, action.target, action.reason) == (1, 2, "utilization")
+
+
+def test_throttling_doubles_within_the_limits_and_cooldown():
+    policy = ScalingPolicy(up_periods=1, up_cooldown=300, max_shards=6)
+    controller = ShardController(policy)
+    assert controller.decide(observe(0, 2, 1800, throttled=50)).target == 4
+    # cooling down
+    assert controller.decide(observe(60, 4, 4000, throttled=50)) is None
+    assert controller.decide(observe(300, 4, 4000, throttled=50)).target == 6
+
+
+def test_throttling_below_saturation_adds_a_shard():
+    controller = ShardController(ScalingPolicy(up_periods=1))
+    assert controller.decide(observe(0, 4, 1000, throttled=50)).target == 5
+
+
+def test_scale_down_halves_at_most_after_idle_periods():
+    controller = ShardController(ScalingPolicy(down_periods=3, min_shards=2))
+    for timestamp in (0, 60):
+        assert controller.decide(observe(timestamp, 8, 10)) is None
+    action = controller.decide(observe(120, 8, 10))
+    assert (action.target, action.reason) == (4, "idle")
+
+    controller = ShardController(ScalingPolicy(down_periods=1, min_shards=2))
+    assert controller.decide(observe(0, 3, 10)).target == 2
+    # lagging periods never count as idle
+    controller = ShardController(ScalingPolicy(down_periods=1, up_periods=5))
+    assert controller.decide(observe(0, 4, 10, lag=60)) is None
+
+
+def test_daily_action_budget():
+    policy = ScalingPolicy(up_periods=1, up_cooldown=0, max_actions_per_day=2)
+    controller = ShardController(policy)
+    assert controller.decide(observe(0, 1, 1000, throttled=1))
+    assert controller.decide(observe(60, 2, 2000, throttled=1))
+    assert controller.decide(observe(120, 4, 4000, throttled=1)) is None
+    assert controller.decide(observe(86400, 4, 4000, throttled=1))
+
+
+def test_simulation_scales_with_a_burst():
+    profile = [
+        {"timestamp": t, "records": 3000 if 600 <= t < 1800 else 200, "bytes": 0}
+        for t in range(3600)
+    ]
+    policy = ScalingPolicy(up_periods=1, down_periods=3)
+    result = shard_scaler.simulate(profile, policy, shards=1, period=60)
+
+    targets = [action["target"] for action in result["actions"]]
+    assert targets[:2] == [2, 4]
+    # back down once the burst is over, not beyond what the burst needed
+    assert result["actions"][-1]["reason"] == "idle"
+    assert result["max_shards"] < 16
+    assert result["throttled_records"] > 0
+    # without scaling the backlog of the burst is never written
+    fixed = shard_scaler.simulate(profile, ScalingPolicy(max_shards=1), 1, 60)
+    assert fixed["actions"] == []
+    assert result["lag_max"] < fixed["lag_max"]
+
+
+def test_load_profile_from_capture(tmp_path):
+    path = tmp_path / "capture.ndjson"
+    lines = [
+        {"partition_key": "k", "arrival": arrival, "data": "abc"}
+        for arrival in (10.1, 10.5, 12.2)
+    ]
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    profile = shard_scaler.load_profile(str(path))
+    assert [(p["timestamp"], p["records"], p["bytes"]) for p in profile] == [
+        (10.0, 2, 8),
+        (11.0, 0, 0),
+        (12.0, 1, 4),
+    ]
+
+
+def test_cli_policy_flags_take_their_field_type(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "profile.ndjson"
+    path.write_text(json.dumps({"timestamp": 0, "records": 10, "bytes": 0}) + "\n")
+    # float policy fields accept fractions, int ones stay ints
+    argv = ["shard_scaler", "simulate", "--profile", str(path)]
+    argv += ["--up-cooldown", "1.5", "--max-shards", "4"]
+    monkeypatch.setattr("sys.argv", argv)
+    shard_scaler.main()
+    assert json.loads(capsys.readouterr().out)["max_shards"] == 1
@@ -0,0 +1,176 @@
+import json
+import time
+
+from lib import simulator
+from lib.kinesis_reader import iter_stream_records
+from lib.simulator import (
+    BinlogTailer,
+    DmsEmitter,
+    LocalKinesis,
+    ddl_operation,
+    synthetic_messages,
+)
+
+TABLES = ["authors", "accounts", "novels"]
+
+
+def create_stream(kinesis: LocalKinesis, shards: int = 2) -> str:
+    kinesis.create_stream(StreamName="target", ShardCount=shards)
+    return LocalKinesis.stream_arn("target")
+
+
+def test_records_of_a_table_stay_on_one_shard():
+    kinesis = LocalKinesis()
+    stream = create_stream(kinesis)
+    emitter = DmsEmitter(kinesis, stream, "json-unformatted")
+    emitter.emit(synthetic_messages(emitter, 30, TABLES))
+
+    records = list(iter_stream_records(kinesis, stream))
+    assert len(records) == 30
+    shards_per_key = {}
+    for record in records:
+        shards_per_key.setdefault(record["PartitionKey"], set()).add(record["ShardId"])
+        message = json.loads(record["Data"])
+        assert message["metadata"]["partition-key-value"] == record["PartitionKey"]
+    assert all(len(shards) == 1 for shards in shards_per_key.values())
+
+
+def test_shard_iterator_types():
+    kinesis = LocalKinesis()
+    stream = create_stream(kinesis, shards=1)
+    for i in range(5):
+        kinesis.put_record(StreamARN=stream, Data=f"{i}", PartitionKey="k")
+    shard_id = kinesis.list_shards(StreamARN=stream)["Shards"][0]["ShardId"]
+
+    def read(**kwargs):
+        iterator = kinesis.get_shard_iterator(
+            StreamARN=stream, ShardId=shard_id, **kwargs
+        )["ShardIterator"]
+        return [
+            r["Data"] for r in kinesis.get_records(ShardIterator=iterator)["Records"]
+        ]
+
+    assert read(ShardIteratorType="TRIM_HORIZON") == [b"0", b"1", b"2", b"3", b"4"]
+    assert read(ShardIteratorType="LATEST") == []
+    assert read(
+        ShardIteratorType="AFTER_SEQUENCE_NUMBER", StartingSequenceNumber="3"
+    ) == [b"3", b"4"]
+
+
+def test_persisted_stream_is_reloaded(tmp_path):
+    kinesis = LocalKinesis(str(tmp_path))
+    stream = create_stream(kinesis)
+    emitter = DmsEmitter(kinesis, stream)
+    emitter.emit(synthetic_messages(emitter, 10, TABLES))
+    kinesis.close()
+
+    reloaded = LocalKinesis(str(tmp_path))
+    assert [r["Data"] for r in iter_stream_records(reloaded, stream)] == [
+        r["Data"] for r in iter_stream_records(kinesis, stream)
+    ]
+
+
+def test_ddl_operation():
+    assert ddl_operation("DROP TABLE IF EXISTS novels;") == ("drop-table", "novels")
+    assert ddl_operation("ALTER TABLE authors MODIFY COLUMN email VARCHAR(100)") == (
+        "column-type-change",
+        "authors",
+    )
+    assert ddl_operation("INSERT INTO authors VALUES (1)") is None
+
+
+class Event:
+    """Binlog event stand-in, the tailer reads the attributes it needs"""
+
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class MariadbGtidEvent(Event):
+    pass
+
+
+class QueryEvent(Event):
+    pass
+
+
+class XidEvent(Event):
+    pass
+
+
+class WriteRowsEvent(Event):
+    pass
+
+
+def insert(id: int) -> WriteRowsEvent:
+    return WriteRowsEvent(
+        schema="dms_sample", table="novels", rows=[{"values": {"id": id}}]
+    )
+
+
+def transaction_ids(tailer: BinlogTailer, events: list) -> list[tuple]:
+    return [
+        (m["metadata"]["transaction-id"], m["metadata"]["operation"])
+        for event in events
+        for m in tailer.messages_for(event)
+    ]
+
+
+def test_tailed_transactions_start_at_begin_and_end_at_the_commit():
+    tailer = BinlogTailer({}, DmsEmitter(None, "stream"))
+    ddl = QueryEvent(query="CREATE TABLE novels (id INT)", schema=b"dms_sample")
+    events = [
+        # MariaDB: GTID, rows, XID
+        MariadbGtidEvent(),
+        insert(1),
+        insert(2),
+        XidEvent(),
+        # MySQL: BEGIN, rows, XID
+        QueryEvent(query="BEGIN", schema=b"dms_sample"),
+        insert(3),
+        XidEvent(),
+        # DDL without a GTID event, then a GTID event before a DDL
+        ddl,
+        MariadbGtidEvent(),
+        ddl,
+        # non transactional tables end with COMMIT
+        QueryEvent(query="BEGIN", schema=b"dms_sample"),
+        insert(4),
+        QueryEvent(query="COMMIT", schema=b"dms_sample"),
+    ]
+    assert transaction_ids(tailer, events) == [
+        (1, "insert"),
+        (1, "insert"),
+        (2, "insert"),
+        (3, "create-table"),
+        (4, "create-table"),
+        (5, "insert"),
+    ]
+    assert not tailer.in_transaction
+
+
+class IdleReader:
+    """A non-blocking binlog reader on a source without new events"""
+
+    def __init__(self, events: list):
+        self.events = list(events)
+        self.closed = False
+
+    def fetchone(self):
+        return self.events.pop(0) if self.events else None
+
+    def close(self):
+        self.closed = True
+
+
+def test_tail_returns_at_the_deadline_on_an_idle_source(monkeypatch):
+    kinesis = LocalKinesis()
+    tailer = BinlogTailer({}, DmsEmitter(kinesis, create_stream(kinesis)))
+    reader = IdleReader([MariadbGtidEvent(), insert(1), XidEvent()])
+    monkeypatch.setattr(tailer, "_reader", lambda blocking: reader)
+    monkeypatch.setattr(simulator, "TAIL_POLL_SECONDS", 0.01)
+
+    started = time.time()
+    assert tailer.run(seconds=0.1) == 1
+    assert 0.1 <= time.time() - started < 1
+    assert reader.closed
@@ -0,0 +1,62 @@
+import json
+import sqlite3
+
+import pytest
+
+from dms_sample.runtime import sinks
+
+EVENTS = [
+    {
+        "data": {"id": i, "name": f"account-{i}"},
+        "metadata": {
+            "record-type": "data",
+            "operation": "insert",
+            "schema-name": "dms_sample",
+            "table-name": "accounts",
+            "timestamp": "2024-05-02T10:00:00.000000Z",
+            "transaction-id": 100 + i,
+        },
+        "partition_key": "dms_sample.accounts",
+    }
+    for i in range(5)
+]
+
+
+def test_ndjson_sink_appends_batches(tmp_path):
+    path = tmp_path / "events.ndjson"
+    with sinks.open_sink(f"ndjson:{path}") as sink:
+        sink.write(EVENTS[:2])
+        sink.write(EVENTS[2:])
+    assert [json.loads(line) for line in path.read_text().splitlines()] == EVENTS
+
+
+def test_sqlite_sink_flattens_events(tmp_path):
+    path = tmp_path / "events.sqlite"
+    with sinks.open_sink(f"sqlite:{path}") as sink:
+        sink.write(EVENTS)
+    db = sqlite3.connect(path)
+    rows = db.execute(
+        "SELECT table_name, operation, transaction_id, data, before_image "
+        "FROM events ORDER BY transaction_id"
+    ).fetchall()
+    assert db.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert len(rows) == 5
+    assert rows[0] == ("accounts", "insert", 100, '{"id":0,"name":"account-0"}', None)
+
+
+def test_parquet_sink_writes_row_groups(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "events.parquet"
+    with sinks.ParquetSink(str(path), row_group_size=2) as sink:
+        sink.write(EVENTS)
+    parquet = pq.ParquetFile(path)
+    assert parquet.metadata.num_row_groups == 3
+    assert parquet.read().column("transaction_id").to_pylist() == list(range(100, 105))
+
+
+def test_open_sink_rejects_unknown_kinds_and_missing_paths():
+    with pytest.raises(ValueError, match="csv"):
+        sinks.open_sink("csv:events.csv")
+    with pytest.raises(ValueError, match="needs a path"):
+        sinks.open_sink("sqlite")
+    assert isinstance(sinks.open_sink("none"), sinks.NullSink)
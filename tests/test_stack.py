@@ -0,0 +1,13 @@
+import pytest
+
+stack = pytest.importorskip("dms_sample.stack")
+
+
+def test_parse_include_options():
+    assert stack.parse_include_options(" partition_value, transaction_details,") == {
+        "partition_value",
+        "transaction_details",
+    }
+    assert stack.parse_include_options("") == set()
+    with pytest.raises(ValueError, match="Unknown KINESIS_INCLUDE options"):
+        stack.parse_include_options("partition_value,verbose")
@@ -0,0 +1,79 @@
+import csv
+import io
+
+from lib import stats_sampler
+from lib.stats_sampler import CSV_FIELDS, TableStatsSampler, compute_rates
+
+
+class FakeDms:
+    """Pages the statistics of each task, `missing` tasks can't be described"""
+
+    def __init__(self, tables: dict[str, list[str]], page_size: int = 2):
+        self.tables = tables
+        self.page_size = page_size
+        self.missing = set()
+        self.calls = []
+
+    def _page(self, items: list, marker: str | None) -> tuple[list, str | None]:
+        start = int(marker or 0)
+        end = start + self.page_size
+        return items[start:end], str(end) if end < len(items) else None
+
+    def describe_replication_tasks(self, Filters, **kwargs):
+        tasks = [
+            {"ReplicationTaskArn": arn, "Status": "running"}
+            for arn in Filters[0]["Values"]
+            if arn not in self.missing
+        ]
+        page, marker = self._page(tasks, kwargs.get("Marker"))
+        return {"ReplicationTasks": page, **({"Marker": marker} if marker else {})}
+
+    def describe_table_statistics(self, ReplicationTaskArn, **kwargs):
+        self.calls.append((ReplicationTaskArn, kwargs.get("Marker")))
+        if ReplicationTaskArn in self.missing:
+            raise LookupError(f"{ReplicationTaskArn} not found")
+        stats = [
+            {"SchemaName": "dms_sample", "TableName": table, "Inserts": 10}
+            for table in self.tables[ReplicationTaskArn]
+        ]
+        page, marker = self._page(stats, kwargs.get("Marker"))
+        return {"TableStatistics": page, **({"Marker": marker} if marker else {})}
+
+
+def test_compute_rates():
+    previous = {"Inserts": 10, "Updates": 5, "Deletes": 0, "FullLoadRows": 100}
+    current = {"Inserts": 30, "Updates": 2, "Deletes": 4}
+    assert compute_rates(previous, current, 2.0) == {
+        "insert_rate": 10.0,
+        "update_rate": 0.0,
+        "delete_rate": 2.0,
+        "full_load_rows_per_sec": 0.0,
+    }
+    assert set(compute_rates(None, current, 2.0).values()) == {0.0}
+    assert set(compute_rates(previous, current, 0).values()) == {0.0}
+
+
+def test_statistics_follow_the_marker():
+    dms = FakeDms({"arn:task:a": ["t1", "t2", "t3", "t4", "t5"]})
+    tables = stats_sampler.iter_table_statistics(dms, "arn:task:a")
+    assert [s["TableName"] for s in tables] == ["t1", "t2", "t3", "t4", "t5"]
+    assert dms.calls == [("arn:task:a", None), ("arn:task:a", "2"), ("arn:task:a", "4")]
+    arns = [f"arn:task:{i}" for i in range(5)]
+    tasks = stats_sampler.iter_replication_tasks(dms, arns)
+    assert [t["ReplicationTaskArn"] for t in tasks] == arns
+
+
+def test_a_failing_task_doesnt_stop_the_others(capsys):
+    dms = FakeDms({"arn:task:a": ["t1"], "arn:task:b": ["t2", "t3"]})
+    dms.missing.add("arn:task:a")
+    sampler = TableStatsSampler(dms, ["arn:task:a", "arn:task:b"], "unused.csv")
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=CSV_FIELDS)
+
+    assert sampler.sample(writer) == 2
+    assert sampler.sample(writer) == 2
+    assert sampler.task_errors == {"arn:task:a": 2}
+    # the same error is reported once
+    assert capsys.readouterr().out.count("not found") == 1
+    rows = list(csv.DictReader(io.StringIO(output.getvalue()), CSV_FIELDS))
+    assert {(r["task"], r["table"]) for r in rows} == {("b", "t2"), ("b", "t3")}
@@ -0,0 +1,35 @@
+from dms_sample import synth_cache
+
+
+def make_app(root):
+    (root / "dms_sample").mkdir()
+    (root / "app.py").write_text('STACK = os.getenv("STACK_NAME", "s")\n')
+    (root / "dms_sample" / "stack.py").write_text('SHARDS = os.getenv("SHARD_COUNT")\n')
+
+
+def test_fingerprint_follows_sources_and_the_variables_they_read(tmp_path):
+    make_app(tmp_path)
+    base = synth_cache.fingerprint(str(tmp_path), {"SHARD_COUNT": "1"})
+    assert base == synth_cache.fingerprint(
+        str(tmp_path), {"SHARD_COUNT": "1", "ENDPOINT_URL": "http://localhost"}
+    )
+    assert base != synth_cache.fingerprint(str(tmp_path), {"SHARD_COUNT": "2"})
+    assert base != synth_cache.fingerprint(
+        str(tmp_path), {"SHARD_COUNT": "1", "CDK_CONTEXT_JSON": "{}"}
+    )
+    (tmp_path / "dms_sample" / "stack.py").write_text('SHARDS = os.getenv("X")\n')
+    assert base != synth_cache.fingerprint(str(tmp_path), {"SHARD_COUNT": "1"})
+
+
+def test_cached_assembly_needs_the_same_key_and_its_files(tmp_path):
+    outdir = tmp_path / "cdk.out"
+    outdir.mkdir()
+    assert not synth_cache.is_cached(str(outdir), "key")
+    (outdir / "manifest.json").write_text("{}")
+    synth_cache.store(str(outdir), "key", {"total": 1.0})
+
+    assert synth_cache.is_cached(str(outdir), "key")
+    assert not synth_cache.is_cached(str(outdir), "other")
+    assert not synth_cache.is_cached(None, "key")
+    (outdir / "manifest.json").unlink()
+    assert not synth_cache.is_cached(str(outdir), "key")
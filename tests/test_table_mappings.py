@@ -0,0 +1,70 @@
+import pytest
+
+from lib import table_mappings
+from lib.table_mappings import TableMatcher, TaskRouter, selection
+
+
+def test_matcher_wildcards_and_excludes():
+    mappings = selection("a", "dms%", "a%")
+    mappings["rules"] += [
+        {
+            "rule-type": "selection",
+            "rule-id": "2",
+            "rule-name": "no-audit",
+            "object-locator": {"schema-name": "%", "table-name": "a_dit"},
+            "rule-action": "exclude",
+        },
+        {
+            "rule-type": "transformation",
+            "rule-id": "3",
+            "rule-name": "ignored",
+            "rule-action": "rename",
+        },
+    ]
+    matcher = TableMatcher(mappings)
+    assert matcher("dms_sample", "accounts")
+    assert not matcher("dms_sample", "audit")
+    assert not matcher("other", "accounts")
+    assert not matcher("dms_sample", "novels")
+    # regex characters in names are literal
+    assert TableMatcher(selection("b", "s", "a.b"))("s", "a.b")
+    assert not TableMatcher(selection("b", "s", "a.b"))("s", "axb")
+    assert TableMatcher(selection("c", "s", "a_b"))("s", "axb")
+
+
+def test_router_routes_events_by_task():
+    router = TaskRouter(table_mappings.task_table_mappings("dms_sample"))
+    assert router.tasks("dms_sample", "authors") == ("cdcTask1", "fullTask1")
+    events = [
+        {"metadata": {"schema-name": "dms_sample", "table-name": "novels"}},
+        {"metadata": {"schema-name": "dms_sample", "table-name": "accounts"}},
+        {"metadata": {"record-type": "control"}},
+    ]
+    routed = router.route(events)
+    assert routed["cdcTask2"] == [events[0]]
+    assert routed["cdcTask1"] == [events[1]]
+    assert routed[None] == [events[2]]
+
+
+def test_common_name_of_patterns():
+    assert table_mappings.common_name("a%", "%s") == "as"
+    assert table_mappings.common_name("a_c", "%b%") == "abc"
+    assert table_mappings.common_name("novels", "a%") is None
+    assert table_mappings.common_name("n_", "novels") is None
+
+
+def test_overlapping_tasks_fail_the_check():
+    groups = table_mappings.migration_groups(
+        table_mappings.task_table_mappings("dms_sample")
+    )
+    table_mappings.check_overlaps(groups, "dms_sample")
+
+    overlapping = {
+        "cdcTask1": selection("a", "dms_sample", "a%"),
+        "cdcTask2": selection("b", "%", "_uthors"),
+    }
+    assert table_mappings.find_overlaps(overlapping) == [
+        ("cdcTask1", "cdcTask2", "dms_sample", "authors")
+    ]
+    with pytest.raises(ValueError, match="cdcTask1 and cdcTask2 both select"):
+        table_mappings.check_overlaps({"cdc": overlapping}, "dms_sample")
@@ -0,0 +1,55 @@
+from lib.simulator import LocalKinesis
+from lib.throttle_probe import ProbeSample, classify, report, simulate
+
+
+def test_classify():
+    assert classify(ProbeSample(0, latency_source=1, latency_target=2)) == "none"
+    assert classify(ProbeSample(0, throttled_records=3, latency_target=1)) == "stream"
+    assert classify(ProbeSample(0, latency_source=30, latency_target=31)) == "source"
+    assert (
+        classify(ProbeSample(0, latency_source=1, latency_target=30))
+        == "replication-instance"
+    )
+    assert (
+        classify(ProbeSample(0, latency_source=30, latency_target=31, cpu=95))
+        == "replication-instance"
+    )
+
+
+def test_write_limits_reject_records_above_a_shard_capacity():
+    kinesis = LocalKinesis(write_limits=True)
+    kinesis.clock = lambda: 100.0
+    kinesis.create_stream(StreamName="limited", ShardCount=1)
+    records = [{"Data": b"x", "PartitionKey": "k"}] * 500
+    stream = kinesis.stream_arn("limited")
+
+    assert (
+        kinesis.put_records(StreamARN=stream, Records=records)["FailedRecordCount"] == 0
+    )
+    assert (
+        kinesis.put_records(StreamARN=stream, Records=records)["FailedRecordCount"] == 0
+    )
+    res = kinesis.put_records(StreamARN=stream, Records=records)
+    assert res["FailedRecordCount"] == 500 and kinesis.throttled == 500
+    assert res["Records"][0]["ErrorCode"] == "ProvisionedThroughputExceededException"
+
+
+def test_simulated_overload_points_at_the_stream():
+    overloaded = report(simulate(rate=2000, shards=1, seconds=6))
+    assert overloaded["bottleneck"] == "stream"
+    assert overloaded["max_latency_target"] > 2
+
+    assert report(simulate(rate=500, shards=1, seconds=3))["bottleneck"] == "none"
+
+
+def test_simulated_retries_dont_deliver_records_twice():
+    # 1500 records per tick, the shard accepts 1000 per second
+    samples = simulate(rate=3000, shards=1, seconds=6, tick=0.5)
+    delivered = 0
+    for second, sample in enumerate(samples, 1):
+        delivered += sample.incoming_records
+        assert delivered <= 3000 * second
+    assert sum(s.throttled_records for s in samples) > 0
+    # 1000 of the 3000 records committed per second get out, the oldest one
+    # waiting was committed at a third of the elapsed time
+    assert samples[-1].latency_target < 2 / 3 * 6
@@ -0,0 +1,120 @@
+import random
+
+from lib.simulator import DmsEmitter
+from lib.transactions import TransactionAssembler, assemble, summarize, task_source
+
+
+def messages(transactions: int, size: int) -> list[dict]:
+    emitter = DmsEmitter(None, "stream")
+    result = []
+    for t in range(transactions):
+        emitter.begin()
+        for i in range(size):
+            table = ("accounts", "authors", "novels")[i % 3]
+            result.append(emitter.message("dms_sample", table, "insert", {"id": i}))
+    return result
+
+
+def shard_order(messages: list[dict]) -> list[dict]:
+    """Interleave the per table partitions the way a consumer reads the shards"""
+    partitions = {}
+    for message in messages:
+        partitions.setdefault(message["metadata"]["table-name"], []).append(message)
+    queues = list(partitions.values())
+    rng = random.Random(7)
+    result = []
+    while queues:
+        queue = rng.choice(queues)
+        result.append(queue.pop(0))
+        if not queue:
+            queues.remove(queue)
+    return result
+
+
+def test_transactions_are_complete_and_in_commit_order():
+    source = messages(50, 5)
+    transactions = list(assemble(shard_order(source)))
+
+    assert [t.transaction_id for t in transactions] == list(range(1, 51))
+    assert all(len(t.records) == 5 for t in transactions)
+    # only the last one is released by the final flush without a successor
+    assert [t.complete for t in transactions].count(True) == 49
+    ids = [m["metadata"]["transaction-record-id"] for m in transactions[0].records]
+    assert ids == [1, 2, 3, 4, 5]
+
+
+def test_bounded_buffer_releases_the_oldest_transaction():
+    source = messages(3, 4)
+    # the first record of transaction 1 comes last
+    reordered = source[1:] + source[:1]
+    assembler = TransactionAssembler(max_buffered=6)
+    released = []
+    for message in reordered:
+        released.extend(assembler.add(message))
+        assert assembler.buffered <= 6
+
+    assert released[0].transaction_id == 1 and not released[0].complete
+    summary = summarize(released + assembler.flush())
+    assert summary["records"] == 12
+
+
+def test_records_without_transaction_details_pass_through():
+    full_load = {"data": {"id": 1}, "metadata": {"operation": "load"}}
+    (transaction,) = TransactionAssembler().add(full_load)
+    assert transaction.transaction_id is None and transaction.records == [full_load]
+
+
+def test_tasks_sharing_the_stream_are_assembled_apart():
+    first, second = messages(3, 2), messages(3, 2)
+    for task, source in (("cdc-1", first), ("cdc-2", second)):
+        for message in source:
+            message["task"] = task
+    interleaved = [m for pair in zip(first, second) for m in pair]
+    transactions = list(assemble(interleaved, source=lambda m: m["task"]))
+
+    assert sorted((t.source, t.transaction_id) for t in transactions) == [
+        (task, t) for task in ("cdc-1", "cdc-2") for t in (1, 2, 3)
+    ]
+    assert all(len(t.records) == 2 and not t.duplicates for t in transactions)
+    assert all({m["task"] for m in t.records} == {t.source} for t in transactions)
+
+
+def test_colliding_record_ids_are_counted_not_overwritten():
+    first, second = messages(2, 2), messages(2, 2)
+    assembler = TransactionAssembler()
+    released = []
+    for message in [m for pair in zip(first, second) for m in pair]:
+        released.extend(assembler.add(message))
+    released.extend(assembler.flush())
+
+    assert assembler.duplicates == 4
+    assert [t.records[0] for t in released] == [first[0], first[2]]
+    assert not any(t.complete for t in released)
+    assert summarize(released)["duplicates"] == 4
+
+
+def test_cli_keys_the_records_by_the_task_of_their_table():
+    # each task numbers the records of the source transactions it replicates
+    tasks = {"cdcTask1": ["accounts", "authors"], "cdcTask2": ["novels"]}
+    streams = {}
+    for task, tables in tasks.items():
+        emitter = DmsEmitter(None, "stream")
+        streams[task] = []
+        for t in range(4):
+            emitter.begin()
+            for table in tables:
+                streams[task].append(
+                    emitter.message("dms_sample", table, "insert", {"id": t})
+                )
+    interleaved = shard_order(streams["cdcTask1"] + streams["cdcTask2"])
+    transactions = list(assemble(interleaved, source=task_source("dms_sample")))
+
+    assert sorted((t.source, t.transaction_id) for t in transactions) == [
+        (task, t) for task in ("cdcTask1", "cdcTask2") for t in (1, 2, 3, 4)
+    ]
+    summary = summarize(transactions)
+    assert summary["duplicates"] == 0
+    # only the last transaction of each task waits for the final flush
+    assert summary["incomplete"] == 2
+    # without the task key the ids of both tasks collide
+    assert summarize(assemble(interleaved))["duplicates"] > 0